@@ -0,0 +1,3 @@
+"""
+    Offline benchmarks of sql_fabric_copy, using SQLite in place of SQL Server and a local filesystem in place of OneLake.
+"""
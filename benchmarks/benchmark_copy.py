@@ -0,0 +1,302 @@
+"""
+    Benchmark of upload_table_lakehouse and upload_csv_lakehouse against synthetic SQLite tables and a local stand-in for OneLake.
+
+    Each scenario (table shape) and mode (copy settings) runs in its own process, so its peak RSS is not inflated by earlier runs.
+    Results can be saved with --output and compared with an earlier run with --baseline, e.g. between two commits:
+
+        python -m benchmarks.benchmark_copy --rows 200000 --output before.json
+        python -m benchmarks.benchmark_copy --rows 200000 --baseline before.json
+
+    Stage times are exclusive: the time a Delta write spends waiting on a streaming reader is counted as extract and encode, not stage.
+        extract: fetching rows from the source (including conversion to pandas when not streaming, and waiting on range threads when partitioned)
+        encode: converting fetched rows to Arrow batches when streaming
+        stage: writing the Delta table or CSV file, including parquet encoding
+        upload: syncing the staged files to OneLake
+"""
+
+import argparse
+from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import json
+import os
+import os.path as path
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List
+
+import pyarrow as pa
+
+from benchmarks.synthetic_data import TableSpec, create_table
+
+# rows, width and type mix of each scenario; rows is scaled by --rows
+SCENARIOS : Dict[str, Dict[str, Any]] = {
+    "narrow_numeric": {"width": 10, "type_mix": "numeric"},
+    "wide_mixed": {"width": 50, "type_mix": "mixed", "row_scale": 0.25},
+    "text_heavy": {"width": 10, "type_mix": "text"},
+}
+
+# arguments of upload_table_lakehouse for each mode; csv modes use upload_csv_lakehouse
+MODES : Dict[str, Dict[str, Any]] = {
+    "delta": {},
+    "streaming": {"batch_rows": 50_000},
+    "partitioned": {"batch_rows": 50_000, "partitions": 4, "partition_column": "RowKey"},
+    "direct": {"batch_rows": 50_000, "sink": "direct"},
+    "csv": {},
+    "csv_zstd": {"compression": "zstd", "part_size_mb": 64},
+}
+
+STAGES = ["extract", "encode", "stage", "upload"]
+
+class StageTimer:
+    """
+    Accumulates the exclusive time spent in each stage of a copy.
+
+    Stages nest: time spent in an inner stage is not counted in the stage around it. Tables are copied one at a time,
+    so a single stack is shared by every thread, as deltalake reads streaming batches from its own threads.
+    """
+    def __init__(self) -> None:
+        self.seconds : Dict[str, float] = defaultdict(float)
+        self._stack : List[float] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        with self._lock:
+            self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                nested = self._stack.pop()
+                self.seconds[name] += elapsed - nested
+                if self._stack:
+                    self._stack[-1] += elapsed
+
+    def wrap(self, name: str, function: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(function)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            # range threads of a partitioned read and CSV part uploads run concurrently, so only the wait for them is counted
+            if threading.current_thread().name.startswith(("sql_fabric_copy_range", "csv_upload")):
+                return function(*args, **kwargs)
+            with self.stage(name):
+                result = function(*args, **kwargs)
+            if isinstance(result, pa.RecordBatchReader):
+                return self.wrap_reader(name, result)
+            return result
+        return timed
+
+    def wrap_reader(self, name: str, reader: pa.RecordBatchReader) -> pa.RecordBatchReader:
+        def batches() -> Iterator[pa.RecordBatch]:
+            iterator = iter(reader)
+            while True:
+                with self.stage(name):
+                    batch = next(iterator, None)
+                if batch is None:
+                    return
+                yield batch
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+def instrument(timer: StageTimer):
+    """
+    Wraps the functions called by sql_fabric_copy_helper for each stage so their time is recorded by timer.
+    """
+    from sql_fabric_copy import db_tools, sql_fabric_copy_helper
+
+    db_tools.rows_to_record_batch = timer.wrap("encode", db_tools.rows_to_record_batch)
+    for name in ("table_to_dataframe", "table_to_record_batch_reader", "table_to_partitioned_record_batch_reader"):
+        setattr(sql_fabric_copy_helper, name, timer.wrap("extract", getattr(sql_fabric_copy_helper, name)))
+    for name in ("write_deltalake", "merge_into_table", "write_csv_parts"):
+        setattr(sql_fabric_copy_helper, name, timer.wrap("stage", getattr(sql_fabric_copy_helper, name)))
+    for name in ("copy_deltatable", "prepare_local_deltatable", "upload_file"):
+        setattr(sql_fabric_copy_helper, name, timer.wrap("upload", getattr(sql_fabric_copy_helper, name)))
+
+def peak_rss_mb() -> float | None:
+    """
+    Returns the peak resident set size of this process in MB, or None if it cannot be read on this platform.
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess() # type: ignore
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb): # type: ignore
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        pass
+    return None
+
+def directory_size(directory: str) -> int:
+    return sum(
+        path.getsize(path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(directory) for filename in filenames
+    )
+
+def run_benchmark(database_path: str, table_name: str, rows: int, mode: str) -> Dict[str, Any]:
+    """
+    Copies one synthetic table in the current process and measures it. Changes the working directory to a temporary folder.
+    """
+    from sql_fabric_copy import sql_fabric_copy_helper
+    from sql_fabric_copy.db_tools import dispose_engines
+    from tests.local_datalake import LocalDataLakeServiceClient
+
+    timer = StageTimer()
+    instrument(timer)
+    work_directory = tempfile.mkdtemp()
+    os.chdir(work_directory)
+    service_client = LocalDataLakeServiceClient(path.join(work_directory, "onelake"))
+    arguments : Dict[str, Any] = {
+        'sql_server': f"sqlite:///{database_path}",
+        'database_name': "benchmark",
+        'source': table_name,
+        'workspace_name': "Benchmark",
+        'lakehouse_name': "BenchmarkLH",
+        'service_client': service_client,
+    }
+    result : Dict[str, Any] = {"rows": rows, "error": None}
+    started = time.perf_counter()
+    try:
+        if mode.startswith("csv"):
+            csv_directory = path.join(work_directory, "csv")
+            os.makedirs(csv_directory)
+            sql_fabric_copy_helper.upload_csv_lakehouse(
+                target_file=f"{table_name}.csv",
+                temp_csv_location=path.join(csv_directory, f"{table_name}.csv"),
+                **arguments,
+                **MODES[mode]
+            )
+        else:
+            options = dict(MODES[mode])
+            if options.get("sink") == "direct":
+                options["sink_uri"] = path.join(work_directory, "onelake", "direct").replace("\\", "/")
+            if "partitions" in options:
+                options["pool_size"] = options["partitions"]
+            sql_fabric_copy_helper.upload_table_lakehouse(**arguments, **options)
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    finally:
+        dispose_engines()
+    seconds = time.perf_counter() - started
+    output_bytes = directory_size(path.join(work_directory, "onelake"))
+    os.chdir(path.dirname(work_directory))
+    shutil.rmtree(work_directory, ignore_errors=True)
+    result.update({
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds else None,
+        "output_mb": output_bytes / (1024 * 1024),
+        "mb_per_second": output_bytes / (1024 * 1024) / seconds if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: timer.seconds.get(stage, 0.0) for stage in STAGES},
+    })
+    return result
+
+def run_in_process(database_path: str, table_name: str, rows: int, mode: str) -> Dict[str, Any]:
+    """
+    Runs run_benchmark in a new Python process and returns its result.
+    """
+    repository = path.dirname(path.dirname(path.abspath(__file__)))
+    specification = json.dumps({"database_path": database_path, "table_name": table_name, "rows": rows, "mode": mode})
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.benchmark_copy", "--run", specification],
+        cwd=repository,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        return {"rows": rows, "error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def format_change(value: float | None, baseline: float | None) -> str:
+    if value is None or not baseline:
+        return ""
+    return f" ({(value - baseline) / baseline:+.0%})"
+
+def print_header():
+    print(f"{'scenario':<16}{'mode':<13}{'rows':>9}{'seconds':>9}{'rows/s':>18}{'MB/s':>16}{'peak MB':>16}  " + "  ".join(f"{stage:>7}" for stage in STAGES))
+
+def print_result(result: Dict[str, Any], baseline: Dict[str, Dict[str, Any]] | None = None):
+    """
+    Prints the result of a scenario and mode, with the change against the matching baseline result if given.
+    """
+    if result.get("error"):
+        print(f"{result['scenario']:<16}{result['mode']:<13}{result['rows']:>9}  failed: {result['error']}")
+        return
+    previous = (baseline or {}).get(f"{result['scenario']}/{result['mode']}", {})
+    rows_per_second = f"{result['rows_per_second']:,.0f}{format_change(result['rows_per_second'], previous.get('rows_per_second'))}"
+    mb_per_second = f"{result['mb_per_second']:.1f}{format_change(result['mb_per_second'], previous.get('mb_per_second'))}"
+    peak = f"{result['peak_rss_mb']:.0f}{format_change(result['peak_rss_mb'], previous.get('peak_rss_mb'))}" if result["peak_rss_mb"] else "-"
+    stages = "  ".join(f"{result['stages'][stage]:>7.2f}" for stage in STAGES)
+    print(f"{result['scenario']:<16}{result['mode']:<13}{result['rows']:>9}{result['seconds']:>9.2f}{rows_per_second:>18}{mb_per_second:>16}{peak:>16}  {stages}")
+
+def main():
+    parser = argparse.ArgumentParser(prog="benchmarks.benchmark_copy", description="Offline benchmark of the sql_fabric_copy pipeline")
+    parser.add_argument('--rows', type=int, default=100_000, help='rows of the synthetic tables, scaled per scenario')
+    parser.add_argument('--scenarios', type=str, default=",".join(SCENARIOS), help=f'comma separated scenarios ({", ".join(SCENARIOS)})')
+    parser.add_argument('--modes', type=str, default=",".join(MODES), help=f'comma separated modes ({", ".join(MODES)})')
+    parser.add_argument('--output', type=str, help='save the results to this JSON file')
+    parser.add_argument('--baseline', type=str, help='compare with results saved by an earlier run with --output')
+    parser.add_argument('--run', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        specification = json.loads(args.run)
+        print(json.dumps(run_benchmark(**specification)))
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = {f"{result['scenario']}/{result['mode']}": result for result in json.load(baseline_file)["results"]}
+
+    results : List[Dict[str, Any]] = []
+    print_header()
+    data_directory = tempfile.mkdtemp()
+    try:
+        for scenario in args.scenarios.split(","):
+            settings = SCENARIOS[scenario.strip()]
+            rows = max(1, int(args.rows * settings.get("row_scale", 1)))
+            spec = TableSpec(f"Bench_{scenario.strip()}", rows, settings["width"], settings["type_mix"])
+            database_path = path.join(data_directory, f"{spec.name}.db")
+            create_table(database_path, spec)
+            for mode in args.modes.split(","):
+                result = run_in_process(database_path, spec.name, rows, mode.strip())
+                result.update({"scenario": scenario.strip(), "mode": mode.strip()})
+                results.append(result)
+                print_result(result, baseline)
+    finally:
+        shutil.rmtree(data_directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"rows": args.rows, "results": results}, output_file, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+    Benchmark of the startup time of sql_fabric_copy: the time to import the package, or start the CLI, before any work is done.
+
+    Each scenario runs in a fresh interpreter, as a module imported once is never imported again, and the median of --repeat runs is reported
+    with the heavy dependencies the scenario loaded. Interpreter startup itself is not counted. The run fails if the CLI takes longer
+    than --budget_seconds to print its help, or if a scenario loads a dependency its code path does not need:
+
+        python -m benchmarks.benchmark_import
+        python -m benchmarks.benchmark_import --repeat 10 --budget_seconds 0.2
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# dependencies slow enough to import that startup should only pay for them when they are used
+HEAVY_MODULES = [
+    "pandas",
+    "deltalake",
+    "sqlalchemy",
+    "pyarrow",
+    "pyarrow.csv",
+    "pyarrow.compute",
+    "azure.identity",
+    "azure.storage.filedatalake",
+    "azure.storage.filedatalake.aio",
+    "msal_extensions",
+    "aiohttp",
+]
+
+# code run by each scenario, and the heavy modules it must not load
+SCENARIOS : Dict[str, Dict[str, Any]] = {
+    "cli_help": {
+        "code": (
+            "import runpy\n"
+            "sys.argv = ['sql_fabric_copy', '--help']\n"
+            "try:\n"
+            "    runpy.run_module('sql_fabric_copy', run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+        ),
+        "forbidden": HEAVY_MODULES,
+    },
+    "package": {
+        "code": "import sql_fabric_copy\n",
+        "forbidden": HEAVY_MODULES,
+    },
+    "helper": {
+        "code": "from sql_fabric_copy import sql_fabric_copy_helper\n",
+        "forbidden": ["pandas", "deltalake", "pyarrow.csv", "pyarrow.compute", "azure.storage.filedatalake.aio", "msal_extensions", "aiohttp"],
+    },
+    "csv_path": {
+        "code": "from sql_fabric_copy import upload_table_lakehouse\nfrom sql_fabric_copy.sql_fabric_copy_helper import upload_csv_lakehouse\n",
+        "forbidden": ["pandas", "deltalake", "azure.storage.filedatalake.aio", "msal_extensions", "aiohttp"],
+    },
+}
+
+# run in the fresh interpreter: times the scenario code and reports the heavy modules it loaded
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+exec(compile({code!r}, "<scenario>", "exec"))
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "modules": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+def run_scenario(name: str) -> Dict[str, Any]:
+    """
+    Runs a scenario in a fresh interpreter.
+
+    Parameters:
+        name (str): Name of the scenario in SCENARIOS.
+
+    Returns:
+        Dict[str, Any]: seconds spent in the scenario code, and the heavy modules it loaded.
+
+    Throws:
+        Exception: If the scenario fails, including its output.
+    """
+    code = PROBE.format(code=SCENARIOS[name]["code"], heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise Exception(f"Scenario {name} failed: {completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure(name: str, repeat: int) -> Dict[str, Any]:
+    """
+    Runs a scenario repeat times, returning the median time and the heavy modules loaded by its first run.
+    """
+    runs = [run_scenario(name) for _ in range(max(repeat, 1))]
+    modules : List[str] = runs[0]["modules"]
+    return {
+        "scenario": name,
+        "seconds": statistics.median(run["seconds"] for run in runs),
+        "modules": modules,
+        "unexpected": [module for module in modules if module in SCENARIOS[name]["forbidden"]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(prog="benchmarks.benchmark_import", description="Startup time of the sql_fabric_copy package and CLI")
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per scenario, the median being reported')
+    parser.add_argument('--scenarios', type=str, default=",".join(SCENARIOS), help=f'comma separated scenarios ({", ".join(SCENARIOS)})')
+    parser.add_argument('--budget_seconds', type=float, default=0.25, help='fails if the CLI takes longer than this to print its help')
+    parser.add_argument('--output', type=str, help='save the results to this JSON file')
+    args = parser.parse_args()
+
+    results : List[Dict[str, Any]] = []
+    failures : List[str] = []
+    print(f"{'scenario':<12} {'seconds':>8}  modules")
+    for name in args.scenarios.split(","):
+        result = measure(name.strip(), args.repeat)
+        results.append(result)
+        print(f"{result['scenario']:<12} {result['seconds']:>8.3f}  {', '.join(result['modules']) or '-'}")
+        if result["unexpected"]:
+            failures.append(f"{result['scenario']} loaded {', '.join(result['unexpected'])}")
+        if result["scenario"] == "cli_help" and result["seconds"] > args.budget_seconds:
+            failures.append(f"cli_help took {result['seconds']:.3f}s, over the budget of {args.budget_seconds}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"budget_seconds": args.budget_seconds, "results": results}, output_file, indent=2)
+    for failure in failures:
+        print(f"Failed:\t{failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+    Synthetic source tables for the benchmarks, created in a SQLite database.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+import random
+import sqlite3
+from typing import Any, Callable, Dict, Iterator, List, Literal, Tuple
+
+# SQLite type and value generator of each column type
+COLUMN_TYPES : Dict[str, Tuple[str, Callable[[random.Random, int], Any]]] = {
+    "int": ("INTEGER", lambda rng, row: rng.randrange(1_000_000_000)),
+    "float": ("REAL", lambda rng, row: rng.random() * 1_000_000),
+    "text": ("TEXT", lambda rng, row: "".join(rng.choices("abcdefghijklmnopqrstuvwxyz ", k=rng.randrange(8, 64)))),
+    "date": ("TEXT", lambda rng, row: (date(2000, 1, 1) + timedelta(days=rng.randrange(10_000))).isoformat()),
+    "nullable": ("INTEGER", lambda rng, row: None if rng.random() < 0.3 else rng.randrange(1_000)),
+}
+
+TYPE_MIXES : Dict[str, List[str]] = {
+    "numeric": ["int", "float"],
+    "text": ["text"],
+    "mixed": ["int", "float", "text", "date", "nullable"],
+}
+
+@dataclass
+class TableSpec:
+    """Shape of a synthetic table."""
+    name: str
+    rows: int
+    width: int
+    type_mix: Literal["numeric", "text", "mixed"] = "mixed"
+
+    def columns(self) -> List[Tuple[str, str]]:
+        """
+        Returns the name and column type of each column. The first column is an INTEGER key counting from 0.
+        """
+        mix = TYPE_MIXES[self.type_mix]
+        return [("RowKey", "key")] + [(f"Column{index}", mix[index % len(mix)]) for index in range(1, self.width)]
+
+def generate_rows(spec: TableSpec, seed: int = 0) -> Iterator[Tuple[Any, ...]]:
+    """
+    Yields the rows of a synthetic table. The same seed always yields the same rows.
+    """
+    rng = random.Random(seed)
+    generators = [COLUMN_TYPES[column_type][1] for _, column_type in spec.columns()[1:]]
+    for row in range(spec.rows):
+        yield (row, *[generate(rng, row) for generate in generators])
+
+def create_table(database_path: str, spec: TableSpec, seed: int = 0):
+    """
+    Creates (or replaces) a synthetic table in a SQLite database.
+
+    Parameters:
+        database_path (str): Path of the SQLite database.
+        spec (TableSpec): Shape of the table.
+        seed (int, optional): Seed of the generated values. Defaults to 0.
+    """
+    definitions = ", ".join(
+        f"{name} INTEGER PRIMARY KEY" if column_type == "key" else f"{name} {COLUMN_TYPES[column_type][0]}"
+        for name, column_type in spec.columns()
+    )
+    placeholders = ", ".join("?" for _ in range(spec.width))
+    with sqlite3.connect(database_path) as connection:
+        connection.execute(f"DROP TABLE IF EXISTS {spec.name}")
+        connection.execute(f"CREATE TABLE {spec.name} ({definitions})")
+        connection.executemany(f"INSERT INTO {spec.name} VALUES ({placeholders})", generate_rows(spec, seed))
@@ -1,5 +1,11 @@
 """Makes top level imports available for the sql_fabric_copy package."""
-from .sql_fabric_copy_helper import upload_table_lakehouse
-
+from typing import Any
 
 __all__ = ['upload_table_lakehouse']
+
+def __getattr__(name: str) -> Any:
+    # the helper imports SQLAlchemy, Arrow and the Azure SDKs, so it is only imported when used rather than with any module of the package
+    if name in __all__:
+        from . import sql_fabric_copy_helper
+        return getattr(sql_fabric_copy_helper, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,33 +1,114 @@
 """ Uploads a table (as csv) from SQL Server to a directory in Azure Data Lake Storage. """
 import argparse
+import contextlib
+import json
 from logging import Logger, debug, error
 import logging
 import sys
 
-from . import db_tools
-from . import onelake_tools
-from . import sql_fabric_copy_helper
-
-
-from .sql_fabric_copy_helper import upload_table_lakehouse # type: ignore
-
 LOG_LEVELS = [name for name, value in vars(logging).items() if isinstance(value, int) and not name.startswith('_')]
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Upload a table from SQL Server to Azure Data Lake Storage.')
     parser.add_argument('--storage_account', required= False, type=str, help='Storage account URL')
-    parser.add_argument('--sql_server', required= True, type=str, help='SQL Server address')
-    parser.add_argument('--database_name', required= True, type=str, help='Database name')
-    parser.add_argument('--source', required= True, type=str, help='Query or Table Name')
-    parser.add_argument('--workspace_name', required= True, type=str, help='Workspace name')
-    parser.add_argument('--lakehouse_name', required= True, type=str, help='Lakehouse name')
+    parser.add_argument('--sql_server', required= False, type=str, help='SQL Server address')
+    parser.add_argument('--database_name', required= False, type=str, help='Database name')
+    parser.add_argument('--source', required= False, type=str, help='Query or Table Name, or a comma separated list of tables')
+    parser.add_argument('--manifest', required= False, type=str, help='JSON or YAML job manifest listing the tables to copy with their own settings, and options shared by the run; other arguments override its options')
+    parser.add_argument('--workspace_name', required= False, type=str, help='Workspace name')
+    parser.add_argument('--lakehouse_name', required= False, type=str, help='Lakehouse name')
     parser.add_argument('--target_table', required= False, type=str, help='Required if source is a query')
     parser.add_argument('--tenant_id', required= False, type=str, help='tenant id used for authentiaction')
     parser.add_argument('--client_id', required= False, type=str, help='client id used for authentiaction')
     parser.add_argument('--client_secret', required= False, type=str, help='client secret used for authentiaction')
+    parser.add_argument('--token_cache', required= False, type=str, nargs='?', const="", help='keep OneLake tokens, and the credential source that worked, encrypted in this file across runs, defaults to ~/.sql_fabric_copy/token_cache.bin')
+    parser.add_argument('--token_cache_unencrypted', required= False, action='store_true', help='save the token cache unencrypted, readable only by its owner, where no keyring is available to encrypt it')
+    parser.add_argument('--batch_rows', required= False, type=int, help='stream rows from SQL Server in batches of this many rows instead of loading the whole table')
+    parser.add_argument('--max_memory_mb', required= False, type=int, help='stream rows from SQL Server, keeping each batch under roughly this many MB')
+    parser.add_argument('--partitions', required= False, type=int, help='read each table as up to this many ranges over separate connections at once')
+    parser.add_argument('--partition_column', required= False, type=str, help='numeric or date column the ranges are split on, either one column for every table or "table=column,table=column", defaults to the partitioning column of partitioned tables')
+    parser.add_argument('--extract_engine', required= False, type=str, choices=['odbc', 'bcp'], default='odbc', help='odbc fetches rows over the pooled connection, bcp exports them with the bcp utility and streams its output')
+    parser.add_argument('--fetch_backend', required= False, type=str, choices=['cursor', 'arrow_odbc'], default='cursor', help='how the odbc engine fetches rows: cursor decodes fetched rows into Arrow, arrow_odbc fills Arrow arrays straight from the ODBC driver (needs arrow-odbc)')
+    parser.add_argument('--bcp_path', required= False, type=str, help='bcp executable used by the bcp extract engine, defaults to bcp on the PATH')
+    parser.add_argument('--bcp_authentication', required= False, type=str, choices=['trusted', 'sql', 'entra'], help='how bcp logs in: trusted (Windows), sql or entra, with the login of a sql_server URL or of the SQL_FABRIC_COPY_BCP_USER and SQL_FABRIC_COPY_BCP_PASSWORD environment variables')
+    parser.add_argument('--type_map', required= False, type=str, help='Arrow types overriding the mapping of SQL Server column types, as "sqltype=arrowtype,sqltype=arrowtype", e.g. "tinyint=int32,real=double"')
+    parser.add_argument('--target_file_size_mb', required= False, type=int, help='split each write into parquet files of about this many MB')
+    parser.add_argument('--row_group_rows', required= False, type=int, help='maximum rows per parquet row group')
+    parser.add_argument('--compression', required= False, type=str, choices=['uncompressed', 'snappy', 'gzip', 'brotli', 'lz4', 'zstd', 'lz4_raw'], help='parquet compression codec, defaults to snappy')
+    parser.add_argument('--compression_level', required= False, type=int, help='level of the compression codec, e.g. 1 to 22 for zstd')
+    parser.add_argument('--no_dictionary_encoding', required= False, action='store_true', help='disable parquet dictionary encoding')
+    parser.add_argument('--sort_by', required= False, type=str, help='column the rows are sorted by before they are written, either one column for every table or "table=column,table=column"; comma separated columns when no table is given')
+    parser.add_argument('--columns', required= False, type=str, help='comma separated columns copied from every table, selected on SQL Server')
+    parser.add_argument('--where', required= False, type=str, help='SQL filter of the rows copied from every table, run on SQL Server, with ? placeholders for the values of --where_params')
+    parser.add_argument('--where_params', required= False, type=str, help='JSON list of the values of the ? placeholders of --where, e.g. \'["2024-01-01", 5]\'')
+    parser.add_argument('--parallel', required= False, type=int, help='number of tables to copy at once when source is a list of tables')
+    parser.add_argument('--schedule', required= False, type=str, choices=['largest_first', 'in_order'], default='largest_first', help='with parallel or pipeline_depth, start the largest tables first by their size in sys.dm_db_partition_stats, or start them in the order given')
+    parser.add_argument('--pool_size', required= False, type=int, help='number of pooled SQL Server connections reused across tables')
+    parser.add_argument('--pipeline_depth', required= False, type=int, help='copies tables through extract, write and upload stages running at once, with this many tables queued between stages')
+    parser.add_argument('--pipeline_memory_mb', required= False, type=int, help='with pipeline_depth, MB of extracted rows held in memory waiting to be written')
+    parser.add_argument('--pipeline_disk_mb', required= False, type=int, help='with pipeline_depth, MB of written files waiting to be uploaded')
+    parser.add_argument('--upload_concurrency', required= False, type=int, help='number of files of a table uploaded at once')
+    parser.add_argument('--max_upload_concurrency', required= False, type=int, help='number of files of a table uploaded at once that upload_concurrency may be raised to while OneLake is not throttling')
+    parser.add_argument('--chunk_size_mb', required= False, type=int, help='files larger than this are uploaded as blocks of this size')
+    parser.add_argument('--max_concurrency', required= False, type=int, help='number of blocks of a single file uploaded at once')
+    parser.add_argument('--retention_hours', required= False, type=float, help='hours data files removed from a table are kept on the Lakehouse for readers of older versions, defaults to 168')
+    parser.add_argument('--sink', required= False, type=str, choices=['staged', 'direct'], default='staged', help='staged writes each table locally before uploading it, direct writes it straight to the Lakehouse')
+    parser.add_argument('--sink_uri', required= False, type=str, help='root that tables are written under in direct mode, defaults to the Lakehouse Tables folder')
+    parser.add_argument('--load_mode', required= False, type=str, choices=['full', 'incremental', 'merge'], default='full', help='full replaces each table, incremental appends rows past the last watermark, merge upserts changed rows on the primary key')
+    parser.add_argument('--watermark_column', required= False, type=str, help='rowversion, identity or modified date column for incremental loads, either one column for every table or "table=column,table=column"')
+    parser.add_argument('--primary_key', required= False, type=str, help='comma separated key columns for merge loads, read from SQL Server when not given')
+    parser.add_argument('--change_detection', required= False, type=str, choices=['watermark', 'change_tracking'], default='watermark', help='how merge loads find changed rows')
+    parser.add_argument('--fingerprint', required= False, type=str, choices=['checksum', 'rowversion', 'stats'], help='skip tables whose fingerprint matches their last successful copy')
+    parser.add_argument('--fingerprint_manifest', required= False, type=str, help='path of the JSON file holding fingerprints, defaults to output/_fingerprints.json')
+    parser.add_argument('--force', required= False, action='store_true', help='copy tables even when their fingerprint is unchanged')
+    parser.add_argument('--run_id', required= False, type=str, help='id of the journal recording the progress of each table, so the run can be resumed, e.g. "nightly"; without it no journal is kept')
+    parser.add_argument('--resume', required= False, type=str, help='id of an interrupted run to continue with the same arguments, skipping the tables it committed and finishing the uploads it started')
+    parser.add_argument('--checkpoint_ranges', required= False, action='store_true', help='with partitions, save each range read to a local parquet file, so a resumed run only reads the ranges not saved yet')
+    parser.add_argument('--metrics_out', required= False, type=str, help='append per-stage metrics of each table as JSON lines to this file, or - for stdout, moving the status lines to stderr')
     parser.add_argument('--log_level', required= False, type=str, help='level of logging to enable (LOG_LEVELS)')
     logging.basicConfig(level=logging.WARNING)
     args = vars(parser.parse_args())
+    from . import manifest_tools
+    manifest_path = args.pop("manifest")
+    manifest : manifest_tools.JobManifest | None = None
+    if manifest_path:
+        if args["source"]:
+            parser.error("--source cannot be combined with --manifest, which lists the tables")
+        manifest = manifest_tools.load_manifest(manifest_path)
+    elif not args["source"]:
+        parser.error("either --source or --manifest is required")
+    missing = [
+        f"--{name}" for name in ("sql_server", "database_name", "workspace_name", "lakehouse_name")
+        if not args[name] and not (manifest and manifest.options.get(name))
+    ]
+    if missing:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
+    if args["resume"] and args["run_id"]:
+        parser.error("--resume cannot be combined with --run_id, as it continues the run it names")
+    if args["where_params"]:
+        try:
+            args["where_params"] = json.loads(args["where_params"])
+        except ValueError:
+            parser.error("--where_params must be a JSON list, e.g. '[\"2024-01-01\", 5]'")
+        if not isinstance(args["where_params"], list):
+            parser.error("--where_params must be a JSON list, e.g. '[\"2024-01-01\", 5]'")
+    if args["source"] and " from " in args["source"].lower() and not args["target_table"]:
+        raise Exception("If source provided is a query, you MUST pass a target_table.")
+
+    # the package is imported once the arguments are valid, so --help and argument errors return without loading SQLAlchemy, Arrow or the Azure SDKs
+    from . import credential_tools
+    from . import db_tools
+    from . import delta_tools
+    from . import fingerprint_tools
+    from . import journal_tools
+    from . import metrics_tools
+    from . import onelake_tools
+    from . import pipeline_tools
+    from . import schema_tools
+    from . import transfer_tools
+    from . import sql_fabric_copy_helper
+    from .sql_fabric_copy_helper import upload_table_lakehouse # type: ignore
+
     logger : Logger | None = None
     if args["log_level"]:
         level = logging.getLevelName(args['log_level'].upper())
@@ -38,20 +119,67 @@ if __name__ == "__main__":
 
         logger.level = level
         # TODO improve the distribution of this logger
+        credential_tools.logger = logger
         db_tools.logger = logger
         sql_fabric_copy_helper.logger = logger
         onelake_tools.logger = logger
+        delta_tools.logger = logger
+        fingerprint_tools.logger = logger
+        journal_tools.logger = logger
+        manifest_tools.logger = logger
+        metrics_tools.logger = logger
+        pipeline_tools.logger = logger
+        schema_tools.logger = logger
+        transfer_tools.logger = logger
 
     del args["log_level"]
+    metrics_out = args.pop("metrics_out")
 
     if logger: logger.debug(f"{args=}")
     else: debug(f"{args=}")
 
-    if " from " in args["source"].lower() and not args["target_table"]:
-        raise Exception("If source provided is a query, you MUST pass a target_table.")
+    if args["type_map"]:
+        args["type_map"] = dict(
+            [part.strip() for part in pair.split("=", 1)] for pair in args["type_map"].split(",")
+        )
+    args["dictionary_encoding"] = False if args.pop("no_dictionary_encoding") else None
+    for per_table_argument in ("watermark_column", "partition_column", "sort_by"):
+        if args[per_table_argument] and "=" in args[per_table_argument]:
+            args[per_table_argument] = dict(
+                [part.strip() for part in pair.split("=", 1)] for pair in args[per_table_argument].split(",")
+            )
+    # only runs given an id keep a journal, so one-off copies leave nothing under output/_runs
+    resume_run_id = args.pop("resume")
+    args["run_id"] = resume_run_id or args["run_id"]
+    args["resume"] = bool(resume_run_id)
+    if manifest:
+        # arguments given on the command line override the options of the manifest, but not the settings of its tables
+        manifest.options.update({key: value for key, value in args.items() if value != parser.get_default(key)})
+        args = {**args, **manifest_tools.manifest_arguments(manifest)}
     if not args["storage_account"]:
         args["storage_account"] = "onelake"
+    token_cache_unencrypted = args.pop("token_cache_unencrypted")
+    if args["token_cache"] is not None:
+        args["token_cache"] = credential_tools.TokenCache(
+            args["token_cache"] or credential_tools.DEFAULT_TOKEN_CACHE_PATH,
+            allow_unencrypted=token_cache_unencrypted
+        )
 
-    upload_table_lakehouse(
-        **args
-    )
+    metrics_writer : metrics_tools.JsonLinesWriter | None = None
+    if metrics_out:
+        metrics_writer = metrics_tools.JsonLinesWriter(sys.stdout if metrics_out == "-" else metrics_out)
+        metrics_tools.add_hook(metrics_writer)
+    # with metrics on stdout, status lines go to stderr so stdout holds only JSON lines
+    status_output = contextlib.redirect_stdout(sys.stderr) if metrics_out == "-" else contextlib.nullcontext()
+    try:
+        with status_output:
+            if args["run_id"]:
+                print(f"Run:\t{args['run_id']}")
+            upload_table_lakehouse(
+                **args
+            )
+    finally:
+        db_tools.dispose_engines()
+        if metrics_writer:
+            metrics_tools.remove_hook(metrics_writer)
+            metrics_writer.close()
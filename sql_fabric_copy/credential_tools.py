@@ -0,0 +1,431 @@
+""" Module creating the token credentials used for OneLake, with tokens cached across runs and refreshed ahead of expiry. """
+import asyncio
+import json
+from logging import Logger
+import os
+import os.path as path
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from azure.core.credentials import AccessToken, TokenCredential
+from azure.identity import (
+    AzureCliCredential,
+    AzureDeveloperCliCredential,
+    AzurePowerShellCredential,
+    ClientSecretCredential,
+    DefaultAzureCredential,
+    EnvironmentCredential,
+    ManagedIdentityCredential,
+    WorkloadIdentityCredential,
+)
+
+logger : Logger | None = None
+
+# file the token cache is saved to by default
+DEFAULT_TOKEN_CACHE_PATH = path.join(path.expanduser("~"), ".sql_fabric_copy", "token_cache.bin")
+# tokens closer than this to expiry are refreshed in the background while still being returned
+REFRESH_AHEAD_SECONDS = 600
+# tokens closer than this to expiry are never returned from the cache
+MIN_TOKEN_SECONDS = 60
+# environment variable pinning the credential source, e.g. "managed_identity" or "cli"
+CREDENTIAL_SOURCE_VARIABLE = "SQL_FABRIC_COPY_CREDENTIAL"
+
+# exclude option of DefaultAzureCredential and credential class of each credential source
+CREDENTIAL_SOURCES : Dict[str, tuple[str, type]] = {
+    "environment": ("exclude_environment_credential", EnvironmentCredential),
+    "workload_identity": ("exclude_workload_identity_credential", WorkloadIdentityCredential),
+    "managed_identity": ("exclude_managed_identity_credential", ManagedIdentityCredential),
+    "cli": ("exclude_cli_credential", AzureCliCredential),
+    "powershell": ("exclude_powershell_credential", AzurePowerShellCredential),
+    "developer_cli": ("exclude_developer_cli_credential", AzureDeveloperCliCredential),
+}
+
+def get_source_storage_options(source: str | None) -> Dict[str, str] | None:
+    """
+    Returns deltalake storage options with which object_store authenticates, and refreshes its tokens, as a credential source of
+    DefaultAzureCredential does, read from the same environment variables.
+
+    Parameters:
+        source (str, None): Class name of the credential source, e.g. "ManagedIdentityCredential".
+
+    Returns:
+        Dict[str, str], None: The storage options, or None when object_store has no equivalent of the source, e.g. Azure PowerShell,
+        a certificate, or a managed identity other than that of a VM.
+    """
+    environ = os.environ
+    client_id, tenant_id = environ.get("AZURE_CLIENT_ID"), environ.get("AZURE_TENANT_ID")
+    if source == AzureCliCredential.__name__:
+        return {"azure_use_azure_cli": "true"}
+    if source == EnvironmentCredential.__name__ and client_id and tenant_id and environ.get("AZURE_CLIENT_SECRET"):
+        return {"azure_client_id": client_id, "azure_client_secret": environ["AZURE_CLIENT_SECRET"], "azure_tenant_id": tenant_id}
+    if source == WorkloadIdentityCredential.__name__ and client_id and tenant_id and environ.get("AZURE_FEDERATED_TOKEN_FILE"):
+        return {"azure_federated_token_file": environ["AZURE_FEDERATED_TOKEN_FILE"], "azure_client_id": client_id, "azure_tenant_id": tenant_id}
+    if source == ManagedIdentityCredential.__name__ and not (environ.get("IDENTITY_ENDPOINT") or environ.get("MSI_ENDPOINT")):
+        # object_store falls back to the instance metadata endpoint, with the user assigned identity in AZURE_CLIENT_ID
+        return {"azure_client_id": client_id} if client_id else {}
+    return None
+
+class DefaultAzureCredentialOptions:
+    """Options for configuring the DefaultAzureCredential."""
+    exclude_workload_identity_credential: bool = True
+    exclude_developer_cli_credential: bool = True
+    exclude_cli_credential: bool = True
+    exclude_environment_credential: bool = True
+    exclude_managed_identity_credential: bool = False
+    exclude_powershell_credential: bool = True
+    exclude_visual_studio_code_credential: bool = True
+    exclude_interactive_browser_credential: bool = True
+
+    def __init__(self, exclude_managed_identity_credential: bool = False) -> None:
+        self.exclude_managed_identity_credential = exclude_managed_identity_credential
+        self.exclude_cli_credential = exclude_managed_identity_credential
+
+    def to_kwargs(self) -> Dict[str, bool]:
+        """
+        Returns every exclude option as keyword arguments of DefaultAzureCredential, including those left at their class defaults.
+        """
+        return {name: getattr(self, name) for name in dir(self) if name.startswith("exclude_")}
+
+    @classmethod
+    def for_sources(cls, sources: List[str]) -> "DefaultAzureCredentialOptions":
+        """
+        Returns options probing only the given credential sources, in the order of DefaultAzureCredential.
+
+        Parameters:
+            sources (List[str]): Keys of CREDENTIAL_SOURCES, e.g. ["managed_identity"].
+
+        Returns:
+            DefaultAzureCredentialOptions: The options.
+
+        Throws:
+            Exception: If a source is not a key of CREDENTIAL_SOURCES.
+        """
+        unknown = [source for source in sources if source not in CREDENTIAL_SOURCES]
+        if unknown:
+            raise Exception(f"Unknown credential source {unknown[0]}, expected one of {', '.join(CREDENTIAL_SOURCES)}.")
+        options = cls()
+        for source, (exclude_option, _) in CREDENTIAL_SOURCES.items():
+            setattr(options, exclude_option, source not in sources)
+        return options
+
+    @classmethod
+    def for_environment(cls) -> "DefaultAzureCredentialOptions":
+        """
+        Returns options probing only the credential source of the environment this process runs in, so no time is spent on sources that cannot work.
+
+        The source is the one named by the SQL_FABRIC_COPY_CREDENTIAL environment variable, or else workload identity on Kubernetes,
+        a service principal in AZURE_CLIENT_SECRET or AZURE_CLIENT_CERTIFICATE_PATH, or a managed identity where Azure sets IDENTITY_ENDPOINT
+        or MSI_ENDPOINT. Elsewhere, e.g. on a VM or a developer machine, the managed identity and then the Azure CLI are tried.
+
+        Returns:
+            DefaultAzureCredentialOptions: The options.
+        """
+        pinned = os.environ.get(CREDENTIAL_SOURCE_VARIABLE)
+        if pinned:
+            return cls.for_sources([source.strip() for source in pinned.split(",")])
+        if os.environ.get("AZURE_FEDERATED_TOKEN_FILE"):
+            return cls.for_sources(["workload_identity"])
+        if os.environ.get("AZURE_CLIENT_SECRET") or os.environ.get("AZURE_CLIENT_CERTIFICATE_PATH"):
+            return cls.for_sources(["environment"])
+        if os.environ.get("IDENTITY_ENDPOINT") or os.environ.get("MSI_ENDPOINT"):
+            return cls.for_sources(["managed_identity"])
+        return cls.for_sources(["managed_identity", "cli"])
+
+class TokenCache:
+    """
+    Access tokens, and the credential source that got them, saved to a file so later runs reuse them rather than authenticating again.
+
+    The file is encrypted with the user's keyring (DPAPI on Windows, Keychain on macOS, libsecret on Linux). Where no keyring is available
+    the cache is kept in memory only, unless allow_unencrypted is set, and then the file is only readable by its owner.
+    """
+    def __init__(self, location: str | None = DEFAULT_TOKEN_CACHE_PATH, allow_unencrypted: bool = False) -> None:
+        self.location = location
+        self._persistence : Any = None
+        if location:
+            from msal_extensions import FilePersistence, build_encrypted_persistence  # type: ignore
+            os.makedirs(path.dirname(path.abspath(location)), exist_ok=True)
+            try:
+                self._persistence = build_encrypted_persistence(location)
+            except Exception as e:
+                if allow_unencrypted:
+                    if logger: logger.warning(f"Saving tokens unencrypted to {location}, as no keyring is available: {e}")
+                    self._persistence = FilePersistence(location)
+                else:
+                    if logger: logger.warning(f"Keeping tokens in memory only, as no keyring is available to encrypt {location}: {e}")
+        self._lock = threading.Lock()
+        self._entries : Dict[str, Dict[str, Any]] | None = None
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {"tokens": {}, "sources": {}}
+            if self._persistence is not None:
+                from msal_extensions import CrossPlatLock  # type: ignore
+                from msal_extensions.persistence import PersistenceNotFound  # type: ignore
+                try:
+                    with CrossPlatLock(f"{self.location}.lockfile"):
+                        content = self._persistence.load()
+                    self._entries.update(json.loads(content))
+                except PersistenceNotFound:
+                    pass
+                except Exception as e:
+                    if logger: logger.warning(f"Ignoring unreadable token cache {self.location}: {e}")
+        return self._entries
+
+    def _save(self):
+        if self._persistence is None or self._entries is None:
+            return
+        from msal_extensions import CrossPlatLock, FilePersistence  # type: ignore
+        now = time.time()
+        self._entries["tokens"] = {
+            key: entry for key, entry in self._entries["tokens"].items() if entry["expires_on"] > now
+        }
+        try:
+            with CrossPlatLock(f"{self.location}.lockfile"):
+                self._persistence.save(json.dumps(self._entries))
+            if isinstance(self._persistence, FilePersistence):
+                os.chmod(self.location, 0o600) # type: ignore
+        except Exception as e:
+            if logger: logger.warning(f"Could not save token cache {self.location}: {e}")
+
+    def get_token(self, key: str) -> AccessToken | None:
+        """
+        Returns the cached token of a key, or None if there is none or it has expired.
+        """
+        with self._lock:
+            entry = self._load()["tokens"].get(key)
+        if entry is None or entry["expires_on"] <= time.time():
+            return None
+        return AccessToken(entry["token"], int(entry["expires_on"]))
+
+    def set_token(self, key: str, token: AccessToken):
+        """
+        Caches the token of a key.
+        """
+        with self._lock:
+            self._load()["tokens"][key] = {"token": token.token, "expires_on": token.expires_on}
+            self._save()
+
+    def get_source(self, key: str) -> str | None:
+        """
+        Returns the credential source remembered for a key, e.g. "ManagedIdentityCredential".
+        """
+        with self._lock:
+            return self._load()["sources"].get(key)
+
+    def set_source(self, key: str, source: str | None):
+        """
+        Remembers, or forgets with None, the credential source of a key.
+        """
+        with self._lock:
+            sources = self._load()["sources"]
+            if sources.get(key) == source:
+                return
+            if source is None:
+                sources.pop(key, None)
+            else:
+                sources[key] = source
+            self._save()
+
+class CachedTokenCredential:
+    """
+    Token credential returning tokens from a TokenCache until they are close to expiry.
+
+    A token within refresh_ahead_seconds of expiry is still returned while a new one is fetched in the background, so requests never wait on
+    token renewal. When wrapping DefaultAzureCredential, the source that got the last token is remembered in the cache, and later runs
+    use that source alone, going back to the full chain if it fails.
+    """
+    def __init__(
+        self,
+        cache_key: str,
+        create_credential: Callable[[str | None], TokenCredential],
+        cache: TokenCache | None = None,
+        refresh_ahead_seconds: int = REFRESH_AHEAD_SECONDS,
+        storage_options: Dict[str, str] | None = None
+    ) -> None:
+        """
+        Parameters:
+            cache_key (str): Identifies the identity the tokens are cached for.
+            create_credential (Callable[[str | None], TokenCredential]): Creates the credential of a remembered source class name, or the full credential for None.
+            cache (TokenCache, None, optional): Where tokens are cached. Defaults to a cache in memory.
+            refresh_ahead_seconds (int, optional): Tokens this close to expiry are refreshed in the background. Defaults to REFRESH_AHEAD_SECONDS.
+            storage_options (Dict[str, str], None, optional): deltalake storage options authenticating as the same identity. Defaults to those of the credential source.
+        """
+        self.cache_key = cache_key
+        self.cache = cache or TokenCache(None)
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self._create_credential = create_credential
+        self._credential : TokenCredential | None = None
+        self._source = self.cache.get_source(cache_key)
+        self._lock = threading.Lock()
+        self._refreshing : Dict[str, threading.Thread] = {}
+        self._storage_options = storage_options
+
+    def get_storage_options(self) -> Dict[str, str] | None:
+        """
+        Returns deltalake storage options with which object_store authenticates as the same identity and refreshes its own tokens,
+        or None when object_store cannot authenticate as it. The source of DefaultAzureCredential is only known once a token was fetched.
+        """
+        if self._storage_options is not None:
+            return dict(self._storage_options)
+        return get_source_storage_options(self._source or self.cache.get_source(self.cache_key))
+
+    def _get_credential(self) -> TokenCredential:
+        with self._lock:
+            if self._credential is None:
+                if logger: logger.debug(f"Creating credential {self._source or 'chain'} for {self.cache_key}")
+                self._credential = self._create_credential(self._source)
+            return self._credential
+
+    def _fetch(self, key: str, *scopes: str, **kwargs: Any) -> AccessToken:
+        credential = self._get_credential()
+        try:
+            token = credential.get_token(*scopes, **kwargs)
+        except Exception:
+            if self._source is None:
+                raise
+            if logger: logger.warning(f"Remembered credential {self._source} failed, trying every credential source.")
+            with self._lock:
+                self._source = None
+                self._credential = None
+            self.cache.set_source(self.cache_key, None)
+            return self._fetch(key, *scopes, **kwargs)
+        successful = getattr(credential, "_successful_credential", None)
+        if successful is not None and self._source is None:
+            self.cache.set_source(self.cache_key, type(successful).__name__)
+        self.cache.set_token(key, token)
+        return token
+
+    def _refresh_in_background(self, key: str, *scopes: str, **kwargs: Any):
+        def refresh():
+            try:
+                self._fetch(key, *scopes, **kwargs)
+            except Exception as e:
+                if logger: logger.warning(f"Background token refresh failed, retrying on next use: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.pop(key, None)
+
+        with self._lock:
+            if key in self._refreshing:
+                return
+            thread = threading.Thread(target=refresh, name="token_refresh", daemon=True)
+            self._refreshing[key] = thread
+        thread.start()
+
+    def _token_key(self, scopes: tuple[str, ...], tenant_id: str | None) -> str:
+        return f"{self.cache_key}|{tenant_id or ''}|{' '.join(sorted(scopes))}"
+
+    def get_cached_token(self, *scopes: str, tenant_id: str | None = None, **kwargs: Any) -> AccessToken | None:
+        """
+        Returns the cached token for the scopes, starting its refresh in the background when it is close to expiry, or None if there is no usable token.
+        """
+        if tenant_id:
+            kwargs["tenant_id"] = tenant_id
+        key = self._token_key(scopes, tenant_id)
+        token = self.cache.get_token(key)
+        remaining = token.expires_on - time.time() if token else 0
+        if token and remaining > self.refresh_ahead_seconds:
+            return token
+        if token and remaining > MIN_TOKEN_SECONDS:
+            self._refresh_in_background(key, *scopes, **kwargs)
+            return token
+        return None
+
+    def get_token(self, *scopes: str, claims: str | None = None, tenant_id: str | None = None, **kwargs: Any) -> AccessToken:
+        """
+        Returns a token for the scopes, from the cache when it is not close to expiry.
+        """
+        if claims:
+            # a claims challenge needs a new token
+            return self._get_credential().get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        token = self.get_cached_token(*scopes, tenant_id=tenant_id, **kwargs)
+        if token is not None:
+            return token
+        if tenant_id:
+            kwargs["tenant_id"] = tenant_id
+        return self._fetch(self._token_key(scopes, tenant_id), *scopes, **kwargs)
+
+    def close(self):
+        with self._lock:
+            credential, self._credential = self._credential, None
+        if credential is not None and hasattr(credential, "close"):
+            credential.close() # type: ignore
+
+    def __enter__(self) -> "CachedTokenCredential":
+        return self
+
+    def __exit__(self, *args: Any):
+        self.close()
+
+class AsyncCachedTokenCredential:
+    """
+    Asynchronous view of a CachedTokenCredential for the azure.storage.filedatalake.aio clients. Cached tokens are returned at once, and new
+    tokens fetched in a worker thread, so the event loop never waits on authentication.
+    """
+    def __init__(self, credential: CachedTokenCredential) -> None:
+        self.credential = credential
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        if not kwargs.get("claims"):
+            token = self.credential.get_cached_token(*scopes, **kwargs)
+            if token is not None:
+                return token
+        return await asyncio.to_thread(self.credential.get_token, *scopes, **kwargs)
+
+    def get_storage_options(self) -> Dict[str, str] | None:
+        return self.credential.get_storage_options()
+
+    async def close(self):
+        self.credential.close()
+
+    async def __aenter__(self) -> "AsyncCachedTokenCredential":
+        return self
+
+    async def __aexit__(self, *args: Any):
+        await self.close()
+
+def get_token_credential(
+    tenant_id: str | None = None,
+    client_id: str | None = None,
+    client_secret: str | None = None,
+    default_azure_credential_options: DefaultAzureCredentialOptions | None = None,
+    token_cache: TokenCache | None = None,
+) -> CachedTokenCredential:
+    """
+    Creates a credential for a service principal when tenant_id, client_id and client_secret are given, or else a DefaultAzureCredential,
+    with its tokens cached in token_cache.
+
+    Parameters:
+        tenant_id (str, None, optional): Tenant ID of the service principal.
+        client_id (str, None, optional): Client ID of the service principal.
+        client_secret (str, None, optional): Client secret of the service principal.
+        default_azure_credential_options (DefaultAzureCredentialOptions, None, optional): Credential sources probed by DefaultAzureCredential. Defaults to DefaultAzureCredentialOptions.for_environment().
+        token_cache (TokenCache, None, optional): Where tokens and the credential source that worked are kept, e.g. TokenCache() to reuse them across runs. Defaults to a cache in memory.
+
+    Returns:
+        CachedTokenCredential: The credential.
+    """
+    if client_id is not None and tenant_id is not None and client_secret is not None:
+        if logger: logger.info("Using token credentials.")
+        return CachedTokenCredential(
+            f"client_secret:{tenant_id}:{client_id}",
+            lambda source: ClientSecretCredential(tenant_id, client_id, client_secret),
+            token_cache,
+            storage_options={"azure_client_id": client_id, "azure_client_secret": client_secret, "azure_tenant_id": tenant_id}
+        )
+
+    if logger: logger.info("Using default azure credentials.")
+    options = (default_azure_credential_options or DefaultAzureCredentialOptions.for_environment()).to_kwargs()
+    sources = [source for source, (exclude_option, _) in CREDENTIAL_SOURCES.items() if not options.get(exclude_option)]
+    credential_classes = {credential_class.__name__: credential_class for _, credential_class in CREDENTIAL_SOURCES.values()}
+
+    def create_credential(source: str | None) -> TokenCredential:
+        if source == ManagedIdentityCredential.__name__:
+            # as DefaultAzureCredential, use the user assigned identity in AZURE_CLIENT_ID
+            return ManagedIdentityCredential(client_id=os.environ.get("AZURE_CLIENT_ID"))
+        if source in credential_classes:
+            return credential_classes[source]()
+        return DefaultAzureCredential(**options)
+
+    return CachedTokenCredential(f"default:{','.join(sources)}", create_credential, token_cache)
@@ -1,14 +1,132 @@
 """ Module with functions for working with SQL database. """
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from decimal import Decimal
+import io
+import json
 from logging import Logger
+import queue
+import re
+import shutil
 import subprocess
-from typing import List
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Literal, Sequence, Tuple
 import os.path as path
 import os
-import pandas as pd
-from sqlalchemy import create_engine
-import pandas as pd
+import pyarrow as pa
+from sqlalchemy import create_engine, Engine
+if TYPE_CHECKING:
+    import pandas as pd
 logger : Logger | None = None
 
+DEFAULT_BATCH_ROWS = 100_000
+# rows fetched before the row width is known when a memory limit is set
+MEMORY_PROBE_ROWS = 1_000
+DEFAULT_POOL_SIZE = 5
+# bcp executable used by table_to_bcp_record_batch_reader
+BCP_PATH = "bcp"
+# bytes of bcp output parsed per batch when neither batch_rows nor max_memory_mb is set
+DEFAULT_BCP_BLOCK_BYTES = 16 * 1024 * 1024
+# field and row terminators of bcp output (ASCII unit and record separators), which do not occur in ordinary text
+BCP_FIELD_TERMINATOR = "0x1f"
+BCP_ROW_TERMINATOR = "0x1e"
+# how bcp logs in to SQL Server, see bcp_login_arguments
+BcpAuthentication = Literal["trusted", "sql", "entra"]
+# environment variables holding the login bcp uses when the URL of sql_server has none
+BCP_USER_VARIABLE = "SQL_FABRIC_COPY_BCP_USER"
+BCP_PASSWORD_VARIABLE = "SQL_FABRIC_COPY_BCP_PASSWORD"
+
+# how rows are fetched from SQL Server, see table_to_record_batch_reader
+FetchBackend = Literal["cursor", "arrow_odbc"]
+# largest value of a varchar(max), nvarchar(max) or varbinary(max) column read by the arrow_odbc backend, which sizes its buffers by it
+ARROW_ODBC_MAX_LOB_BYTES = 64 * 1024
+# size of the buffer the arrow_odbc backend fetches rows into when max_memory_mb is not set
+DEFAULT_ARROW_ODBC_BUFFER_BYTES = 64 * 1024 * 1024
+
+_engines : Dict[Tuple[str, str], Engine] = {}
+_engines_lock = threading.Lock()
+
+def connection_url(sql_server: str, database_name: str) -> str:
+    """
+    Returns the SQLAlchemy URL used to connect to a database.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, or a full SQLAlchemy URL (containing "://") which is used as is.
+        database_name (str): Name of database. Ignored when sql_server is a URL.
+
+    Returns:
+        str: The SQLAlchemy URL.
+    """
+    if "://" in sql_server:
+        return sql_server
+    return f'mssql+pyodbc://@{sql_server}/{database_name}?driver=ODBC+Driver+17+for+SQL+Server'
+
+def odbc_connection_string(sql_server: str, database_name: str) -> str:
+    """
+    Returns the ODBC connection string of a database, as SQLAlchemy passes it to pyodbc.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, or a full SQLAlchemy URL.
+        database_name (str): Name of database. Ignored when sql_server is a URL.
+
+    Returns:
+        str: The connection string, e.g. DRIVER={ODBC Driver 17 for SQL Server};Server=localhost;Database=AdventureWorksDW;Trusted_Connection=Yes
+
+    Throws:
+        Exception: If the database is not reached over pyodbc, e.g. a SQLite URL.
+    """
+    from sqlalchemy.engine import make_url
+    url = make_url(connection_url(sql_server, database_name))
+    if url.get_driver_name() != "pyodbc":
+        raise Exception(f"{url.drivername} is not connected to over ODBC.")
+    arguments, _ = url.get_dialect()().create_connect_args(url)
+    return arguments[0]
+
+def get_engine(
+        sql_server: str,
+        database_name: str,
+        pool_size: int | None = None,
+        pool_pre_ping: bool = True
+) -> Engine:
+    """
+    Returns the pooled engine for a database, creating it on first use.
+
+    Engines are cached per server and database and shared between threads, so every extraction in a run reuses the same connections.
+    Call dispose_engines once the run has finished.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, or a full SQLAlchemy URL.
+        database_name (str): Name of database.
+        pool_size (int, None, optional): Number of connections kept open. Only applies when the engine is created. Defaults to DEFAULT_POOL_SIZE.
+        pool_pre_ping (bool, optional): Test connections before handing them out, replacing any that were dropped. Defaults to True.
+
+    Returns:
+        Engine: The cached engine.
+    """
+    key = (sql_server.lower(), database_name.lower())
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if logger: logger.debug(f"Creating engine for {sql_server=} and {database_name=} using Windows authentication ({pool_size=}).")
+            engine = create_engine(
+                connection_url(sql_server, database_name),
+                pool_size=pool_size or DEFAULT_POOL_SIZE,
+                max_overflow=0,
+                pool_pre_ping=pool_pre_ping
+            )
+            _engines[key] = engine
+        return engine
+
+def dispose_engines():
+    """
+    Disposes every cached engine, closing their pooled connections.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
 def execute_bsp_csv(
         sql_server: str,
         database_name: str,
@@ -63,18 +181,1222 @@ def table_to_dataframe(
         sql_server: str,
         database_name: str,
         source : str,
-) -> pd.DataFrame: # type: ignore
-    if logger: logger.debug(f"Connecting to {sql_server=} and {database_name=} using Windows authentication.")
-    # TODO re use connection if possible
-    connection_string = f'mssql+pyodbc://@{sql_server}/{database_name}?driver=ODBC+Driver+17+for+SQL+Server'
-    engine = create_engine(connection_string)
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+        schema: pa.Schema | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+) -> "pd.DataFrame": # type: ignore
+    import pandas as pd
+    engine = get_engine(sql_server, database_name)
+
+    query = source_to_query(source, where, order_by, columns)
+    if logger: logger.info(f"Executing query: {query}")
+    with engine.connect() as connection:
+        if schema is not None:
+            rows = connection.exec_driver_sql(query, tuple(params) if params else None).fetchall()
+            table = pa.Table.from_batches([rows_to_typed_record_batch(rows, schema)])
+            return table.to_pandas(types_mapper=pd.ArrowDtype) # type: ignore
+        df = pd.read_sql(query, connection, params=tuple(params) if params else None, dtype_backend="pyarrow") # type: ignore
+    return df
+
+def table_to_arrow(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+        schema: pa.Schema | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+        fetch_backend: FetchBackend = "cursor",
+) -> pa.Table:
+    """
+    Reads a table or query from SQL Server into an Arrow table, decoding rows straight into Arrow arrays rather than through a pandas DataFrame.
+
+    Rows are fetched in batches (see table_to_record_batch_reader), so no more than one batch is held as Python values at a time.
+    Without a schema, the cursor backend infers types as table_to_dataframe does.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+        schema (pa.Schema, None, optional): Schema the rows are decoded into (see schema_tools.get_source_schema).
+        order_by (Sequence[str], None, optional): Columns SQL Server sorts the rows by.
+        columns (Sequence[str], None, optional): Columns to read. Defaults to every column.
+        fetch_backend (str, ('cursor', 'arrow_odbc'), optional): How rows are fetched, see table_to_record_batch_reader. Defaults to "cursor".
+
+    Returns:
+        pa.Table: The rows of the source.
+    """
+    if schema is None and fetch_backend == "cursor":
+        # without a schema the types are inferred from the values of the whole table, not just its first batch
+        df = table_to_dataframe(sql_server, database_name, source, where, params, order_by=order_by, columns=columns)
+        return pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None) # type: ignore
+    return table_to_record_batch_reader(
+        sql_server,
+        database_name,
+        source,
+        where=where,
+        params=params,
+        schema=schema,
+        order_by=order_by,
+        columns=columns,
+        fetch_backend=fetch_backend
+    ).read_all()
+
+def table_to_record_batch_reader(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        batch_rows: int | None = None,
+        max_memory_mb: int | None = None,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+        schema: pa.Schema | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+        fetch_backend: FetchBackend = "cursor",
+) -> pa.RecordBatchReader:
+    """
+    Streams a table or query from SQL Server as Arrow record batches.
+
+    Rows are fetched from a server side cursor in batches, so peak memory is set by the batch size rather than the table size.
+    The pooled connection is held until the returned reader is exhausted.
+
+    The "cursor" backend fetches rows as Python tuples over the pooled connection and decodes each column into Arrow, without pandas when
+    schema is given. The "arrow_odbc" backend fetches rows with arrow-odbc, which binds column buffers to the ODBC driver and fills Arrow
+    arrays from them without creating a Python object per value, over a connection of its own rather than the pool. It needs the
+    arrow-odbc package and a pyodbc connection; its params are bound as literals (see bind_literals), and varchar(max), nvarchar(max)
+    and varbinary(max) values must fit in ARROW_ODBC_MAX_LOB_BYTES.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        batch_rows (int, None, optional): Maximum number of rows per batch. Defaults to DEFAULT_BATCH_ROWS.
+        max_memory_mb (int, None, optional): Approximate upper bound for the Arrow size of a single batch. Rows per batch are reduced to fit once the row width is known.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+        schema (pa.Schema, None, optional): Schema the rows are decoded into (see schema_tools.get_source_schema), rather than inferring it from the first batch.
+        order_by (Sequence[str], None, optional): Columns SQL Server sorts the rows by.
+        columns (Sequence[str], None, optional): Columns to read. Defaults to every column.
+        fetch_backend (str, ('cursor', 'arrow_odbc'), optional): How rows are fetched. Defaults to "cursor".
+
+    Returns:
+        pa.RecordBatchReader: Reader yielding the rows of the source. The schema is schema if given, otherwise taken from the first batch.
+
+    Throws:
+        Exception: If the arrow_odbc backend is used without arrow-odbc installed, or for a database not reached over pyodbc.
+    """
+    if not batch_rows:
+        batch_rows = DEFAULT_BATCH_ROWS
+    max_batch_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+    typed = schema is not None
+
+    query = source_to_query(source, where, order_by, columns)
+    if fetch_backend == "arrow_odbc":
+        return _arrow_odbc_record_batch_reader(sql_server, database_name, bind_literals(query, params), batch_rows, max_batch_bytes, schema)
+
+    engine = get_engine(sql_server, database_name)
+    if logger: logger.info(f"Streaming query: {query} ({batch_rows=}, {max_memory_mb=})")
+    connection = engine.connect().execution_options(stream_results=True)
+    try:
+        result = connection.exec_driver_sql(query, tuple(params) if params else None)
+        columns = list(result.keys())
+        first_rows = result.fetchmany(min(batch_rows, MEMORY_PROBE_ROWS) if max_batch_bytes else batch_rows)
+        if schema is not None:
+            first_batch = rows_to_typed_record_batch(first_rows, schema)
+        else:
+            first_batch = rows_to_record_batch(first_rows, columns)
+            schema = widen_stream_schema(first_batch.schema)
+            first_batch = first_batch.cast(schema) # type: ignore
+    except:
+        connection.close()
+        raise
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        try:
+            batch = first_batch
+            while batch.num_rows:
+                yield batch
+                fetch_rows = batch_rows
+                if max_batch_bytes:
+                    bytes_per_row = max(1, -(-batch.nbytes // batch.num_rows))
+                    fetch_rows = max(1, min(batch_rows, max_batch_bytes // bytes_per_row))
+                rows = result.fetchmany(fetch_rows)
+                if not rows:
+                    break
+                if typed:
+                    batch = rows_to_typed_record_batch(rows, schema)
+                else:
+                    batch = rows_to_record_batch(rows, columns, schema)
+                if logger: logger.debug(f"Fetched batch of {batch.num_rows} rows ({batch.nbytes} bytes)")
+        finally:
+            connection.close()
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+def _arrow_odbc_record_batch_reader(
+        sql_server: str,
+        database_name: str,
+        query: str,
+        batch_rows: int,
+        max_batch_bytes: int | None,
+        schema: pa.Schema | None
+) -> pa.RecordBatchReader:
+    """
+    Streams the rows of a query fetched by arrow-odbc, decoded into schema if given, otherwise into the types arrow-odbc maps the result set to.
+    """
+    try:
+        from arrow_odbc import read_arrow_batches_from_odbc # type: ignore
+    except ImportError:
+        raise Exception("arrow-odbc is required by fetch_backend arrow_odbc: pip install arrow-odbc")
+    if logger: logger.info(f"Streaming query with arrow-odbc: {query} ({batch_rows=}, {max_batch_bytes=})")
+    reader = read_arrow_batches_from_odbc(
+        query=query,
+        connection_string=odbc_connection_string(sql_server, database_name),
+        batch_size=batch_rows,
+        max_bytes_per_batch=max_batch_bytes or DEFAULT_ARROW_ODBC_BUFFER_BYTES,
+        max_text_size=ARROW_ODBC_MAX_LOB_BYTES,
+        max_binary_size=ARROW_ODBC_MAX_LOB_BYTES,
+        schema=schema
+    )
+    return reader.into_pyarrow_record_batch_reader()
+
+def widen_stream_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    Widens types inferred from the first batch of a stream so later batches still fit.
+
+    Decimal precision is inferred from the values seen, so it is raised to the maximum while keeping the scale.
+
+    Parameters:
+        schema (pa.Schema): Schema inferred from the first batch.
+
+    Returns:
+        pa.Schema: Schema used for every batch of the stream, without pandas metadata.
+    """
+    fields: List[pa.Field] = []
+    for field in schema:
+        if pa.types.is_decimal(field.type):
+            field = field.with_type(pa.decimal128(38, field.type.scale)) # type: ignore
+        fields.append(field)
+    return pa.schema(fields)
+
+def rows_to_record_batch(
+        rows: Sequence[Any],
+        columns: List[str],
+        schema: pa.Schema | None = None
+) -> pa.RecordBatch:
+    """
+    Converts fetched rows to an Arrow record batch, using the same type inference as pd.read_sql(..., dtype_backend="pyarrow").
+
+    Parameters:
+        rows (Sequence): Rows returned by the cursor.
+        columns (List[str]): Column names of the result set.
+        schema (pa.Schema, None, optional): Schema to cast the batch to, so every batch of a stream shares the first batch's schema.
 
+    Returns:
+        pa.RecordBatch: The converted rows.
+    """
+    import pandas as pd
+    df = pd.DataFrame.from_records(rows, columns=columns).convert_dtypes(dtype_backend="pyarrow") # type: ignore
+    batch = pa.RecordBatch.from_pandas(df, preserve_index=False) # type: ignore
+    if schema is not None and not batch.schema.equals(schema):
+        batch = batch.cast(schema) # type: ignore
+    return batch
+
+def rows_to_typed_record_batch(rows: Sequence[Any], schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Converts fetched rows to an Arrow record batch of a known schema, decoding each column straight into its type without pandas.
+    Columns whose values do not convert directly are converted to their own type and cast.
+
+    Parameters:
+        rows (Sequence): Rows returned by the cursor, with one value per field of schema.
+        schema (pa.Schema): Schema of the rows.
+
+    Returns:
+        pa.RecordBatch: The converted rows.
+    """
+    values = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays : List[pa.Array] = []
+    for column, field in zip(values, schema):
+        try:
+            arrays.append(pa.array(column, type=field.type))
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            # values of another Python type, e.g. Decimal values of a money column mapped to float64
+            arrays.append(pa.array(column).cast(field.type)) # type: ignore
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def source_to_query(
+        source: str,
+        where: str | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None
+) -> str:
+    """
+    Returns the query to run for a source, which is either a query or a table name.
+
+    Parameters:
+        source (str): Query or name of table (schema required)
+        where (str, None, optional): Filter to apply to the source. Queries are wrapped in a derived table to apply it.
+        order_by (Sequence[str], None, optional): Columns to sort the rows by. Queries are wrapped in a derived table to apply it.
+        columns (Sequence[str], None, optional): Columns to select, in order. where and order_by may use the other columns of the source. Defaults to every column.
+
+    Returns:
+        str: The source if it is a query, otherwise a query selecting all rows of the table, filtered by where and sorted by order_by if given.
+    """
+    order = f" ORDER BY {', '.join(quote_identifier(column) for column in order_by)}" if order_by else ""
+    select = ", ".join(quote_identifier(column) for column in columns) if columns else "*"
     if " from " in source.lower():
-        query = source
+        if where:
+            return f"SELECT {select} FROM ({source}) AS source_query WHERE {where}{order}"
+        if order or columns:
+            return f"SELECT {select} FROM ({source}) AS source_query{order}"
+        return source
+    if where:
+        return f"SELECT {select} FROM {source} WHERE {where}{order}"
+    return f"SELECT {select} FROM {source}{order}"
+
+def quote_identifier(name: str) -> str:
+    """
+    Quotes a column or table name for SQL Server.
+
+    Parameters:
+        name (str): The unquoted name.
+
+    Returns:
+        str: The name in square brackets, with closing brackets escaped.
+    """
+    return f"[{name.replace(']', ']]')}]"
+
+def get_max_value(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        column: str,
+) -> Any | None:
+    """
+    Returns the largest value of a column of a table or query, e.g. the high-water mark of a rowversion, identity or modified date column.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        column (str): Name of the column.
+
+    Returns:
+        Any, None: The largest value, or None if the source has no rows.
+    """
+    engine = get_engine(sql_server, database_name)
+    if " from " in source.lower():
+        source = f"({source}) AS source_query"
+    query = f"SELECT MAX({quote_identifier(column)}) FROM {source}"
+    if logger: logger.debug(f"Executing query: {query}")
+    with engine.connect() as connection:
+        return connection.exec_driver_sql(query).scalar()
+
+def split_table_name(table: str) -> Tuple[str, str]:
+    """
+    Splits a table name into schema and table, removing square brackets.
+
+    Parameters:
+        table (str): Name of table, optionally schema qualified. The schema defaults to dbo.
+
+    Returns:
+        Tuple[str, str]: The schema and table names.
+    """
+    parts = [part.strip().lstrip('[').rstrip(']') for part in table.split(".")]
+    if len(parts) == 1:
+        return "dbo", parts[0]
+    return parts[-2], parts[-1]
+
+def get_primary_key(
+        sql_server: str,
+        database_name: str,
+        table: str,
+) -> List[str]:
+    """
+    Reads the primary key columns of a table from SQL Server metadata.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        table (str): Name of table (schema required)
+
+    Returns:
+        List[str]: The primary key columns in key order, empty if the table has no primary key.
+    """
+    schema_name, table_name = split_table_name(table)
+    query = """SELECT kcu.COLUMN_NAME
+FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS AS tc
+JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE AS kcu
+    ON kcu.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA AND kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY' AND tc.TABLE_SCHEMA = ? AND tc.TABLE_NAME = ?
+ORDER BY kcu.ORDINAL_POSITION"""
+    engine = get_engine(sql_server, database_name)
+    with engine.connect() as connection:
+        primary_key = [row[0] for row in connection.exec_driver_sql(query, (schema_name, table_name))]
+    if logger: logger.debug(f"Primary key of {table}: {primary_key}")
+    return primary_key
+
+def get_columns(
+        sql_server: str,
+        database_name: str,
+        table: str,
+) -> List[str]:
+    """
+    Reads the column names of a table from SQL Server metadata.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        table (str): Name of table (schema required)
+
+    Returns:
+        List[str]: The column names in column order.
+    """
+    schema_name, table_name = split_table_name(table)
+    query = """SELECT COLUMN_NAME
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?
+ORDER BY ORDINAL_POSITION"""
+    engine = get_engine(sql_server, database_name)
+    with engine.connect() as connection:
+        return [row[0] for row in connection.exec_driver_sql(query, (schema_name, table_name))]
+
+def get_table_sizes(
+        sql_server: str,
+        database_name: str,
+        tables: Sequence[str],
+) -> Dict[str, int]:
+    """
+    Estimates the size of tables from sys.dm_db_partition_stats, as the bytes of the pages used by their heap or clustered index, including LOB and row overflow pages.
+
+    Sizes of every table are read with a single query, so it is cheap for runs of hundreds of tables. Reading the view needs VIEW DATABASE STATE;
+    without it, or on databases other than SQL Server, no sizes are returned.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        tables (Sequence[str]): Names of tables (schema defaults to dbo). Queries are ignored.
+
+    Returns:
+        Dict[str, int]: Estimated bytes by table, as given in tables, for the tables found.
+    """
+    engine = get_engine(sql_server, database_name)
+    if engine.dialect.name != "mssql":
+        return {}
+    query = """SELECT s.name, o.name, SUM(ps.used_page_count) * 8192
+FROM sys.dm_db_partition_stats AS ps
+JOIN sys.objects AS o ON o.object_id = ps.object_id
+JOIN sys.schemas AS s ON s.schema_id = o.schema_id
+WHERE ps.index_id IN (0, 1) AND o.type = 'U'
+GROUP BY s.name, o.name"""
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(query).all()
+    except Exception as e:
+        if logger: logger.warning(f"Could not read table sizes from sys.dm_db_partition_stats: {e}")
+        return {}
+    sizes = {(schema_name.lower(), table_name.lower()): int(size or 0) for schema_name, table_name, size in rows}
+    found : Dict[str, int] = {}
+    for table in tables:
+        if " from " in table.lower():
+            continue
+        schema_name, table_name = split_table_name(table)
+        size = sizes.get((schema_name.lower(), table_name.lower()))
+        if size is not None:
+            found[table] = size
+    if logger: logger.debug(f"Table sizes: {found}")
+    return found
+
+def get_change_tracking_versions(
+        sql_server: str,
+        database_name: str,
+        table: str,
+) -> Tuple[int, int | None]:
+    """
+    Reads the current change tracking version of a database and the oldest version still available for a table.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        table (str): Name of table (schema required)
+
+    Returns:
+        Tuple[int, int, None]: The current version, and the minimum valid version of the table (None if change tracking is not enabled for it).
+    """
+    query = "SELECT CHANGE_TRACKING_CURRENT_VERSION(), CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID(?))"
+    engine = get_engine(sql_server, database_name)
+    with engine.connect() as connection:
+        current_version, min_valid_version = connection.exec_driver_sql(query, (table,)).one()
+    if current_version is None:
+        raise Exception(f"Change tracking is not enabled on database {database_name}.")
+    return current_version, min_valid_version
+
+def change_tracking_query(
+        table: str,
+        primary_key: List[str],
+        columns: List[str],
+        operation_column: str,
+) -> str:
+    """
+    Returns a query of the rows of a table changed between two change tracking versions, passed as parameters.
+
+    Deleted rows only have their primary key set. The first parameter is the last version already copied,
+    the second the version to copy up to.
+
+    Parameters:
+        table (str): Name of table (schema required)
+        primary_key (List[str]): Primary key columns of the table.
+        columns (List[str]): Every column of the table.
+        operation_column (str): Name of the returned column holding SYS_CHANGE_OPERATION ('I', 'U' or 'D').
+
+    Returns:
+        str: The query.
+    """
+    select = [f"ct.SYS_CHANGE_OPERATION AS {quote_identifier(operation_column)}"]
+    select += [
+        f"ct.{quote_identifier(column)}" if column in primary_key else f"t.{quote_identifier(column)}"
+        for column in columns
+    ]
+    join = " AND ".join(f"t.{quote_identifier(column)} = ct.{quote_identifier(column)}" for column in primary_key)
+    return (
+        f"SELECT {', '.join(select)} FROM CHANGETABLE(CHANGES {table}, ?) AS ct "
+        f"LEFT JOIN {table} AS t ON {join} "
+        f"WHERE ct.SYS_CHANGE_VERSION <= ?"
+    )
+
+def get_table_fingerprint(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        method: Literal["checksum", "rowversion", "stats"] = "checksum",
+        column: str | None = None,
+) -> str:
+    """
+    Computes a cheap fingerprint of a table or query, which changes when its rows change.
+
+    Methods:
+        checksum: row count and CHECKSUM_AGG(BINARY_CHECKSUM(*)). Reads the whole source on SQL Server, but transfers nothing.
+            BINARY_CHECKSUM ignores text, ntext, image and xml columns.
+        rowversion: row count and the largest value of column, e.g. a rowversion or modified date column.
+        stats: row count from sys.dm_db_partition_stats, modify_date from sys.tables and the last update from sys.dm_db_index_usage_stats.
+            Tables only. Reads metadata only, but usage stats are reset when SQL Server restarts, which causes one extra copy.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        method (str, ('checksum', 'rowversion', 'stats'), optional): How to fingerprint the source. Defaults to "checksum".
+        column (str, None, optional): Column used by the rowversion method.
+
+    Returns:
+        str: The fingerprint.
+    """
+    is_query = " from " in source.lower()
+    from_source = f"({source}) AS source_query" if is_query else source
+    params : Tuple[Any, ...] = ()
+    if method == "checksum":
+        query = f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {from_source}"
+    elif method == "rowversion":
+        if not column:
+            raise Exception("The rowversion fingerprint requires a column.")
+        query = f"SELECT COUNT_BIG(*), MAX({quote_identifier(column)}) FROM {from_source}"
+    elif method == "stats":
+        if is_query:
+            raise Exception("The stats fingerprint is only supported for tables.")
+        query = """SELECT
+    (SELECT SUM(row_count) FROM sys.dm_db_partition_stats WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)),
+    (SELECT modify_date FROM sys.tables WHERE object_id = OBJECT_ID(?)),
+    (SELECT MAX(last_user_update) FROM sys.dm_db_index_usage_stats WHERE database_id = DB_ID() AND object_id = OBJECT_ID(?))"""
+        params = (source, source, source)
     else:
-        query = f"SELECT * FROM {source}"
-    if logger: logger.info(f"Executing query: {query}")
-    df = pd.read_sql(query, engine, dtype_backend="pyarrow") # type: ignore
-    # TODO potentially reuse and not close here until end?
-    engine.dispose()
-    return df
\ No newline at end of file
+        raise Exception(f"Unknown fingerprint method \"{method}\".")
+    engine = get_engine(sql_server, database_name)
+    with engine.connect() as connection:
+        row = connection.exec_driver_sql(query, params or None).one()
+    fingerprint = json.dumps([method, *[value.hex() if isinstance(value, bytes) else value for value in row]], default=str)
+    if logger: logger.debug(f"Fingerprint of {source}: {fingerprint}")
+    return fingerprint
+def get_column_range(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        column: str,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+) -> Tuple[Any | None, Any | None]:
+    """
+    Returns the smallest and largest value of a column of a table or query.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        column (str): Name of the column.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+
+    Returns:
+        Tuple[Any, Any]: The smallest and largest values, both None if the source has no rows.
+    """
+    engine = get_engine(sql_server, database_name)
+    if " from " in source.lower():
+        source = f"({source}) AS source_query"
+    quoted = quote_identifier(column)
+    query = f"SELECT MIN({quoted}), MAX({quoted}) FROM {source}"
+    if where:
+        query += f" WHERE {where}"
+    if logger: logger.debug(f"Executing query: {query}")
+    with engine.connect() as connection:
+        low, high = connection.exec_driver_sql(query, tuple(params) if params else None).one()
+    return low, high
+
+def get_partition_function_boundaries(
+        sql_server: str,
+        database_name: str,
+        table: str,
+) -> Tuple[str, List[Any], bool] | None:
+    """
+    Reads the partition function of a partitioned table from SQL Server metadata.
+
+    Boundary values are returned as strings, which SQL Server converts back to the type of the partitioning column when compared.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        table (str): Name of table (schema required)
+
+    Returns:
+        Tuple[str, List[Any], bool], None: The partitioning column, the boundary values in order and whether boundaries belong to the partition on their right (RANGE RIGHT),
+            or None if the table is not partitioned or the database is not SQL Server.
+    """
+    engine = get_engine(sql_server, database_name)
+    if engine.dialect.name != "mssql":
+        return None
+    query = """SELECT c.name, CONVERT(nvarchar(4000), prv.value, 126), pf.boundary_value_on_right
+FROM sys.indexes AS i
+JOIN sys.partition_schemes AS ps ON ps.data_space_id = i.data_space_id
+JOIN sys.partition_functions AS pf ON pf.function_id = ps.function_id
+JOIN sys.partition_range_values AS prv ON prv.function_id = pf.function_id
+JOIN sys.index_columns AS ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id AND ic.partition_ordinal = 1
+JOIN sys.columns AS c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+WHERE i.object_id = OBJECT_ID(?) AND i.index_id IN (0, 1)
+ORDER BY prv.boundary_id"""
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(query, (table,)).all()
+    if not rows:
+        return None
+    if logger: logger.debug(f"Partition function of {table}: {len(rows)} boundaries on {rows[0][0]}")
+    return rows[0][0], [row[1] for row in rows], bool(rows[0][2])
+
+def split_range(low: Any, high: Any, partitions: int) -> List[Any]:
+    """
+    Splits the range of a numeric or date column into partitions of equal width.
+
+    Parameters:
+        low (Any): Smallest value of the column.
+        high (Any): Largest value of the column.
+        partitions (int): Number of partitions.
+
+    Returns:
+        List[Any]: The ascending boundaries between partitions, at most partitions - 1. Empty if the range cannot be split.
+
+    Throws:
+        Exception: If the column is not numeric, date or datetime.
+    """
+    if low is None or high is None or partitions < 2 or low == high:
+        return []
+    if isinstance(low, bool) or not isinstance(low, (int, float, Decimal, date)):
+        raise Exception(f"Cannot split a column of type {type(low).__name__} into ranges, use a numeric or date column.")
+    if isinstance(low, int) and isinstance(high, int):
+        boundaries = [low + (high - low) * index // partitions for index in range(1, partitions)]
+    else:
+        # date + timedelta ignores fractions of a day, so dates stay dates
+        boundaries = [low + (high - low) * index / partitions for index in range(1, partitions)]
+    return [boundary for index, boundary in enumerate(boundaries) if low < boundary and boundary not in boundaries[:index]]
+
+def partition_filters(
+        column: str,
+        boundaries: List[Any],
+        boundary_on_right: bool = True,
+) -> List[Tuple[str | None, List[Any]]]:
+    """
+    Returns the filters selecting each range between boundaries of a column.
+
+    Together the ranges cover every row exactly once: the first has no lower bound and also holds NULLs, the last has no upper bound.
+
+    Parameters:
+        column (str): Name of the column.
+        boundaries (List[Any]): Ascending boundaries between ranges.
+        boundary_on_right (bool, optional): Whether a row equal to a boundary belongs to the range on its right, as in RANGE RIGHT partition functions. Defaults to True.
+
+    Returns:
+        List[Tuple[str, None, List[Any]]]: The filter of each range, using ? placeholders, and its parameters. The filter is None when there are no boundaries.
+    """
+    quoted = quote_identifier(column)
+    lower_operator, upper_operator = (">=", "<") if boundary_on_right else (">", "<=")
+    filters : List[Tuple[str | None, List[Any]]] = []
+    for index in range(len(boundaries) + 1):
+        conditions : List[str] = []
+        values : List[Any] = []
+        if index > 0:
+            conditions.append(f"{quoted} {lower_operator} ?")
+            values.append(boundaries[index - 1])
+        if index < len(boundaries):
+            conditions.append(f"{quoted} {upper_operator} ?")
+            values.append(boundaries[index])
+        where = " AND ".join(conditions) or None
+        if index == 0 and where:
+            where = f"{where} OR {quoted} IS NULL"
+        filters.append((where, values))
+    return filters
+
+def get_partition_ranges(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        partitions: int,
+        partition_column: str | None = None,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+) -> List[Tuple[str | None, List[Any]]]:
+    """
+    Splits a table or query into ranges of a column that can be read in parallel.
+
+    Without partition_column, a partitioned table is split on the boundaries of its partition function, grouping neighbouring partitions when it has more than partitions.
+    Otherwise the range between the smallest and largest value of partition_column is split into partitions of equal width.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        partitions (int): Maximum number of ranges.
+        partition_column (str, None, optional): Numeric or date column to split on. Defaults to the partitioning column of the table.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+
+    Returns:
+        List[Tuple[str, None, List[Any]]]: The filter and parameters of each range, see partition_filters. A single unfiltered range if the source cannot be split.
+    """
+    if partitions < 2:
+        return [(None, [])]
+    boundaries : List[Any] = []
+    boundary_on_right = True
+    partition_function = None
+    if " from " not in source.lower():
+        partition_function = get_partition_function_boundaries(sql_server, database_name, source)
+    if partition_function and partition_column in (None, partition_function[0]):
+        partition_column, boundaries, boundary_on_right = partition_function
+        if len(boundaries) >= partitions:
+            # group neighbouring partitions, keeping every boundary on a partition boundary
+            boundaries = [boundaries[(len(boundaries) + 1) * index // partitions - 1] for index in range(1, partitions)]
+    elif partition_column:
+        low, high = get_column_range(sql_server, database_name, source, partition_column, where, params)
+        boundaries = split_range(low, high, partitions)
+    else:
+        if logger: logger.warning(f"{source} is not partitioned and no partition_column was given, reading it over a single connection.")
+        return [(None, [])]
+    if logger: logger.info(f"Reading {source} as {len(boundaries) + 1} ranges of {partition_column}")
+    return partition_filters(partition_column, boundaries, boundary_on_right) # type: ignore
+
+# marks the end of a range in the queue of table_to_partitioned_record_batch_reader
+_RANGE_DONE = object()
+
+def table_to_partitioned_record_batch_reader(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        partitions: int,
+        partition_column: str | None = None,
+        batch_rows: int | None = None,
+        max_memory_mb: int | None = None,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+        schema: pa.Schema | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+        fetch_backend: FetchBackend = "cursor",
+) -> pa.RecordBatchReader:
+    """
+    Streams a table or query from SQL Server as Arrow record batches, reading ranges of it over separate pooled connections at once.
+
+    Each range (see get_partition_ranges) is read by its own thread into a bounded queue, so a single writer receives the batches of every range as they arrive.
+    The reader yields the same rows as table_to_record_batch_reader, but not in the same order. The connection pool needs at least one connection per range.
+    An error reading any range is raised by the reader.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        partitions (int): Maximum number of ranges read at once.
+        partition_column (str, None, optional): Numeric or date column to split on. Defaults to the partitioning column of the table.
+        batch_rows (int, None, optional): Maximum number of rows per batch. Defaults to DEFAULT_BATCH_ROWS.
+        max_memory_mb (int, None, optional): Approximate upper bound for the Arrow size of a single batch.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+        schema (pa.Schema, None, optional): Schema the rows are decoded into, rather than inferring it from the first batches.
+        order_by (Sequence[str], None, optional): Columns SQL Server sorts the rows of each range by.
+        columns (Sequence[str], None, optional): Columns to read. Defaults to every column.
+        fetch_backend (str, ('cursor', 'arrow_odbc'), optional): How the rows of each range are fetched, see table_to_record_batch_reader. Defaults to "cursor".
+
+    Returns:
+        pa.RecordBatchReader: Reader yielding the rows of the source. The schema is schema if given, otherwise unified from the first batch of every range.
+    """
+    ranges = get_partition_ranges(sql_server, database_name, source, partitions, partition_column, where, params)
+    if len(ranges) == 1:
+        return table_to_record_batch_reader(sql_server, database_name, source, batch_rows, max_memory_mb, where, params, schema, order_by, columns, fetch_backend)
+
+    def open_range(range_filter: Tuple[str | None, List[Any]]) -> pa.RecordBatchReader:
+        range_where, range_params = range_filter
+        return table_to_record_batch_reader(
+            sql_server,
+            database_name,
+            source,
+            batch_rows,
+            max_memory_mb,
+            where=f"({where}) AND ({range_where})" if where else range_where,
+            params=[*(params or []), *range_params],
+            schema=schema,
+            order_by=order_by,
+            columns=columns,
+            fetch_backend=fetch_backend
+        )
+
+    # every range runs its query and fetches its first batch at once
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="sql_fabric_copy_range") as executor:
+        futures = [executor.submit(open_range, range_filter) for range_filter in ranges]
+    readers = [future.result() for future in futures if future.exception() is None]
+    failed = [future.exception() for future in futures if future.exception() is not None]
+    if failed:
+        for reader in readers:
+            reader.close()
+        raise failed[0] # type: ignore
+    if schema is None:
+        # a range with no rows or only NULLs infers null types, so take the widest type of each column
+        schema = pa.unify_schemas([reader.schema for reader in readers], promote_options="permissive")
+
+    batch_queue : queue.Queue[Any] = queue.Queue(maxsize=len(readers) * 2)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read_range(reader: pa.RecordBatchReader):
+        try:
+            for batch in reader:
+                if not put(batch):
+                    break
+        except BaseException as range_error:
+            put(range_error)
+        finally:
+            reader.close()
+            put(_RANGE_DONE)
+
+    threads = [
+        threading.Thread(target=read_range, args=(reader,), name=f"sql_fabric_copy_range_{index}", daemon=True)
+        for index, reader in enumerate(readers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        try:
+            running = len(threads)
+            while running:
+                item = batch_queue.get()
+                if item is _RANGE_DONE:
+                    running -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield item if item.schema.equals(schema) else item.cast(schema)
+        finally:
+            # stop the other ranges, e.g. when one failed or the writer gave up
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+def sql_literal(value: Any) -> str:
+    """
+    Renders a value as a SQL Server literal, for tools such as bcp that cannot bind parameters.
+
+    Parameters:
+        value (Any): None, bool, number, string, bytes, date, time or datetime.
+
+    Returns:
+        str: The literal, e.g. N'O''Brien', 0x00FF or CONVERT(datetime2, '2024-01-31T12:00:00', 126).
+
+    Throws:
+        Exception: If the value has no literal form.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, str):
+        return "N'" + value.replace("'", "''") + "'"
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex().upper()
+    if isinstance(value, datetime):
+        return f"CONVERT(datetime2, '{value.replace(tzinfo=None).isoformat()}', 126)"
+    if isinstance(value, date):
+        return f"CONVERT(date, '{value.isoformat()}', 23)"
+    if isinstance(value, time):
+        return f"CONVERT(time, '{value.isoformat()}', 114)"
+    raise Exception(f"Cannot render {type(value).__name__} value {value!r} as a SQL literal.")
+
+def bind_literals(query: str, params: Sequence[Any] | None) -> str:
+    """
+    Replaces the ? placeholders of a query with the literals of params, in order.
+
+    The placeholders must not occur inside string literals or identifiers of the query, as is the case for the filters built by this package.
+
+    Parameters:
+        query (str): Query using ? placeholders.
+        params (Sequence, None): Values of the placeholders.
+
+    Returns:
+        str: The query with every placeholder replaced.
+
+    Throws:
+        Exception: If the number of placeholders and params differ.
+    """
+    parts = query.split("?")
+    params = list(params or [])
+    if len(parts) - 1 != len(params):
+        raise Exception(f"Query has {len(parts) - 1} placeholders but {len(params)} params were given: {query}")
+    return parts[0] + "".join(sql_literal(value) + part for value, part in zip(params, parts[1:]))
+
+class _BcpTextStream(io.RawIOBase):
+    """
+    Readable stream of bcp character output rewritten as text pyarrow.csv can parse.
+
+    Backslashes and line breaks inside values are escaped with a backslash, and the row terminator becomes a line break.
+    The rewrite works on bytes, which is safe for UTF-8 as these characters never occur inside multi-byte sequences.
+    """
+    def __init__(self, raw: Any, chunk_bytes: int = 1024 * 1024) -> None:
+        super().__init__()
+        self._raw = raw
+        self._chunk_bytes = chunk_bytes
+        self._pending = bytearray()
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self, size: int):
+        while len(self._pending) < size and not self._eof:
+            chunk = self._raw.read(self._chunk_bytes)
+            if not chunk:
+                self._eof = True
+                break
+            self._pending += (
+                chunk.replace(b"\\", b"\\\\")
+                .replace(b"\r", b"\\\r")
+                .replace(b"\n", b"\\\n")
+                .replace(b"\x1e", b"\n")
+            )
+
+    def is_empty(self) -> bool:
+        self._fill(1)
+        return not self._pending
+
+    def read(self, size: int = -1) -> bytes: # type: ignore
+        if size is None or size < 0:
+            self._fill(2 ** 62)
+            size = len(self._pending)
+        else:
+            self._fill(size)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def _bcp_read_type(data_type: pa.DataType) -> pa.DataType:
+    """
+    Returns the type a column is parsed as from bcp output, before _convert_bcp_column converts it to data_type.
+    """
+    if (
+        pa.types.is_null(data_type)
+        or pa.types.is_binary(data_type)
+        or pa.types.is_large_binary(data_type)
+        or pa.types.is_timestamp(data_type)
+        or pa.types.is_time(data_type)
+        or pa.types.is_large_string(data_type)
+    ):
+        return pa.string()
+    return data_type
+
+def _convert_bcp_column(column: pa.Array, data_type: pa.DataType) -> pa.Array:
+    """
+    Converts a column parsed from bcp output to its type.
+
+    bcp writes an empty string as a NUL character (an empty field being NULL), binary values as hexadecimal,
+    and times with up to 7 fractional digits, which are truncated to microseconds. datetimeoffset values end with a space and their offset.
+    """
+    import pyarrow.compute as pc
+    if pa.types.is_string(data_type) or pa.types.is_large_string(data_type) or pa.types.is_null(data_type):
+        column = pc.if_else(pc.equal(column, "\x00"), "", column) # type: ignore
+        return column if pa.types.is_null(data_type) else column.cast(data_type) # type: ignore
+    if pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+        return pa.array([None if value is None else bytes.fromhex(value) for value in column.to_pylist()], data_type)
+    if pa.types.is_timestamp(data_type) and data_type.tz: # type: ignore
+        return pc.replace_substring_regex(column, r"^(.{19}(?:\.\d{1,6})?)\d* ?([+-]\d\d:\d\d)$", r"\1\2").cast(data_type) # type: ignore
+    if pa.types.is_timestamp(data_type):
+        return pc.utf8_slice_codeunits(column, 0, 26).cast(data_type) # type: ignore
+    if pa.types.is_time(data_type):
+        timestamps = pc.binary_join_element_wise("1970-01-01 ", pc.utf8_slice_codeunits(column, 0, 15), "") # type: ignore
+        return timestamps.cast(pa.timestamp("us")).cast(data_type) # type: ignore
+    return column
+
+def _open_bcp_pipe(pipe_path: str, process: subprocess.Popen) -> Any: # type: ignore
+    """
+    Opens the reading end of the named pipe bcp writes to, without hanging if bcp exits before opening it.
+    """
+    opened : Dict[str, Any] = {}
+
+    def open_pipe():
+        opened["file"] = open(pipe_path, "rb")
+
+    thread = threading.Thread(target=open_pipe, name="sql_fabric_copy_bcp_pipe", daemon=True)
+    thread.start()
+    while thread.is_alive():
+        thread.join(0.1)
+        if thread.is_alive() and process.poll() is not None:
+            # open the writing end so the reader sees an empty pipe, and the exit code of bcp is reported
+            with open(pipe_path, "wb"):
+                pass
+            thread.join()
+    return opened["file"]
+
+def bcp_server_arguments(sql_server: str, database_name: str) -> Tuple[str, str]:
+    """
+    Returns the server and database bcp connects to, given as its -S and -d arguments.
+
+    bcp takes a port after a comma, so host:port becomes host,port. A SQLAlchemy mssql URL is reduced to its host, port and
+    database, read from the odbc_connect connection string when it has one. Other URLs are passed as is.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, e.g. localhost, localhost\\SQLEXPRESS, tcp:server,1433 or server:1433, or a full SQLAlchemy URL.
+        database_name (str): Name of database, used unless the URL names one.
+
+    Returns:
+        Tuple[str, str]: The server and database arguments.
+    """
+    sql_server = sql_server.strip()
+    if "://" in sql_server:
+        from sqlalchemy.engine import make_url
+        url = make_url(sql_server)
+        if url.get_backend_name() != "mssql":
+            return sql_server, database_name
+        odbc_connect = url.query.get("odbc_connect")
+        if odbc_connect:
+            settings = {
+                key.strip().lower(): value.strip().strip("{}")
+                for key, _, value in (part.partition("=") for part in str(odbc_connect).split(";") if "=" in part)
+            }
+            sql_server = settings.get("server") or settings.get("address") or ""
+            database_name = settings.get("database") or database_name
+        else:
+            sql_server = f"{url.host},{url.port}" if url.port else url.host or ""
+            database_name = url.database or database_name
+    match = re.fullmatch(r"((?:tcp:)?[^:,]+):(\d+)", sql_server)
+    if match:
+        sql_server = f"{match.group(1)},{match.group(2)}"
+    return sql_server, database_name
+
+def bcp_login_arguments(sql_server: str, authentication: BcpAuthentication | None = None) -> List[str]:
+    """
+    Returns the arguments bcp logs in to SQL Server with.
+
+    "trusted" uses Windows authentication (-T). "sql" logs in as a SQL Server login (-U, -P). "entra" uses Microsoft Entra ID (-G),
+    with -U and -P for a password login when a login is given, and integrated authentication otherwise. The login is taken from the
+    URL of sql_server, or else from the BCP_USER_VARIABLE and BCP_PASSWORD_VARIABLE environment variables. bcp only takes the password
+    on its command line, where other users of the machine can see it in the process list.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, or a full SQLAlchemy URL.
+        authentication (str, ('trusted', 'sql', 'entra'), None, optional): How bcp logs in. Defaults to "sql" when a login is given, and "trusted" otherwise.
+
+    Returns:
+        List[str]: The login arguments.
+
+    Throws:
+        Exception: If authentication is "sql" and no login is given.
+    """
+    user, password = os.environ.get(BCP_USER_VARIABLE), os.environ.get(BCP_PASSWORD_VARIABLE)
+    if "://" in sql_server:
+        from sqlalchemy.engine import make_url
+        url = make_url(sql_server)
+        if url.username:
+            user, password = url.username, url.password
+    login = ["-U", user, "-P", password or ""] if user else []
+    authentication = authentication or ("sql" if user else "trusted")
+    if authentication == "trusted":
+        return ["-T"]
+    if authentication == "sql":
+        if not user:
+            raise Exception(f"bcp authentication 'sql' needs a login, in the URL of sql_server or the {BCP_USER_VARIABLE} and {BCP_PASSWORD_VARIABLE} environment variables.")
+        return login
+    return ["-G", *(login or ["-T"])]
+
+def table_to_bcp_record_batch_reader(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        batch_rows: int | None = None,
+        max_memory_mb: int | None = None,
+        where: str | None = None,
+        params: Sequence[Any] | None = None,
+        bcp_path: str | None = None,
+        use_pipe: bool | None = None,
+        schema: pa.Schema | None = None,
+        order_by: Sequence[str] | None = None,
+        columns: Sequence[str] | None = None,
+        authentication: BcpAuthentication | None = None,
+) -> pa.RecordBatchReader:
+    """
+    Streams a table or query from SQL Server as Arrow record batches, exporting it with bcp in character mode and parsing the output with pyarrow.csv.
+
+    Unless schema is given, it is inferred from the first rows fetched over the pooled connection, the same way as table_to_record_batch_reader, so both yield the same types.
+    Columns with no values in those rows are read as strings, and empty binary values are read as NULL, as bcp writes both as an empty field. bcp logs in as set by authentication, see bcp_login_arguments.
+    On POSIX bcp writes to a named pipe which is parsed as it is written, so the export never lands on disk; elsewhere it writes a temporary file which is parsed once bcp has finished.
+    Parameters are rendered as literals with sql_literal, as bcp cannot bind them.
+
+    Parameters:
+        sql_server (str): Address of SQL Server, or a full SQLAlchemy URL, see bcp_server_arguments.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        batch_rows (int, None, optional): Approximate number of rows per batch, estimated from the width of the first rows.
+        max_memory_mb (int, None, optional): Approximate upper bound for the text parsed into a single batch.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (Sequence, None, optional): Values of the placeholders in where.
+        bcp_path (str, None, optional): bcp executable. Defaults to BCP_PATH.
+        use_pipe (bool, None, optional): Whether bcp writes to a named pipe. Defaults to True where named pipes can be created with os.mkfifo.
+        schema (pa.Schema, None, optional): Schema the output is parsed into (see schema_tools.get_source_schema).
+        order_by (Sequence[str], None, optional): Columns SQL Server sorts the rows by.
+        columns (Sequence[str], None, optional): Columns to export. Defaults to every column.
+        authentication (str, ('trusted', 'sql', 'entra'), None, optional): How bcp logs in, see bcp_login_arguments.
+
+    Returns:
+        pa.RecordBatchReader: Reader yielding the rows of the source.
+
+    Throws:
+        Exception: If bcp exits with an error, including its output, or authentication is "sql" without a login.
+    """
+    import pyarrow.csv as pa_csv
+    if use_pipe is None:
+        use_pipe = hasattr(os, "mkfifo")
+    sample : pa.RecordBatch | None = None
+    if schema is None:
+        probe = table_to_record_batch_reader(sql_server, database_name, source, MEMORY_PROBE_ROWS, where=where, params=params, columns=columns)
+        try:
+            sample = probe.read_next_batch()
+        except StopIteration:
+            pass
+        finally:
+            probe.close()
+        schema = pa.schema([
+            field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+            for field in probe.schema
+        ])
+    block_bytes = DEFAULT_BCP_BLOCK_BYTES
+    if batch_rows and sample is not None and sample.num_rows:
+        block_bytes = batch_rows * max(1, -(-sample.nbytes // sample.num_rows))
+    elif batch_rows:
+        # text width of a row is unknown without a sample, so assume a modest width
+        block_bytes = batch_rows * 256
+    if max_memory_mb:
+        block_bytes = min(block_bytes, max_memory_mb * 1024 * 1024)
+    read_schema = pa.schema([field.with_type(_bcp_read_type(field.type)) for field in schema])
+
+    query = bind_literals(source_to_query(source, where, order_by, columns), params)
+    server, database = bcp_server_arguments(sql_server, database_name)
+    login = bcp_login_arguments(sql_server, authentication)
+    if logger: logger.info(f"Exporting query with bcp from {server}: {query} ({block_bytes=}, {use_pipe=})")
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        directory = tempfile.mkdtemp(prefix="sql_fabric_copy_bcp_")
+        output_path = path.join(directory, "output")
+        if use_pipe:
+            os.mkfifo(output_path) # type: ignore
+        arguments : List[str] = [
+            bcp_path or BCP_PATH,
+            query,
+            "queryout",
+            output_path,
+            "-c",                                          # character data
+            "-t", BCP_FIELD_TERMINATOR,                    # field terminator
+            "-r", BCP_ROW_TERMINATOR,                      # row terminator
+            "-S", server,                                  # server name
+            "-d", database,                                # database name
+            *login,                                        # authentication
+        ]
+        if os.name == "nt":
+            arguments += ["-C", "65001"]                   # UTF-8 output (the default elsewhere)
+        log = open(path.join(directory, "bcp.log"), "w+b")
+        process = subprocess.Popen(arguments, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            if use_pipe:
+                raw = _open_bcp_pipe(output_path, process)
+            else:
+                process.wait()
+                raw = open(output_path, "rb") if process.returncode == 0 else io.BytesIO()
+            with raw:
+                stream = _BcpTextStream(raw)
+                if not stream.is_empty():
+                    reader = pa_csv.open_csv(
+                        stream,
+                        read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=block_bytes),
+                        parse_options=pa_csv.ParseOptions(
+                            delimiter="\x1f",
+                            quote_char=False,
+                            escape_char="\\",
+                            newlines_in_values=True
+                        ),
+                        convert_options=pa_csv.ConvertOptions(
+                            column_types=read_schema,
+                            null_values=[""],
+                            strings_can_be_null=True
+                        )
+                    )
+                    for batch in reader:
+                        columns = [
+                            _convert_bcp_column(column, field.type)
+                            for column, field in zip(batch.columns, schema)
+                        ]
+                        batch = pa.RecordBatch.from_arrays(columns, schema=schema)
+                        if logger: logger.debug(f"Parsed batch of {batch.num_rows} rows ({batch.nbytes} bytes)")
+                        yield batch
+            process.wait()
+            if process.returncode != 0:
+                log.seek(0)
+                output = log.read().decode(errors="replace").strip()
+                raise Exception(f"bcp exited with code {process.returncode}: {output}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            log.close()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
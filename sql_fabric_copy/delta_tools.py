@@ -0,0 +1,284 @@
+""" Module with functions for working with Delta tables written by sql_fabric_copy. """
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+import json
+from logging import Logger
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Literal
+from urllib.parse import unquote
+
+import pyarrow as pa
+if TYPE_CHECKING:
+    from deltalake import CommitProperties, WriterProperties # type: ignore
+
+logger : Logger | None = None
+
+WATERMARK_METADATA_KEY = "sql_fabric_copy.watermark"
+
+ParquetCompression = Literal["uncompressed", "snappy", "gzip", "brotli", "lz4", "zstd", "lz4_raw"]
+
+@dataclass
+class ParquetLayout:
+    """
+    Layout of the parquet files written to a Delta table. Settings left as None use the deltalake defaults.
+
+    target_file_size_mb splits a write into files of about this size, which are uploaded in parallel and read in parallel by Fabric Spark.
+    row_group_rows limits the rows of a row group, the unit Direct Lake and Spark read and skip by.
+    """
+    target_file_size_mb: int | None = None
+    row_group_rows: int | None = None
+    compression: ParquetCompression | None = None
+    compression_level: int | None = None
+    dictionary_encoding: bool | None = None
+
+    def writer_properties(self) -> "WriterProperties | None":
+        """
+        Returns the deltalake writer properties of the layout, or None if every setting is a default.
+        """
+        from deltalake import ColumnProperties, WriterProperties # type: ignore
+        if self.row_group_rows is None and self.compression is None and self.compression_level is None and self.dictionary_encoding is None:
+            return None
+        # a level on its own selects zstd, the codec levels are most useful for
+        compression = self.compression or ("zstd" if self.compression_level is not None else None)
+        return WriterProperties(
+            max_row_group_size=self.row_group_rows,
+            compression=compression.upper() if compression else None, # type: ignore
+            compression_level=self.compression_level,
+            default_column_properties=ColumnProperties(dictionary_enabled=self.dictionary_encoding) if self.dictionary_encoding is not None else None
+        )
+
+    def target_file_size(self) -> int | None:
+        """
+        Returns the target file size in bytes, or None to use the deltalake default.
+        """
+        return self.target_file_size_mb * 1024 * 1024 if self.target_file_size_mb else None
+
+def encode_watermark(value: Any) -> str:
+    """
+    Encodes a watermark value read from SQL Server as JSON, keeping its type.
+
+    Parameters:
+        value (Any): The watermark value, e.g. an int (identity), bytes (rowversion) or datetime (modified date).
+
+    Returns:
+        str: The encoded watermark.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        encoded = {"type": "bytes", "value": bytes(value).hex()}
+    elif isinstance(value, datetime):
+        encoded = {"type": "datetime", "value": value.isoformat()}
+    elif isinstance(value, date):
+        encoded = {"type": "date", "value": value.isoformat()}
+    elif isinstance(value, Decimal):
+        encoded = {"type": "decimal", "value": str(value)}
+    elif isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise Exception(f"Unsupported watermark type {type(value).__name__}.")
+    else:
+        encoded = {"type": type(value).__name__, "value": value}
+    return json.dumps(encoded)
+
+def decode_watermark(encoded: str) -> Any:
+    """
+    Decodes a watermark encoded with encode_watermark.
+
+    Parameters:
+        encoded (str): The encoded watermark.
+
+    Returns:
+        Any: The watermark value, as the type it was read from SQL Server.
+    """
+    watermark : Dict[str, Any] = json.loads(encoded)
+    value_type, value = watermark["type"], watermark["value"]
+    if value_type == "bytes":
+        return bytes.fromhex(value)
+    if value_type == "datetime":
+        return datetime.fromisoformat(value)
+    if value_type == "date":
+        return date.fromisoformat(value)
+    if value_type == "decimal":
+        return Decimal(value)
+    return value
+
+def read_watermark(
+    table_uri: str,
+    storage_options: Dict[str, str] | None = None
+) -> Any | None:
+    """
+    Reads the high-water mark recorded by the last incremental load of a Delta table.
+
+    The commit history is read newest first. Commits without a watermark, such as maintenance, are skipped,
+    but an overwrite without one means the table was fully reloaded and the old watermark no longer applies.
+
+    Parameters:
+        table_uri (str): Path or URI of the Delta table.
+        storage_options (Dict[str, str], None, optional): deltalake storage options for remote tables.
+
+    Returns:
+        Any, None: The watermark value, or None if the table does not exist or has no applicable watermark.
+    """
+    from deltalake import DeltaTable # type: ignore
+    if not DeltaTable.is_deltatable(table_uri, storage_options=storage_options):
+        return None
+    for commit in DeltaTable(table_uri, storage_options=storage_options).history():
+        if WATERMARK_METADATA_KEY in commit:
+            watermark = decode_watermark(commit[WATERMARK_METADATA_KEY])
+            if logger: logger.debug(f"Read watermark {watermark!r} from version {commit.get('version')} of {table_uri}")
+            return watermark
+        if commit.get("operationParameters", {}).get("mode") == "Overwrite":
+            break
+    return None
+
+def get_data_files(
+    table_uri: str,
+    storage_options: Dict[str, str] | None = None
+) -> Dict[str, int]:
+    """
+    Lists the data files of the current version of a Delta table, reading only its _delta_log.
+
+    Parameters:
+        table_uri (str): Path or URI of the Delta table.
+        storage_options (Dict[str, str], None, optional): deltalake storage options for remote tables.
+
+    Returns:
+        Dict[str, int]: Size of each data file, by path relative to the table using "/" separators. Empty if the path is not a Delta table.
+    """
+    from deltalake import DeltaTable # type: ignore
+    if not DeltaTable.is_deltatable(table_uri, storage_options=storage_options):
+        return {}
+    actions = pa.table(DeltaTable(table_uri, storage_options=storage_options).get_add_actions(flatten=True))
+    return {
+        unquote(file_path): size
+        for file_path, size in zip(actions.column("path").to_pylist(), actions.column("size_bytes").to_pylist())
+    }
+
+def get_removed_files(local_table_path: str) -> Dict[str, int]:
+    """
+    Lists the data files removed from a local Delta table, from the remove actions of its _delta_log commits and checkpoints.
+
+    Parameters:
+        local_table_path (str): Path of the local Delta table.
+
+    Returns:
+        Dict[str, int]: Time each data file was last removed, in milliseconds since the epoch, by path relative to the table using "/" separators. Empty if the path has no _delta_log.
+    """
+    log_directory = os.path.join(local_table_path, "_delta_log")
+    if not os.path.isdir(log_directory):
+        return {}
+    removed : Dict[str, int] = {}
+
+    def record(action: Dict[str, Any] | None):
+        if action and action.get("path"):
+            file_path = unquote(action["path"])
+            removed[file_path] = max(removed.get(file_path, 0), action.get("deletionTimestamp") or 0)
+
+    for file_name in sorted(os.listdir(log_directory)):
+        file_path = os.path.join(log_directory, file_name)
+        if file_name.endswith(".json"):
+            with open(file_path, "r", encoding="utf-8") as commit:
+                for line in commit:
+                    if line.strip():
+                        record(json.loads(line).get("remove"))
+        elif file_name.endswith(".checkpoint.parquet"):
+            import pyarrow.parquet as pq
+            checkpoint = pq.read_table(file_path, columns=["remove"])
+            for action in checkpoint.column("remove").to_pylist():
+                record(action)
+    return removed
+
+def get_table_version(
+    table_uri: str,
+    storage_options: Dict[str, str] | None = None
+) -> int | None:
+    """
+    Returns the current version of a Delta table.
+
+    Parameters:
+        table_uri (str): Path or URI of the Delta table.
+        storage_options (Dict[str, str], None, optional): deltalake storage options for remote tables.
+
+    Returns:
+        int, None: The version, or None if the path is not a Delta table.
+    """
+    from deltalake import DeltaTable # type: ignore
+    if not DeltaTable.is_deltatable(table_uri, storage_options=storage_options):
+        return None
+    return DeltaTable(table_uri, storage_options=storage_options).version()
+
+def watermark_commit_properties(value: Any) -> "CommitProperties":
+    """
+    Returns commit properties recording a high-water mark in the commit metadata, read back by read_watermark.
+
+    Parameters:
+        value (Any): The watermark value.
+
+    Returns:
+        CommitProperties: The commit properties to pass to the writer.
+    """
+    from deltalake import CommitProperties # type: ignore
+    return CommitProperties(custom_metadata={WATERMARK_METADATA_KEY: encode_watermark(value)})
+
+def quote_delta_identifier(name: str) -> str:
+    """
+    Quotes a column name for use in deltalake predicates and expressions.
+
+    Parameters:
+        name (str): The unquoted name.
+
+    Returns:
+        str: The name in backticks, with backticks escaped.
+    """
+    return f"`{name.replace('`', '``')}`"
+
+def merge_into_table(
+    table_uri: str,
+    data: Any,
+    primary_key: List[str],
+    storage_options: Dict[str, str] | None = None,
+    commit_properties: "CommitProperties | None" = None,
+    operation_column: str | None = None,
+    writer_properties: "WriterProperties | None" = None,
+) -> Dict[str, Any]:
+    """
+    Upserts rows into an existing Delta table with a Delta MERGE keyed on the primary key.
+
+    Parameters:
+        table_uri (str): Path or URI of the Delta table.
+        data (Any): Changed rows, as a pandas DataFrame or Arrow table / RecordBatchReader.
+        primary_key (List[str]): Columns identifying a row.
+        storage_options (Dict[str, str], None, optional): deltalake storage options for remote tables.
+        commit_properties (CommitProperties, None, optional): Properties of the commit, e.g. from watermark_commit_properties.
+        operation_column (str, None, optional): Column of data holding the SQL Server change tracking operation. Rows where it is 'D' are deleted from the table, and the column itself is not written.
+        writer_properties (WriterProperties, None, optional): Parquet settings of the rewritten files, e.g. from ParquetLayout.writer_properties.
+
+    Returns:
+        Dict[str, Any]: The merge metrics reported by deltalake.
+    """
+    from deltalake import DeltaTable # type: ignore
+    table = DeltaTable(table_uri, storage_options=storage_options)
+    predicate = " AND ".join(
+        f"target.{quote_delta_identifier(column)} = source.{quote_delta_identifier(column)}" for column in primary_key
+    )
+    merger = table.merge(
+        data,
+        predicate,
+        source_alias="source",
+        target_alias="target",
+        writer_properties=writer_properties,
+        commit_properties=commit_properties
+    )
+    if operation_column:
+        columns = [field.name for field in table.schema().fields]
+        values = {quote_delta_identifier(column): f"source.{quote_delta_identifier(column)}" for column in columns}
+        deleted = f"source.{quote_delta_identifier(operation_column)} = 'D'"
+        not_deleted = f"source.{quote_delta_identifier(operation_column)} <> 'D'"
+        merger = (
+            merger.when_matched_delete(predicate=deleted)
+            .when_matched_update(values, predicate=not_deleted)
+            .when_not_matched_insert(values, predicate=not_deleted)
+        )
+    else:
+        merger = merger.when_matched_update_all().when_not_matched_insert_all()
+    metrics = merger.execute()
+    if logger: logger.info(f"Merged into {table_uri}: {metrics}")
+    return metrics
@@ -0,0 +1,71 @@
+""" Module with a cache of source fingerprints from the last successful copy of each table. """
+import json
+from logging import Logger
+import os
+import os.path as path
+import threading
+from typing import Any, Dict, List
+
+logger : Logger | None = None
+
+class FingerprintManifest:
+    """
+    JSON file mapping each copied source and target to the fingerprint of the source at its last successful copy.
+
+    Safe to share between the threads of a parallel run. Every update is written straight back to the file.
+    """
+    def __init__(self, manifest_path: str) -> None:
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._fingerprints : Dict[str, str] = {}
+        if path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as manifest:
+                self._fingerprints = json.load(manifest)
+            if logger: logger.debug(f"Loaded {len(self._fingerprints)} fingerprints from {manifest_path}")
+
+    def get(self, key: str) -> str | None:
+        """
+        Returns the fingerprint recorded for a key, or None if it has not been copied.
+        """
+        with self._lock:
+            return self._fingerprints.get(key)
+
+    def set(self, key: str, fingerprint: str):
+        """
+        Records the fingerprint of a key and saves the manifest.
+        """
+        with self._lock:
+            self._fingerprints[key] = fingerprint
+            directory = path.dirname(self.manifest_path)
+            if directory and not path.exists(directory):
+                os.makedirs(directory)
+            temp_path = f"{self.manifest_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as manifest:
+                json.dump(self._fingerprints, manifest, indent=2, sort_keys=True)
+            # replace in one step so an interrupted run never leaves a truncated manifest
+            os.replace(temp_path, self.manifest_path)
+
+def fingerprint_key(
+    sql_server: str,
+    database_name: str,
+    source: str,
+    workspace_name: str,
+    lakehouse_name: str,
+    target_table: str,
+    columns: List[str] | None = None,
+    where: str | None = None,
+    where_params: List[Any] | None = None,
+) -> str:
+    """
+    Returns the manifest key of a copy from a source to a Lakehouse table.
+
+    The columns and row filter copied are part of the key, so a copy with another projection or filter is never taken
+    for an unchanged one. Copies of every row and column keep the key of the source and target alone.
+    """
+    key = f"{sql_server}/{database_name}/{source} => {workspace_name}/{lakehouse_name}/{target_table}"
+    selection = {
+        name: value for name, value in (("columns", columns), ("where", where), ("where_params", where_params)) if value
+    }
+    if selection:
+        key = f"{key} {json.dumps(selection, sort_keys=True, default=str)}"
+    return key
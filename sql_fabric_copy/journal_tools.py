@@ -0,0 +1,115 @@
+""" Module with the journal of a run, recording how far each table got so an interrupted run can be resumed. """
+import copy
+import json
+from logging import Logger
+import os
+import os.path as path
+import threading
+import time
+from typing import Any, Dict
+import uuid
+
+logger : Logger | None = None
+
+# folder below the local tables folder holding the journal of each run, and the range checkpoints of its tables
+RUNS_DIRECTORY = "_runs"
+
+# stages a table reaches in a run, in order
+STAGE_STAGED = "staged"
+STAGE_COMMITTED = "committed"
+
+def new_run_id() -> str:
+    """
+    Returns a new run id, starting with the time of the run so journals sort by it.
+    """
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+def journal_path(tables_directory: str, run_id: str) -> str:
+    """
+    Returns the path of the journal of a run, below the folder holding the local delta tables.
+    """
+    return path.join(tables_directory, RUNS_DIRECTORY, f"{run_id}.json")
+
+class RunJournal:
+    """
+    JSON file recording the progress of each table of a run through extract, write, upload and commit, keyed by fingerprint_key.
+
+    A table is "staged" once its new version is written to the local delta table, with the version and row count, and "committed"
+    once that version is published on the Lakehouse. Partitioned extracts may also record the ranges they were split into and which
+    of them are saved, see upload_table_lakehouse checkpoint_ranges. The last error of a table is kept until it moves on.
+
+    Safe to share between the threads of a parallel run. Every update is written straight back to the file.
+    """
+    def __init__(self, journal_path: str, run_id: str, resume: bool = False) -> None:
+        """
+        Parameters:
+            journal_path (str): Path of the journal, see journal_path.
+            run_id (str): Id of the run.
+            resume (bool, optional): Continue the journal of an interrupted run rather than start a new one. Defaults to False.
+
+        Throws:
+            Exception: If resume is set and the run has no journal, or it is not set and the run already has one.
+        """
+        self.journal_path = journal_path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._tables : Dict[str, Dict[str, Any]] = {}
+        exists = path.exists(journal_path)
+        if resume and not exists:
+            raise Exception(f"Run {run_id} has no journal at {journal_path} to resume.")
+        if not resume and exists:
+            raise Exception(f"Run {run_id} already has a journal at {journal_path}, resume it or start a run with another id.")
+        if exists:
+            with open(journal_path, "r", encoding="utf-8") as journal:
+                self._tables = json.load(journal)["tables"]
+            if logger: logger.info(f"Resuming run {run_id}: {len(self.tables_at(STAGE_COMMITTED))} of {len(self._tables)} tables committed")
+
+    def get(self, key: str) -> Dict[str, Any]:
+        """
+        Returns a copy of what is recorded for a table, empty if it has not started.
+        """
+        with self._lock:
+            return copy.deepcopy(self._tables.get(key, {}))
+
+    def update(self, key: str, **values: Any):
+        """
+        Records values of a table, e.g. its stage, and saves the journal. A value of None removes it.
+        """
+        with self._lock:
+            entry = self._tables.setdefault(key, {})
+            for name, value in values.items():
+                if value is None:
+                    entry.pop(name, None)
+                else:
+                    entry[name] = value
+            self._save()
+
+    def append(self, key: str, name: str, value: Any):
+        """
+        Appends a value to a list recorded for a table and saves the journal.
+        """
+        with self._lock:
+            self._tables.setdefault(key, {}).setdefault(name, []).append(value)
+            self._save()
+
+    def tables_at(self, stage: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the tables that reached a stage, by key.
+        """
+        return {key: entry for key, entry in self._tables.items() if entry.get("stage") == stage}
+
+    def checkpoint_directory(self, target_table: str) -> str:
+        """
+        Returns the folder holding the saved ranges of a table of the run.
+        """
+        return path.join(path.dirname(self.journal_path), self.run_id, target_table)
+
+    def _save(self):
+        directory = path.dirname(self.journal_path)
+        if directory and not path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as journal:
+            json.dump({"run_id": self.run_id, "tables": self._tables}, journal, indent=2, sort_keys=True, default=str)
+        # replace in one step so an interrupted run never leaves a truncated journal
+        os.replace(temp_path, self.journal_path)
@@ -0,0 +1,156 @@
+""" Module reading job manifests, which list the tables of a run with their own target, load mode, filter, columns and parquet settings. """
+from dataclasses import dataclass, field, fields
+import json
+from logging import Logger
+import os.path as path
+from typing import Any, Dict, List
+
+logger : Logger | None = None
+
+@dataclass
+class ManifestTable:
+    """
+    A source listed in a job manifest. Settings left as None use the options of the manifest, or the defaults of upload_table_lakehouse.
+    """
+    source: str
+    target_table: str | None = None
+    load_mode: str | None = None
+    where: str | None = None
+    where_params: List[Any] | None = None
+    columns: str | List[str] | None = None
+    watermark_column: str | None = None
+    primary_key: str | List[str] | None = None
+    sort_by: str | List[str] | None = None
+    partition_column: str | None = None
+    target_file_size_mb: int | None = None
+    row_group_rows: int | None = None
+    compression: str | None = None
+    compression_level: int | None = None
+    dictionary_encoding: bool | None = None
+
+# settings of a table that are arguments of upload_table_lakehouse given per source
+TABLE_SETTINGS = [table_field.name for table_field in fields(ManifestTable) if table_field.name != "source"]
+
+@dataclass
+class JobManifest:
+    """
+    The tables of a run and the arguments of upload_table_lakehouse shared by all of them, e.g. sql_server, parallel or sink.
+    """
+    tables: List[ManifestTable]
+    options: Dict[str, Any] = field(default_factory=dict)
+
+def parse_manifest(content: Dict[str, Any] | List[Any]) -> JobManifest:
+    """
+    Reads a job manifest from its parsed JSON or YAML.
+
+    A manifest is either a list of tables or an object with "tables" and "options". Each table is the name of a table or query,
+    or an object with a "source" and any of the settings of ManifestTable:
+
+        {
+            "options": {"sql_server": "localhost", "database_name": "AdventureWorksDW", "parallel": 4},
+            "tables": [
+                "dbo.DimCurrency",
+                {"source": "dbo.FactInternetSales", "load_mode": "incremental", "watermark_column": "OrderDateKey", "compression": "zstd"}
+            ]
+        }
+
+    Parameters:
+        content (Dict[str, Any], List[Any]): The parsed manifest.
+
+    Returns:
+        JobManifest: The manifest.
+
+    Throws:
+        Exception: If a table has no source or an unknown setting, a query has no target_table, a source is listed twice, or the options set source.
+    """
+    if isinstance(content, list):
+        content = {"tables": content}
+    unknown = set(content) - {"tables", "options"}
+    if unknown:
+        raise Exception(f"Unknown manifest keys: {', '.join(sorted(unknown))}.")
+    options = dict(content.get("options") or {})
+    if "source" in options or "target_table" in options:
+        raise Exception("Manifest options cannot set source or target_table, which are given per table.")
+    tables : List[ManifestTable] = []
+    for entry in content.get("tables") or []:
+        if isinstance(entry, str):
+            entry = {"source": entry}
+        if not entry.get("source"):
+            raise Exception(f"Manifest table without a source: {entry}")
+        unknown = set(entry) - {"source", *TABLE_SETTINGS}
+        if unknown:
+            raise Exception(f"Unknown settings of {entry['source']} in manifest: {', '.join(sorted(unknown))}.")
+        if entry.get("where_params") is not None and not isinstance(entry["where_params"], list):
+            raise Exception(f"where_params of {entry['source']} in manifest must be a list of the values of the ? placeholders of its where.")
+        if " from " in entry["source"].lower() and not entry.get("target_table"):
+            raise Exception(f"Manifest table {entry['source']} is a query, which needs a target_table.")
+        tables.append(ManifestTable(**{**entry, "source": entry["source"].strip()}))
+    sources = [table.source for table in tables]
+    duplicates = sorted({source for source in sources if sources.count(source) > 1})
+    if duplicates:
+        raise Exception(f"Sources listed more than once in manifest: {', '.join(duplicates)}.")
+    if not tables:
+        raise Exception("Manifest lists no tables.")
+    if logger: logger.debug(f"Read manifest of {len(tables)} tables with options {sorted(options)}")
+    return JobManifest(tables, options)
+
+def load_manifest(location: str) -> JobManifest:
+    """
+    Reads a job manifest from a JSON file, or a YAML file when it ends with .yaml or .yml, which needs PyYAML. See parse_manifest for the format.
+
+    Parameters:
+        location (str): Path of the manifest.
+
+    Returns:
+        JobManifest: The manifest.
+
+    Throws:
+        Exception: If the manifest is not valid, or PyYAML is not installed for a YAML manifest.
+    """
+    with open(location, "r", encoding="utf-8") as manifest_file:
+        if path.splitext(location)[1].lower() in (".yaml", ".yml"):
+            try:
+                import yaml # type: ignore
+            except ImportError:
+                raise Exception(f"PyYAML is required to read the YAML manifest {location}: pip install pyyaml")
+            content = yaml.safe_load(manifest_file)
+        else:
+            content = json.load(manifest_file)
+    return parse_manifest(content)
+
+def manifest_arguments(manifest: JobManifest) -> Dict[str, Any]:
+    """
+    Returns the arguments of upload_table_lakehouse copying the tables of a manifest.
+
+    A setting given for any table is passed as a dictionary of source to value, holding the option of the manifest for the tables that do not set it.
+
+    Parameters:
+        manifest (JobManifest): The manifest.
+
+    Returns:
+        Dict[str, Any]: The arguments, source being the list of sources in manifest order.
+    """
+    arguments = dict(manifest.options)
+    arguments["source"] = [table.source for table in manifest.tables]
+    for setting in TABLE_SETTINGS:
+        if all(_table_setting(table, setting) is None for table in manifest.tables):
+            continue
+        shared = arguments.get(setting)
+        values : Dict[str, Any] = {}
+        for table in manifest.tables:
+            value = _table_setting(table, setting)
+            if value is None:
+                # the option may itself be given per source, e.g. by a command line "table=column" list
+                value = shared.get(table.source) if isinstance(shared, dict) else shared
+            values[table.source] = value
+        arguments[setting] = values
+    return arguments
+
+def _table_setting(table: ManifestTable, setting: str) -> Any:
+    """
+    Returns a setting of a table, None to use the option of the manifest. A table with its own where has no placeholder values unless it sets them.
+    """
+    value = getattr(table, setting)
+    if setting == "where_params" and value is None and table.where is not None:
+        return []
+    return value
@@ -0,0 +1,193 @@
+""" Module with per-stage metrics of table copies, delivered to pluggable hooks. """
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+import json
+from logging import Logger
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, List, TextIO
+
+import pyarrow as pa
+
+logger : Logger | None = None
+
+@dataclass
+class StageMetrics:
+    """
+    Measurements of one stage of copying one source.
+
+    Stages are "fingerprint", "prepare" (reading the Lakehouse _delta_log), "extract", "write" (the local or direct Delta write, or CSV file),
+    "upload" and "table" (the whole copy of the source).
+    """
+    source: str
+    target_table: str | None
+    stage: str
+    started: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    seconds: float = 0.0
+    rows: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    files: int = 0
+    retries: int = 0
+    throttled_seconds: float = 0.0
+    error: str | None = None
+
+MetricsHook = Callable[[StageMetrics], None]
+
+_hooks : List[MetricsHook] = []
+_hooks_lock = threading.Lock()
+
+def add_hook(hook: MetricsHook):
+    """
+    Registers a function called with the metrics of every stage once it has finished. Hooks may be called from several threads at once.
+    """
+    with _hooks_lock:
+        _hooks.append(hook)
+
+def remove_hook(hook: MetricsHook):
+    """
+    Unregisters a function registered with add_hook.
+    """
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+def has_hooks() -> bool:
+    """
+    Returns whether any hook is registered, so measurements that cost extra work can be skipped when nobody reads them.
+    """
+    return bool(_hooks)
+
+def emit(metrics: StageMetrics):
+    """
+    Passes the metrics of a finished stage to every hook. A failing hook is logged rather than failing the copy.
+    """
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(metrics)
+        except Exception:
+            if logger: logger.exception(f"Metrics hook {hook!r} failed")
+
+@contextmanager
+def time_stage(metrics: StageMetrics, nested: StageMetrics | None = None) -> Iterator[StageMetrics]:
+    """
+    Adds the duration of a block to metrics, recording any error raised by it.
+
+    Parameters:
+        metrics (StageMetrics): The metrics of the stage.
+        nested (StageMetrics, None, optional): Metrics of a stage running inside the block, e.g. a streaming extract read by a write, whose time is not counted.
+    """
+    nested_seconds = nested.seconds if nested else 0.0
+    started = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException as error:
+        metrics.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        metrics.seconds += time.perf_counter() - started
+        if nested:
+            metrics.seconds -= nested.seconds - nested_seconds
+
+@contextmanager
+def measure_stage(
+    source: str,
+    target_table: str | None,
+    stage: str,
+    nested: StageMetrics | None = None
+) -> Iterator[StageMetrics]:
+    """
+    Times a block as a stage of copying a source, and emits its metrics when the block exits, also on error.
+    The block fills in the counts of the yielded metrics.
+
+    Parameters:
+        source (str): Query or name of table.
+        target_table (str, None): Lakehouse table or file name.
+        stage (str): Name of the stage.
+        nested (StageMetrics, None, optional): Metrics of a stage running inside the block, whose time is not counted.
+    """
+    metrics = StageMetrics(source, target_table, stage)
+    try:
+        with time_stage(metrics, nested):
+            yield metrics
+    finally:
+        emit(metrics)
+
+def is_dataframe(data: Any) -> bool:
+    """
+    Returns whether data is a pandas DataFrame, without importing pandas: if pandas has not been imported, data cannot be a DataFrame.
+
+    Parameters:
+        data (Any): The extracted data.
+
+    Returns:
+        bool: True for a pandas DataFrame.
+    """
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(data, pandas.DataFrame)
+
+def measure_data(data: Any, metrics: StageMetrics) -> Any:
+    """
+    Counts the rows and bytes of extracted data into metrics.
+
+    An Arrow table or pandas DataFrame is counted at once. A RecordBatchReader is wrapped so its batches are counted as they are read,
+    for the rows reported by the run and its journal, and the time spent fetching them timed when a hook is registered.
+
+    Parameters:
+        data (Any): The extracted Arrow table, DataFrame or RecordBatchReader.
+        metrics (StageMetrics): The metrics of the extract.
+
+    Returns:
+        Any: data, or a reader yielding the same batches.
+    """
+    if isinstance(data, pa.Table):
+        metrics.rows += data.num_rows
+        metrics.bytes_read += data.nbytes
+        return data
+    if is_dataframe(data):
+        metrics.rows += len(data)
+        metrics.bytes_read += int(data.memory_usage(deep=True).sum())
+        return data
+    if not isinstance(data, pa.RecordBatchReader):
+        return data
+    reader = data
+    timed = has_hooks()
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        iterator = iter(reader)
+        while True:
+            if timed:
+                with time_stage(metrics):
+                    batch = next(iterator, None)
+            else:
+                batch = next(iterator, None)
+            if batch is None:
+                return
+            metrics.rows += batch.num_rows
+            metrics.bytes_read += batch.nbytes
+            yield batch
+
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+class JsonLinesWriter:
+    """
+    Metrics hook writing the metrics of each stage as a line of JSON, to a file (appended to) or an open stream such as sys.stdout.
+    """
+    def __init__(self, output: str | TextIO) -> None:
+        self._lock = threading.Lock()
+        self._owns_stream = isinstance(output, str)
+        self._stream : TextIO = open(output, "a", encoding="utf-8") if isinstance(output, str) else output
+
+    def __call__(self, metrics: StageMetrics):
+        line = json.dumps(asdict(metrics), default=str)
+        with self._lock:
+            self._stream.write(f"{line}\n")
+            self._stream.flush()
+
+    def close(self):
+        if self._owns_stream:
+            self._stream.close()
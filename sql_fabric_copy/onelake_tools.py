@@ -1,48 +1,88 @@
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from logging import Logger
 import os
 import os.path as path
-from typing import Literal
+import re
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Literal
+from urllib.parse import quote, urlparse
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import RequestsTransport
 from azure.storage.filedatalake import (
     DataLakeServiceClient,
     DataLakeDirectoryClient,
     FileSystemClient,
 )
-from azure.identity import DefaultAzureCredential, ClientSecretCredential
+import requests
+from requests.adapters import HTTPAdapter
 import validators  # type: ignore
 
+from .credential_tools import DefaultAzureCredentialOptions, TokenCache, get_token_credential
+from .delta_tools import get_data_files, get_removed_files
+from .transfer_tools import NO_SDK_RETRIES, TransferController, TransferStats
+
 # from typing import Dict
 
 logger : Logger | None = None
 
-class DefaultAzureCredentialOptions:
-    """Options for configuring the DefaultAzureCredential."""
-    exclude_workload_identity_credential: bool = True
-    exclude_developer_cli_credential: bool = True
-    exclude_cli_credential: bool = True
-    exclude_environment_credential: bool = True
-    exclude_managed_identity_credential: bool = False
-    exclude_powershell_credential: bool = True
-    exclude_visual_studio_code_credential: bool = True
-    exclude_interactive_browser_credential: bool = True
-
-    def __init__(self, exclude_managed_identity_credential: bool = False) -> None:
-        self.exclude_managed_identity_credential = exclude_managed_identity_credential
-        self.exclude_cli_credential = exclude_managed_identity_credential
-
+STORAGE_SCOPE = "https://storage.azure.com/.default"
+# a static bearer token expiring sooner than this is not handed to deltalake, as the write would fail part way
+MIN_BEARER_TOKEN_SECONDS = 300
+
+# files of a table uploaded at once
+DEFAULT_UPLOAD_CONCURRENCY = 8
+# files larger than chunk_size are uploaded as blocks of chunk_size, max_concurrency blocks at once
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
+DELTA_LOG_DIRECTORY = "_delta_log/"
+# a commit is published by creating its _delta_log/<version>.json file
+DELTA_COMMIT_FILE = re.compile(r"^_delta_log/\d{20}\.json$")
+DELTA_LAST_CHECKPOINT_FILE = "_delta_log/_last_checkpoint"
+# data files a version no longer references are kept this long for readers of older versions, as delta.deletedFileRetentionDuration
+DEFAULT_RETENTION_HOURS = 7 * 24.0
+
+@dataclass
+class DeltaSyncResult:
+    """Files transferred by copy_deltatable and prepare_local_deltatable."""
+    uploaded_files: List[str] = field(default_factory=list)
+    uploaded_bytes: int = 0
+    unchanged_files: int = 0
+    deleted_files: List[str] = field(default_factory=list)
+    downloaded_files: List[str] = field(default_factory=list)
+    downloaded_bytes: int = 0
+    retries: int = 0
+    throttled_seconds: float = 0.0
+
+@dataclass
+class DeltaSyncPlan:
+    """Files copy_deltatable transfers to bring the table on the Lakehouse to the version of the local table, see plan_delta_sync."""
+    data_files: List[str] = field(default_factory=list)
+    commit_files: List[str] = field(default_factory=list)
+    checkpoint_files: List[str] = field(default_factory=list)
+    stale_files: List[str] = field(default_factory=list)
 
 def get_service_client_token_credential(
     account: str | None = None,
-    default_azure_credential_options: DefaultAzureCredentialOptions = DefaultAzureCredentialOptions(),
+    default_azure_credential_options: DefaultAzureCredentialOptions | None = None,
     service_prinicipal_tenant_id: str | None = None,
     service_prinicipal_client_id: str | None = None,
     service_prinicipal_client_secret: str | None = None,
+    connection_pool_size: int | None = None,
+    token_cache: TokenCache | None = None,
 ) -> DataLakeServiceClient:
     """
     Creates and returns a DataLakeServiceClient object using the provided account name.
 
     Parameters:
         account (str): The name of the Azure Data Lake Storage account, or the URL to the account.
+        default_azure_credential_options (DefaultAzureCredentialOptions, None, optional): Credential sources probed without a service principal. Defaults to the source of the environment, see DefaultAzureCredentialOptions.for_environment.
+        connection_pool_size (int, None, optional): Number of HTTP connections kept open to the account. Should cover the number of concurrent uploads. Defaults to the requests default of 10.
+        token_cache (TokenCache, None, optional): Keeps tokens, and the credential source that worked, across runs. See credential_tools.get_token_credential. Defaults to a cache in memory.
 
     Returns:
         DataLakeServiceClient: The DataLakeServiceClient object.
@@ -55,17 +95,22 @@ def get_service_client_token_credential(
         if account.startswith("https://")
         else f"https://{account}.dfs.fabric.microsoft.com"
     )
-    if service_prinicipal_client_id is not None and service_prinicipal_tenant_id is not None and service_prinicipal_client_secret is not None:
-        if logger: logger.info("Using token credentials.")
-        token_credential = ClientSecretCredential(service_prinicipal_tenant_id, service_prinicipal_client_id, service_prinicipal_client_secret)
-    else:
-        if logger: logger.info("Using default azure credentials.")
-        token_credential = DefaultAzureCredential(
-            **default_azure_credential_options.__dict__,
-
-        )
+    token_credential = get_token_credential(
+        service_prinicipal_tenant_id,
+        service_prinicipal_client_id,
+        service_prinicipal_client_secret,
+        default_azure_credential_options,
+        token_cache
+    )
 
-    service_client = DataLakeServiceClient(account_url, credential=token_credential)
+    if connection_pool_size:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=connection_pool_size, pool_maxsize=connection_pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        service_client = DataLakeServiceClient(account_url, credential=token_credential, transport=RequestsTransport(session=session, session_owner=True))
+    else:
+        service_client = DataLakeServiceClient(account_url, credential=token_credential)
     
     if logger: logger.info(f"Created DataLakeService client ({account_url=})")
 
@@ -131,7 +176,14 @@ def get_directory(
 
 
 def upload_file_to_directory(
-    directory_client: DataLakeDirectoryClient, local_path: str, file_name: str
+    directory_client: DataLakeDirectoryClient,
+    local_path: str,
+    file_name: str,
+    chunk_size: int | None = None,
+    max_concurrency: int | None = None,
+    overwrite: bool = True,
+    retry_hook: Callable[..., Any] | None = None,
+    retry_total: int | None = None,
 ):
     """
     Uploads a file to a directory in Azure Data Lake Storage.
@@ -140,40 +192,60 @@ def upload_file_to_directory(
         directory_client (DataLakeDirectoryClient): The client for the target directory.
         local_path (str): The local path of the file to upload.
         file_name (str): The name of the file in the target directory.
+        chunk_size (int, None, optional): Files larger than this are uploaded as blocks of this size. Defaults to DEFAULT_CHUNK_SIZE.
+        max_concurrency (int, None, optional): Number of blocks of a file uploaded at once. Defaults to DEFAULT_MAX_CONCURRENCY.
+        overwrite (bool, optional): Replace the file if it exists. Otherwise the upload fails if it exists. Defaults to True.
+        retry_hook (Callable, None, optional): Called by the storage client before each retry of a request of the upload.
+        retry_total (int, None, optional): Retries of each request by the storage client, e.g. 0 when a TransferController retries the upload. Defaults to the retry policy of the client.
 
     Returns:
         None
     """
     file_client = directory_client.get_file_client(file_name)
 
+    retry_options : Dict[str, Any] = {"retry_hook": retry_hook} if retry_hook else {}
+    if retry_total is not None:
+        retry_options["retry_total"] = retry_total
     with open(file=local_path, mode="rb") as data:
-        data = file_client.upload_data(data, overwrite=True)  # type: ignore
+        data = file_client.upload_data(  # type: ignore
+            data,
+            overwrite=overwrite,
+            chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+            max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY,
+            **retry_options
+        )
 
 def upload_file(
     service_client: DataLakeServiceClient,
     local_path: str,
     lakehouse_name: str,
     workspace_name: str,
-    file_path: str
+    file_path: str,
+    controller: TransferController | None = None
 ):
     """
-    Uploads a file to a directory in Azure Data Lake Storage.
+    Uploads a file to the Files folder of a Lakehouse.
 
     Parameters:
-        directory_client (DataLakeDirectoryClient): The client for the target directory.
+        service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
         local_path (str): The local path of the file to upload.
-        file_name (str): The name of the file in the target directory.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        file_path (str): The path of the file below the Files folder.
+        controller (TransferController, None, optional): Retries the upload when throttled, sharing its concurrency with other transfers. Defaults to a controller of its own.
 
     Returns:
         None
     """
-    directory_client = service_client.get_directory_client(file_path)  # type: ignore
-    
-    file_path = normalize_lakehouse_path(lakehouse_name, file_path, workspace_name, type="Files")
+    file_path = normalize_lakehouse_path(lakehouse_name, file_path, type="Files")
+
+    file_client = service_client.get_file_client(workspace_name, file_path) # type: ignore
 
-    file_client = directory_client.get_file_client(file_path) # type: ignore
-    with open(local_path, 'rb') as local_file:
-        file_client.upload_data(local_file, overwrite=True) # type: ignore
+    def upload():
+        with open(local_path, 'rb') as local_file:
+            file_client.upload_data(local_file, overwrite=True, **NO_SDK_RETRIES) # type: ignore
+
+    (controller or TransferController(1)).call(upload)
 
 
 def check_if_file_exists(
@@ -241,6 +313,7 @@ def delete_table(
     workspace_name: str,
     lakehouse_name: str,
     table_name: str,
+    controller: TransferController | None = None,
 ):
     """
     Deletes a directory in Azure Data Lake Storage.
@@ -248,14 +321,16 @@ def delete_table(
     Parameters:
         service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
         directory_path (str): The path of the directory to delete.
+        controller (TransferController, None, optional): Retries the requests when throttled. Defaults to a controller of its own.
     """
     # file_system_client = get_file_system(service_client, workspace_name)  # type: ignore
+    controller = controller or TransferController(1)
     delete_table_path = normalize_lakehouse_path(lakehouse_name, table_name, type="Tables")
     file_system_client = service_client.get_file_system_client(workspace_name)  # type: ignore
     directory_client = file_system_client.get_directory_client(delete_table_path)  # type: ignore
-    if directory_client.exists():  # type: ignore
+    if controller.call(lambda: directory_client.exists(**NO_SDK_RETRIES)):  # type: ignore
         if logger: logger.debug(f"Deleting existing table on Lakehouse: {delete_table_path}")
-        file_system_client.delete_directory(delete_table_path)  # type: ignore
+        controller.call(lambda: file_system_client.delete_directory(delete_table_path, **NO_SDK_RETRIES))  # type: ignore
     directory_client.close()  # type: ignore
 
 def delete_directory(
@@ -263,6 +338,7 @@ def delete_directory(
     workspace_name: str,
     lakehouse_name: str,
     directory_path: str,
+    controller: TransferController | None = None,
 ):
     """
     Deletes a directory in Azure Data Lake Storage.
@@ -270,15 +346,17 @@ def delete_directory(
     Parameters:
         service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
         directory_path (str): The path of the directory to delete.
+        controller (TransferController, None, optional): Retries the requests when throttled. Defaults to a controller of its own.
     """
     # file_system_client = get_file_system(service_client, workspace_name)  # type: ignore
+    controller = controller or TransferController(1)
     delete_directory_path = normalize_lakehouse_path(lakehouse_name, directory_path)
     file_system_client = service_client.get_file_system_client(workspace_name)  # type: ignore
     directory_client = file_system_client.get_directory_client(delete_directory_path)  # type: ignore
-    if directory_client.exists():  # type: ignore
+    if controller.call(lambda: directory_client.exists(**NO_SDK_RETRIES)):  # type: ignore
         if logger: logger.debug(f"Deleting existing directory on Lakehouse: {delete_directory_path}")
 
-        file_system_client.delete_directory(delete_directory_path)  # type: ignore
+        controller.call(lambda: file_system_client.delete_directory(delete_directory_path, **NO_SDK_RETRIES))  # type: ignore
     directory_client.close()  # type: ignore
 
 
@@ -287,6 +365,7 @@ def count_files_in_directory(
     workspace_name: str,
     lakehouse_name: str,
     directory_path: str,
+    controller: TransferController | None = None,
 ) -> int:
     """
     Counts the number of files in a directory in Azure Data Lake Storage.
@@ -296,6 +375,7 @@ def count_files_in_directory(
         workspace_name (str): The name of the workspace.
         lakehouse_name (str): The name of the lakehouse.
         directory_path (str): The path of the directory to check.
+        controller (TransferController, None, optional): Retries the listing when throttled. Defaults to a controller of its own.
 
     Returns:
         int: The number of files in the directory.
@@ -303,7 +383,9 @@ def count_files_in_directory(
     count_directory_path = normalize_lakehouse_path(lakehouse_name, directory_path)
     file_system_client = service_client.get_file_system_client(workspace_name)  # type: ignore
 
-    return len(list(filter(lambda path: not path.is_directory, file_system_client.get_paths(path=count_directory_path))))  # type: ignore
+    # a listing interrupted part way is listed again from the start
+    paths = (controller or TransferController(1)).call(lambda: list(file_system_client.get_paths(path=count_directory_path, **NO_SDK_RETRIES)))  # type: ignore
+    return len(list(filter(lambda path: not path.is_directory, paths)))  # type: ignore
 
 
 def normalize_lakehouse_path(
@@ -333,36 +415,447 @@ def normalize_lakehouse_path(
         sink_directory = sink_directory[len(f"{type}/") :]
     return f"{lakehouse_name}/{type}/{sink_directory}"
 
+def get_lakehouse_table_uri(
+    workspace_name: str,
+    lakehouse_name: str,
+    table_name: str,
+    account: str | None = None,
+) -> str:
+    """
+    Returns the abfss:// URI of a table on a Lakehouse, for writing to it directly with deltalake.
+
+    Parameters:
+        workspace_name (str): The name of the workspace.
+        lakehouse_name (str): The name of the lakehouse.
+        table_name (str): The name of the table.
+        account (str, None, optional): The name of the storage account, or the URL to the account. Defaults to "onelake".
+
+    Returns:
+        str: The URI of the table.
+    """
+    if not account:
+        account = "onelake"
+    host = urlparse(account).netloc if account.startswith("https://") else f"{account}.dfs.fabric.microsoft.com"
+    table_path = normalize_lakehouse_path(lakehouse_name, table_name, type="Tables")
+    return f"abfss://{quote(workspace_name.strip('/'))}@{host}/{quote(table_path)}"
+
+
+def deltalake_storage_options(credential: Any, token: Any) -> Dict[str, str]:
+    """
+    Returns deltalake storage options authenticating as a credential. These are the credential's own settings when object_store can
+    refresh tokens with them, e.g. a service principal, the Azure CLI or the managed identity of a VM, and otherwise the static
+    bearer token given.
+
+    Parameters:
+        credential (Any): The token credential, a CachedTokenCredential or AsyncCachedTokenCredential to use its settings.
+        token (AccessToken): A token of the credential for STORAGE_SCOPE.
+
+    Returns:
+        Dict[str, str]: The storage options.
+
+    Throws:
+        Exception: If object_store cannot refresh tokens itself and the token expires within MIN_BEARER_TOKEN_SECONDS.
+    """
+    options = credential.get_storage_options() if hasattr(credential, "get_storage_options") else None
+    if options is not None:
+        if logger: logger.debug("Using refreshable credentials for deltalake.")
+        return {**options, "use_fabric_endpoint": "true"}
+    remaining = token.expires_on - time.time()
+    if remaining < MIN_BEARER_TOKEN_SECONDS:
+        raise Exception(f"Storage token expires in {int(remaining)} seconds, too soon to start a deltalake write.")
+    if logger: logger.warning(
+        f"deltalake cannot refresh this credential, so writes still running at "
+        f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(token.expires_on))} will fail as their token expires."
+    )
+    return {
+        "bearer_token": token.token,
+        "use_fabric_endpoint": "true",
+    }
+
+
+def get_deltalake_storage_options(
+    service_client: DataLakeServiceClient,
+) -> Dict[str, str]:
+    """
+    Returns deltalake storage options authenticating with the same credential as a DataLakeServiceClient.
+
+    object_store refreshes its own tokens for a service principal, the Azure CLI, workload identity, an environment service principal
+    and the managed identity of a VM. Any other credential, e.g. Azure PowerShell or a credential other than a CachedTokenCredential,
+    is passed as a static bearer token, so a write taking longer than the token's lifetime, usually about an hour, fails.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
+
+    Returns:
+        Dict[str, str]: The storage options. Empty when the client has no token credential.
+
+    Throws:
+        Exception: If a static bearer token expires within MIN_BEARER_TOKEN_SECONDS.
+    """
+    credential = getattr(service_client, "credential", None)
+    if credential is None or not hasattr(credential, "get_token"):
+        return {}
+    # also resolves the source of DefaultAzureCredential that the storage options follow
+    token = credential.get_token(STORAGE_SCOPE)  # type: ignore
+    return deltalake_storage_options(credential, token)
+
+
 def copy_deltatable(
     service_client: DataLakeServiceClient,
     local_table_path: str,
     lakehouse_name: str,
-    workspace_name: str
-):
+    workspace_name: str,
+    upload_concurrency: int | None = None,
+    chunk_size: int | None = None,
+    max_concurrency: int | None = None,
+    replace_table: bool = True,
+    delete_stale: bool = True,
+    retention_hours: float | None = None,
+    controller: TransferController | None = None,
+) -> DeltaSyncResult:
+    """
+    Syncs a local delta table to the Lakehouse, uploading only the files missing from the table on the Lakehouse.
+
+    The local table must continue the history of the table on the Lakehouse (see prepare_local_deltatable), so every
+    version already on the Lakehouse is also in the local _delta_log. Data files are uploaded first, then the new _delta_log
+    commits in version order, which publishes the new version in one step. Readers see either the previous or the new version
+    throughout. Data files removed from the table are only deleted once they are older than retention_hours (see plan_delta_sync),
+    so readers still on an older version, and time travel, keep working.
 
+    Parameters:
+        service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
+        local_table_path (str): Path of the local delta table. Its base name is used as the table name.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        upload_concurrency (int, None, optional): Number of files uploaded at once. Defaults to DEFAULT_UPLOAD_CONCURRENCY.
+        chunk_size (int, None, optional): Files larger than this are uploaded as blocks of this size. Defaults to DEFAULT_CHUNK_SIZE.
+        max_concurrency (int, None, optional): Number of blocks of a file uploaded at once. Defaults to DEFAULT_MAX_CONCURRENCY.
+        replace_table (bool, optional): When the table on the Lakehouse has versions missing from the local table, delete it before uploading (not atomic). Otherwise fail. Defaults to True.
+        delete_stale (bool, optional): Delete data files on the Lakehouse that were removed from the table more than retention_hours ago. Defaults to True.
+        retention_hours (float, None, optional): How long data files removed from the table are kept on the Lakehouse. Defaults to DEFAULT_RETENTION_HOURS.
+        controller (TransferController, None, optional): Sends every request, retrying throttled and failed ones and adapting how many are in flight (see transfer_tools.TransferController). Share one between tables copied at once. Defaults to a controller of upload_concurrency requests.
+
+    Returns:
+        DeltaSyncResult: The files uploaded and deleted, the number of retried requests and the time waited on throttling.
+
+    Throws:
+        Exception: If the table on the Lakehouse has versions missing from the local table and replace_table is False, or a commit already exists on the Lakehouse.
+    """
     file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+    controller = controller or TransferController(upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY)
+    stats = TransferStats()
 
+    target_directory = os.path.basename(local_table_path)
+    lakehouse_path = normalize_lakehouse_path(lakehouse_name, target_directory, type= "Tables")
+    remote_files = list_remote_files(service_client, workspace_name, lakehouse_name, target_directory, controller=controller, stats=stats)
+    local_files = get_local_file_sizes(local_table_path)
+
+    if replace_diverged_table(local_table_path, lakehouse_path, local_files, remote_files, replace_table):
+        delete_table(service_client, workspace_name, lakehouse_name, target_directory, controller=controller)
+        remote_files = {}
+
+    directory_client = get_directory(file_system_client, lakehouse_path)
+    result = DeltaSyncResult()
+    plan = plan_delta_sync(local_table_path, local_files, remote_files, retention_hours)
+    result_lock = threading.Lock()
+
+    def upload(file_path: str, overwrite: bool = True):
+        local_file_path = f"{local_table_path}/{file_path}"
+        if logger: logger.debug(f"Copying {local_file_path=} to {lakehouse_path}/{file_path}")
+        controller.call(lambda: upload_file_to_directory(
+            directory_client,
+            local_file_path,
+            file_path,
+            chunk_size=chunk_size,
+            max_concurrency=max_concurrency,
+            overwrite=overwrite,
+            retry_total=0
+        ), stats)
+        with result_lock:
+            result.uploaded_files.append(file_path)
+            result.uploaded_bytes += local_files[file_path]
+
+    with ThreadPoolExecutor(max_workers=upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY, thread_name_prefix="onelake_upload") as executor:
+        # list() re-raises the first failed upload
+        list(executor.map(upload, plan.data_files))
+        # commits are never overwritten, so a version written by someone else since the table was prepared fails the upload
+        for commit_file in plan.commit_files:
+            upload(commit_file, overwrite=False)
+        list(executor.map(upload, plan.checkpoint_files))
+
+        if delete_stale:
+            def delete(file_path: str):
+                if logger: logger.debug(f"Deleting stale file {lakehouse_path}/{file_path}")
+                controller.call(lambda: file_system_client.delete_file(f"{lakehouse_path}/{file_path}", **NO_SDK_RETRIES), stats) # type: ignore
+                with result_lock:
+                    result.deleted_files.append(file_path)
+
+            list(executor.map(delete, plan.stale_files))
+
+    result.unchanged_files = count_unchanged_files(local_files, remote_files, result.uploaded_files)
+    result.retries, result.throttled_seconds = stats.retries, stats.throttled_seconds
+    if logger: logger.info(f"Synced {local_table_path} to {lakehouse_path}: uploaded {len(result.uploaded_files)} files ({result.uploaded_bytes} bytes), {result.unchanged_files} unchanged, deleted {len(result.deleted_files)}, {result.retries} retries")
+    return result
+
+
+def prepare_local_deltatable(
+    service_client: DataLakeServiceClient,
+    local_table_path: str,
+    lakehouse_name: str,
+    workspace_name: str,
+    download_data: bool = False,
+    concurrency: int | None = None,
+    controller: TransferController | None = None,
+) -> DeltaSyncResult:
+    """
+    Makes a local delta table continue the history of the table on the Lakehouse, so writes to it can be synced with copy_deltatable.
+
+    When the local _delta_log differs from the one on the Lakehouse, the local table is replaced by a copy of the Lakehouse _delta_log.
+    Overwrites and appends only read the _delta_log, so data files are not downloaded unless download_data is set.
+    Local data files not referenced by the current version are removed.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
+        local_table_path (str): Path of the local delta table. Its base name is used as the table name.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        download_data (bool, optional): Also download the data files of the current version, e.g. before a merge. Defaults to False.
+        concurrency (int, None, optional): Number of files downloaded at once. Defaults to DEFAULT_UPLOAD_CONCURRENCY.
+        controller (TransferController, None, optional): Sends every request, retrying throttled and failed ones, see copy_deltatable. Defaults to a controller of concurrency requests.
 
+    Returns:
+        DeltaSyncResult: The files downloaded, the number of retried requests and the time waited on throttling.
+    """
     target_directory = os.path.basename(local_table_path)
-    delete_table(service_client,workspace_name, lakehouse_name,target_directory)
+    lakehouse_path = normalize_lakehouse_path(lakehouse_name, target_directory, type= "Tables")
+    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+    controller = controller or TransferController(concurrency or DEFAULT_UPLOAD_CONCURRENCY)
+    stats = TransferStats()
+    remote_files = list_remote_files(service_client, workspace_name, lakehouse_name, target_directory, controller=controller, stats=stats)
+    remote_log = delta_log_files(remote_files)
+    local_log = delta_log_files(get_local_file_sizes(local_table_path))
+
+    result = DeltaSyncResult()
+    result_lock = threading.Lock()
+
+    def download(file_path: str):
+        local_file_path = f"{local_table_path}/{file_path}"
+        os.makedirs(path.dirname(local_file_path), exist_ok=True)
+
+        def download_to_file() -> int:
+            # a retried download rewrites the file from the start
+            with open(local_file_path, "wb") as local_file:
+                return file_system_client.get_file_client(f"{lakehouse_path}/{file_path}").download_file(**NO_SDK_RETRIES).readinto(local_file) # type: ignore
+
+        size = controller.call(download_to_file, stats)
+        with result_lock:
+            result.downloaded_files.append(file_path)
+            result.downloaded_bytes += size
+
+    with ThreadPoolExecutor(max_workers=concurrency or DEFAULT_UPLOAD_CONCURRENCY, thread_name_prefix="onelake_download") as executor:
+        if local_log != remote_log:
+            if logger: logger.info(f"Downloading the _delta_log of {lakehouse_path} ({len(remote_log)} files) to {local_table_path}")
+            if path.exists(local_table_path):
+                shutil.rmtree(local_table_path)
+            list(executor.map(download, remote_log))
+
+        missing_files = remove_unreferenced_local_files(local_table_path)
+        if download_data:
+            list(executor.map(download, missing_files))
+    result.retries, result.throttled_seconds = stats.retries, stats.throttled_seconds
+    return result
+
+
+def list_remote_files(
+    service_client: DataLakeServiceClient,
+    workspace_name: str,
+    lakehouse_name: str,
+    table_name: str,
+    type: Literal["Files", "Tables"] = "Tables",
+    controller: TransferController | None = None,
+    stats: TransferStats | None = None
+) -> Dict[str, int]:
+    """
+    Lists the files of a table, or of a directory below the Files folder, on the Lakehouse.
 
-    for dirpath, _dirnames, filenames in os.walk(local_table_path):
+    Parameters:
+        service_client (DataLakeServiceClient): The DataLakeServiceClient object used.
+        workspace_name (str): The name of the workspace.
+        lakehouse_name (str): The name of the lakehouse.
+        table_name (str): The name of the table, or the path of the directory.
+        type (str, ('Files', 'Tables'), optional): The folder of the lakehouse table_name is in. Defaults to "Tables".
+        controller (TransferController, None, optional): Retries the listing when throttled. Defaults to a controller of its own.
+        stats (TransferStats, None, optional): Counts the retries of the listing.
+
+    Returns:
+        Dict[str, int]: Size of each file, by path relative to the table using "/" separators. Empty if the table does not exist.
+    """
+    table_path = normalize_lakehouse_path(lakehouse_name, table_name, type=type).rstrip("/")
+    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+    try:
+        # a listing interrupted part way is listed again from the start
+        paths = (controller or TransferController(1)).call(
+            lambda: list(file_system_client.get_paths(path=table_path, recursive=True, **NO_SDK_RETRIES)), # type: ignore
+            stats
+        )
+    except ResourceNotFoundError:
+        return {}
+    return {
+        item.name[len(table_path) + 1:]: item.content_length # type: ignore
+        for item in paths if not item.is_directory # type: ignore
+    }
 
+
+def list_local_files(local_table_path: str) -> List[str]:
+    """
+    Lists the files of a local delta table.
+
+    Parameters:
+        local_table_path (str): Path of the local delta table.
+
+    Returns:
+        List[str]: Paths of the files relative to local_table_path, using "/" separators.
+    """
+    file_paths : List[str] = []
+    for dirpath, _dirnames, filenames in os.walk(local_table_path):
         for filename in filenames:
             local_file_path = os.path.join(dirpath, filename).replace("\\", "/")
+            file_paths.append(os.path.relpath(local_file_path, local_table_path).replace("\\", "/"))
+    return file_paths
+
+        
 
-            lakehouse_path = normalize_lakehouse_path(lakehouse_name, target_directory, type= "Tables")
-            file_path = __parquet_filename_to_snappy(os.path.relpath(local_file_path, local_table_path).replace("\\", "/"))
-            
-            data_lake_file_path = os.path.join(lakehouse_path, file_path).replace("\\", "/")
-            directory_client = get_directory(file_system_client, lakehouse_path)
-            if logger: logger.debug(f"Copying {local_file_path=} to {data_lake_file_path=}")
-            file_client = directory_client.get_file_client(file_path)
 
-            with open(local_file_path, 'rb') as local_file:
-                file_client.upload_data(local_file, overwrite=True) # type: ignore
+def get_local_file_sizes(local_table_path: str) -> Dict[str, int]:
+    """
+    Returns the size of each file of a local delta table, by path relative to the table using "/" separators.
+    """
+    return {file_path: os.path.getsize(f"{local_table_path}/{file_path}") for file_path in list_local_files(local_table_path)}
 
-def __parquet_filename_to_snappy(parquet_file_name :str) -> str:
-    return parquet_file_name
 
-        
\ No newline at end of file
+def delta_log_files(files: Dict[str, int]) -> Dict[str, int]:
+    """
+    Returns the _delta_log files of a listing of a table, e.g. from list_remote_files or get_local_file_sizes.
+    """
+    return {file_path: size for file_path, size in files.items() if file_path.startswith(DELTA_LOG_DIRECTORY)}
+
+
+def replace_diverged_table(
+    local_table_path: str,
+    lakehouse_path: str,
+    local_files: Dict[str, int],
+    remote_files: Dict[str, int],
+    replace_table: bool,
+) -> bool:
+    """
+    Checks that the local table continues the history of the table on the Lakehouse, i.e. every _delta_log file on the Lakehouse is also local.
+
+    Parameters:
+        local_table_path (str): Path of the local delta table.
+        lakehouse_path (str): Path of the table on the Lakehouse, for messages.
+        local_files (Dict[str, int]): Size of each file of the local table.
+        remote_files (Dict[str, int]): Size of each file of the table on the Lakehouse.
+        replace_table (bool): Whether a table that was changed since the local table was prepared may be replaced.
+
+    Returns:
+        bool: True if the table on the Lakehouse has to be deleted before the local table is uploaded.
+
+    Throws:
+        Exception: If the table on the Lakehouse has versions missing from the local table and replace_table is False.
+    """
+    diverged = [
+        file_path for file_path, size in delta_log_files(remote_files).items()
+        if file_path != DELTA_LAST_CHECKPOINT_FILE and local_files.get(file_path) != size
+    ]
+    if not diverged:
+        return False
+    if not replace_table:
+        raise Exception(f"{lakehouse_path} has _delta_log files missing from {local_table_path}, e.g. {diverged[0]}. It was changed since the local table was prepared.")
+    if logger: logger.warning(f"{lakehouse_path} has _delta_log files missing from {local_table_path}, replacing the table.")
+    return True
+
+
+def plan_delta_sync(
+    local_table_path: str,
+    local_files: Dict[str, int],
+    remote_files: Dict[str, int],
+    retention_hours: float | None = None,
+) -> DeltaSyncPlan:
+    """
+    Works out which files copy_deltatable uploads and deletes to bring the table on the Lakehouse to the current version of the local table.
+
+    A data file on the Lakehouse is only stale once a remove action of the _delta_log dropped it more than retention_hours ago,
+    so readers of the previous versions, and time travel within the retention, still find their files. Files no version
+    references or removes, e.g. left by a failed upload, are kept for a VACUUM on the Lakehouse, unless the Lakehouse has no
+    _delta_log and so no readers.
+
+    Parameters:
+        local_table_path (str): Path of the local delta table, whose _delta_log gives the data files of the current version.
+        local_files (Dict[str, int]): Size of each file of the local table, see get_local_file_sizes.
+        remote_files (Dict[str, int]): Size of each file of the table on the Lakehouse, see list_remote_files.
+        retention_hours (float, None, optional): How long removed data files are kept. Defaults to DEFAULT_RETENTION_HOURS.
+
+    Returns:
+        DeltaSyncPlan: The data files, commits and checkpoints to upload, in that order, and the data files on the Lakehouse past their retention.
+
+    Throws:
+        Exception: If a data file of the current version is neither local nor on the Lakehouse.
+    """
+    referenced_files = set(get_data_files(local_table_path))
+    missing = sorted(file_path for file_path in referenced_files if file_path not in local_files and file_path not in remote_files)
+    if missing:
+        raise Exception(f"Data files of {local_table_path} are missing both locally and on the Lakehouse, e.g. {missing[0]}.")
+    plan = DeltaSyncPlan()
+    # data file names are unique per write, so a file of the same size is already uploaded
+    plan.data_files = sorted(
+        file_path for file_path in referenced_files
+        if file_path in local_files and remote_files.get(file_path) != local_files[file_path]
+    )
+    log_files = sorted(
+        file_path for file_path in delta_log_files(local_files)
+        if file_path != DELTA_LAST_CHECKPOINT_FILE and file_path not in remote_files
+    )
+    plan.commit_files = [file_path for file_path in log_files if DELTA_COMMIT_FILE.match(file_path)]
+    plan.checkpoint_files = [file_path for file_path in log_files if not DELTA_COMMIT_FILE.match(file_path)]
+    if DELTA_LAST_CHECKPOINT_FILE in local_files and (plan.checkpoint_files or DELTA_LAST_CHECKPOINT_FILE not in remote_files):
+        plan.checkpoint_files.append(DELTA_LAST_CHECKPOINT_FILE)
+    unreferenced_files = [
+        file_path for file_path in remote_files
+        if not file_path.startswith(DELTA_LOG_DIRECTORY) and file_path not in referenced_files
+    ]
+    if not delta_log_files(remote_files):
+        plan.stale_files = sorted(unreferenced_files)
+        return plan
+    removed_files = get_removed_files(local_table_path)
+    retention = DEFAULT_RETENTION_HOURS if retention_hours is None else retention_hours
+    cutoff = (time.time() - retention * 3600) * 1000
+    plan.stale_files = sorted(
+        file_path for file_path in unreferenced_files if file_path in removed_files and removed_files[file_path] <= cutoff
+    )
+    return plan
+
+
+def count_unchanged_files(local_files: Dict[str, int], remote_files: Dict[str, int], uploaded_files: List[str]) -> int:
+    """
+    Returns the number of local files that were already on the Lakehouse and so were not uploaded.
+    """
+    uploaded = set(uploaded_files)
+    return len([file_path for file_path in local_files if file_path in remote_files and file_path not in uploaded])
+
+
+def remove_unreferenced_local_files(local_table_path: str) -> List[str]:
+    """
+    Removes the local data files not referenced by the current version of a local delta table.
+
+    Parameters:
+        local_table_path (str): Path of the local delta table.
+
+    Returns:
+        List[str]: The data files of the current version that are not local, e.g. to download before a merge.
+    """
+    referenced_files = set(get_data_files(local_table_path))
+    local_files = set(list_local_files(local_table_path))
+    for file_path in local_files:
+        if not file_path.startswith(DELTA_LOG_DIRECTORY) and file_path not in referenced_files:
+            os.remove(f"{local_table_path}/{file_path}")
+    return sorted(referenced_files - local_files)
@@ -0,0 +1,475 @@
+""" Module with asyncio counterparts of the OneLake functions of onelake_tools, using azure.storage.filedatalake.aio. """
+import asyncio
+from logging import Logger
+import os
+import os.path as path
+import shutil
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Literal, TypeVar
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.filedatalake.aio import (
+    DataLakeDirectoryClient,
+    DataLakeServiceClient,
+)
+
+from .credential_tools import AsyncCachedTokenCredential, TokenCache, get_token_credential
+from .onelake_tools import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_UPLOAD_CONCURRENCY,
+    STORAGE_SCOPE,
+    DefaultAzureCredentialOptions,
+    DeltaSyncResult,
+    count_unchanged_files,
+    delta_log_files,
+    deltalake_storage_options,
+    get_local_file_sizes,
+    normalize_lakehouse_path,
+    plan_delta_sync,
+    remove_unreferenced_local_files,
+    replace_diverged_table,
+)
+from .transfer_tools import NO_SDK_RETRIES, TransferController, TransferStats
+
+logger : Logger | None = None
+
+T = TypeVar("T")
+
+def get_service_client_token_credential(
+    account: str | None = None,
+    default_azure_credential_options: DefaultAzureCredentialOptions | None = None,
+    service_prinicipal_tenant_id: str | None = None,
+    service_prinicipal_client_id: str | None = None,
+    service_prinicipal_client_secret: str | None = None,
+    connection_pool_size: int | None = None,
+    token_cache: TokenCache | None = None,
+) -> DataLakeServiceClient:
+    """
+    Creates and returns an asynchronous DataLakeServiceClient object using the provided account name. Close it with close_service_client.
+
+    Parameters:
+        account (str): The name of the Azure Data Lake Storage account, or the URL to the account.
+        default_azure_credential_options (DefaultAzureCredentialOptions, None, optional): Credential sources probed without a service principal. Defaults to the source of the environment.
+        connection_pool_size (int, None, optional): Number of HTTP connections kept open to the account. Should cover the number of concurrent requests. Defaults to the aiohttp default of 100.
+        token_cache (TokenCache, None, optional): Keeps tokens, and the credential source that worked, across runs. Defaults to a cache in memory.
+
+    Returns:
+        DataLakeServiceClient: The asynchronous DataLakeServiceClient object.
+    """
+    if not account:
+        account = "onelake"
+    account_url: str = (
+        account
+        if account.startswith("https://")
+        else f"https://{account}.dfs.fabric.microsoft.com"
+    )
+    # tokens are fetched by the synchronous credential in a worker thread, and cached tokens returned without one
+    token_credential = AsyncCachedTokenCredential(get_token_credential(
+        service_prinicipal_tenant_id,
+        service_prinicipal_client_id,
+        service_prinicipal_client_secret,
+        default_azure_credential_options,
+        token_cache
+    ))
+
+    if connection_pool_size:
+        # aiohttp is only needed by the asynchronous clients, so it is imported when they are used
+        import aiohttp
+        from azure.core.pipeline.transport import AioHttpTransport
+        service_client = DataLakeServiceClient(
+            account_url,
+            credential=token_credential,
+            transport=AioHttpTransport(
+                session=aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connection_pool_size)),
+                session_owner=True
+            )
+        )
+    else:
+        service_client = DataLakeServiceClient(account_url, credential=token_credential)
+
+    if logger: logger.info(f"Created asynchronous DataLakeService client ({account_url=})")
+
+    return service_client
+
+async def close_service_client(service_client: DataLakeServiceClient):
+    """
+    Closes an asynchronous DataLakeServiceClient and its credential.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object.
+    """
+    await service_client.close()
+    credential = getattr(service_client, "credential", None)
+    if credential is not None and hasattr(credential, "close"):
+        await credential.close() # type: ignore
+
+async def gather_bounded(function: Callable[[T], Awaitable[Any]], items: Iterable[T], concurrency: int | None = None) -> List[Any]:
+    """
+    Awaits function for every item, with at most concurrency calls in flight at once.
+
+    Parameters:
+        function (Callable[[T], Awaitable]): The coroutine function.
+        items (Iterable[T]): The items to call it with.
+        concurrency (int, None, optional): Maximum number of calls in flight. Defaults to DEFAULT_UPLOAD_CONCURRENCY.
+
+    Returns:
+        List[Any]: The results, in the order of items.
+
+    Throws:
+        Exception: The first error raised by a call, once the calls in flight have finished.
+    """
+    semaphore = asyncio.Semaphore(concurrency or DEFAULT_UPLOAD_CONCURRENCY)
+
+    async def call(item: T) -> Any:
+        async with semaphore:
+            return await function(item)
+
+    tasks = [asyncio.ensure_future(call(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+async def upload_file_to_directory(
+    directory_client: DataLakeDirectoryClient,
+    local_path: str,
+    file_name: str,
+    chunk_size: int | None = None,
+    max_concurrency: int | None = None,
+    overwrite: bool = True,
+    retry_hook: Callable[..., Any] | None = None,
+    retry_total: int | None = None,
+):
+    """
+    Uploads a file to a directory in Azure Data Lake Storage.
+
+    Parameters:
+        directory_client (DataLakeDirectoryClient): The asynchronous client for the target directory.
+        local_path (str): The local path of the file to upload.
+        file_name (str): The name of the file in the target directory.
+        chunk_size (int, None, optional): Files larger than this are uploaded as blocks of this size. Defaults to onelake_tools.DEFAULT_CHUNK_SIZE.
+        max_concurrency (int, None, optional): Number of blocks of a file uploaded at once. Defaults to onelake_tools.DEFAULT_MAX_CONCURRENCY.
+        overwrite (bool, optional): Replace the file if it exists. Otherwise the upload fails if it exists. Defaults to True.
+        retry_hook (Callable, None, optional): Called by the storage client before each retry of a request of the upload.
+        retry_total (int, None, optional): Retries of each request by the storage client, e.g. 0 when a TransferController retries the upload. Defaults to the retry policy of the client.
+    """
+    file_client = directory_client.get_file_client(file_name)
+
+    retry_options : Dict[str, Any] = {"retry_hook": retry_hook} if retry_hook else {}
+    if retry_total is not None:
+        retry_options["retry_total"] = retry_total
+    with open(file=local_path, mode="rb") as data:
+        await file_client.upload_data(  # type: ignore
+            data,
+            overwrite=overwrite,
+            chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+            max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY,
+            **retry_options
+        )
+
+async def upload_file(
+    service_client: DataLakeServiceClient,
+    local_path: str,
+    lakehouse_name: str,
+    workspace_name: str,
+    file_path: str,
+    controller: TransferController | None = None
+):
+    """
+    Uploads a file to the Files folder of a Lakehouse.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        local_path (str): The local path of the file to upload.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        file_path (str): The path of the file below the Files folder.
+        controller (TransferController, None, optional): Retries the upload when throttled, sharing its concurrency with other transfers. Defaults to a controller of its own.
+    """
+    file_path = normalize_lakehouse_path(lakehouse_name, file_path, type="Files")
+
+    file_client = service_client.get_file_client(workspace_name, file_path) # type: ignore
+
+    async def upload():
+        with open(local_path, 'rb') as local_file:
+            await file_client.upload_data(local_file, overwrite=True, **NO_SDK_RETRIES) # type: ignore
+
+    await (controller or TransferController(1)).call_async(upload)
+
+async def delete_table(
+    service_client: DataLakeServiceClient,
+    workspace_name: str,
+    lakehouse_name: str,
+    table_name: str,
+    controller: TransferController | None = None,
+):
+    """
+    Deletes a table on the Lakehouse, if it exists.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        workspace_name (str): The name of the workspace.
+        lakehouse_name (str): The name of the lakehouse.
+        table_name (str): The name of the table.
+        controller (TransferController, None, optional): Retries the requests when throttled. Defaults to a controller of its own.
+    """
+    controller = controller or TransferController(1)
+    delete_table_path = normalize_lakehouse_path(lakehouse_name, table_name, type="Tables")
+    file_system_client = service_client.get_file_system_client(workspace_name)  # type: ignore
+    directory_client = file_system_client.get_directory_client(delete_table_path)  # type: ignore
+    if await controller.call_async(lambda: directory_client.exists(**NO_SDK_RETRIES)):  # type: ignore
+        if logger: logger.debug(f"Deleting existing table on Lakehouse: {delete_table_path}")
+        await controller.call_async(lambda: file_system_client.delete_directory(delete_table_path, **NO_SDK_RETRIES))  # type: ignore
+    await directory_client.close()  # type: ignore
+
+async def count_files_in_directory(
+    service_client: DataLakeServiceClient,
+    workspace_name: str,
+    lakehouse_name: str,
+    directory_path: str,
+    controller: TransferController | None = None,
+) -> int:
+    """
+    Counts the number of files in a directory in Azure Data Lake Storage.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        workspace_name (str): The name of the workspace.
+        lakehouse_name (str): The name of the lakehouse.
+        directory_path (str): The path of the directory to check.
+        controller (TransferController, None, optional): Retries the listing when throttled. Defaults to a controller of its own.
+
+    Returns:
+        int: The number of files in the directory.
+    """
+    count_directory_path = normalize_lakehouse_path(lakehouse_name, directory_path)
+    file_system_client = service_client.get_file_system_client(workspace_name)  # type: ignore
+
+    async def count_files() -> int:
+        # a listing interrupted part way is counted again from the start
+        count = 0
+        async for item in file_system_client.get_paths(path=count_directory_path, **NO_SDK_RETRIES):  # type: ignore
+            if not item.is_directory:  # type: ignore
+                count += 1
+        return count
+
+    return await (controller or TransferController(1)).call_async(count_files)
+
+async def list_remote_files(
+    service_client: DataLakeServiceClient,
+    workspace_name: str,
+    lakehouse_name: str,
+    table_name: str,
+    type: Literal["Files", "Tables"] = "Tables",
+    controller: TransferController | None = None,
+    stats: TransferStats | None = None
+) -> Dict[str, int]:
+    """
+    Lists the files of a table, or of a directory below the Files folder, on the Lakehouse.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        workspace_name (str): The name of the workspace.
+        lakehouse_name (str): The name of the lakehouse.
+        table_name (str): The name of the table, or the path of the directory.
+        type (str, ('Files', 'Tables'), optional): The folder of the lakehouse table_name is in. Defaults to "Tables".
+        controller (TransferController, None, optional): Retries the listing when throttled. Defaults to a controller of its own.
+        stats (TransferStats, None, optional): Counts the retries of the listing.
+
+    Returns:
+        Dict[str, int]: Size of each file, by path relative to the table using "/" separators. Empty if the table does not exist.
+    """
+    table_path = normalize_lakehouse_path(lakehouse_name, table_name, type=type).rstrip("/")
+    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+
+    async def list_files() -> Dict[str, int]:
+        # a listing interrupted part way is listed again from the start
+        files : Dict[str, int] = {}
+        async for item in file_system_client.get_paths(path=table_path, recursive=True, **NO_SDK_RETRIES): # type: ignore
+            if not item.is_directory: # type: ignore
+                files[item.name[len(table_path) + 1:]] = item.content_length # type: ignore
+        return files
+
+    try:
+        return await (controller or TransferController(1)).call_async(list_files, stats)
+    except ResourceNotFoundError:
+        return {}
+
+async def get_deltalake_storage_options(
+    service_client: DataLakeServiceClient,
+) -> Dict[str, str]:
+    """
+    Returns deltalake storage options authenticating with the same credential as an asynchronous DataLakeServiceClient.
+
+    As in onelake_tools, credentials object_store cannot refresh itself are passed as a static bearer token, so a write taking longer
+    than the token's lifetime, usually about an hour, fails.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+
+    Returns:
+        Dict[str, str]: The storage options. Empty when the client has no token credential.
+
+    Throws:
+        Exception: If a static bearer token expires within MIN_BEARER_TOKEN_SECONDS.
+    """
+    credential = getattr(service_client, "credential", None)
+    if credential is None or not hasattr(credential, "get_token"):
+        return {}
+    token = await credential.get_token(STORAGE_SCOPE)  # type: ignore
+    return deltalake_storage_options(credential, token)
+
+async def copy_deltatable(
+    service_client: DataLakeServiceClient,
+    local_table_path: str,
+    lakehouse_name: str,
+    workspace_name: str,
+    upload_concurrency: int | None = None,
+    chunk_size: int | None = None,
+    max_concurrency: int | None = None,
+    replace_table: bool = True,
+    delete_stale: bool = True,
+    retention_hours: float | None = None,
+    controller: TransferController | None = None,
+) -> DeltaSyncResult:
+    """
+    Syncs a local delta table to the Lakehouse, uploading only the files missing from the table on the Lakehouse.
+
+    Works as onelake_tools.copy_deltatable, with the uploads and deletes in flight as tasks of the event loop rather than threads.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        local_table_path (str): Path of the local delta table. Its base name is used as the table name.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        upload_concurrency (int, None, optional): Number of files uploaded at once. Defaults to onelake_tools.DEFAULT_UPLOAD_CONCURRENCY.
+        chunk_size (int, None, optional): Files larger than this are uploaded as blocks of this size. Defaults to onelake_tools.DEFAULT_CHUNK_SIZE.
+        max_concurrency (int, None, optional): Number of blocks of a file uploaded at once. Defaults to onelake_tools.DEFAULT_MAX_CONCURRENCY.
+        replace_table (bool, optional): When the table on the Lakehouse has versions missing from the local table, delete it before uploading (not atomic). Otherwise fail. Defaults to True.
+        delete_stale (bool, optional): Delete data files on the Lakehouse that were removed from the table more than retention_hours ago. Defaults to True.
+        retention_hours (float, None, optional): How long data files removed from the table are kept on the Lakehouse. Defaults to onelake_tools.DEFAULT_RETENTION_HOURS.
+        controller (TransferController, None, optional): Sends every request, retrying throttled and failed ones and adapting how many are in flight. Share one between tables copied at once. Defaults to a controller of upload_concurrency requests.
+
+    Returns:
+        DeltaSyncResult: The files uploaded and deleted, the number of retried requests and the time waited on throttling.
+
+    Throws:
+        Exception: If the table on the Lakehouse has versions missing from the local table and replace_table is False, or a commit already exists on the Lakehouse.
+    """
+    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+    controller = controller or TransferController(upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY)
+    stats = TransferStats()
+
+    target_directory = os.path.basename(local_table_path)
+    lakehouse_path = normalize_lakehouse_path(lakehouse_name, target_directory, type= "Tables")
+    remote_files = await list_remote_files(service_client, workspace_name, lakehouse_name, target_directory, controller=controller, stats=stats)
+    local_files = get_local_file_sizes(local_table_path)
+
+    if replace_diverged_table(local_table_path, lakehouse_path, local_files, remote_files, replace_table):
+        await delete_table(service_client, workspace_name, lakehouse_name, target_directory, controller=controller)
+        remote_files = {}
+
+    directory_client = file_system_client.get_directory_client(lakehouse_path) # type: ignore
+    result = DeltaSyncResult()
+    plan = plan_delta_sync(local_table_path, local_files, remote_files, retention_hours)
+
+    async def upload(file_path: str, overwrite: bool = True):
+        local_file_path = f"{local_table_path}/{file_path}"
+        if logger: logger.debug(f"Copying {local_file_path=} to {lakehouse_path}/{file_path}")
+        await controller.call_async(lambda: upload_file_to_directory(
+            directory_client,
+            local_file_path,
+            file_path,
+            chunk_size=chunk_size,
+            max_concurrency=max_concurrency,
+            overwrite=overwrite,
+            retry_total=0
+        ), stats)
+        result.uploaded_files.append(file_path)
+        result.uploaded_bytes += local_files[file_path]
+
+    await gather_bounded(upload, plan.data_files, upload_concurrency)
+    # commits are never overwritten, so a version written by someone else since the table was prepared fails the upload
+    for commit_file in plan.commit_files:
+        await upload(commit_file, overwrite=False)
+    await gather_bounded(upload, plan.checkpoint_files, upload_concurrency)
+
+    if delete_stale:
+        async def delete(file_path: str):
+            if logger: logger.debug(f"Deleting stale file {lakehouse_path}/{file_path}")
+            await controller.call_async(lambda: file_system_client.delete_file(f"{lakehouse_path}/{file_path}", **NO_SDK_RETRIES), stats) # type: ignore
+            result.deleted_files.append(file_path)
+
+        await gather_bounded(delete, plan.stale_files, upload_concurrency)
+    await directory_client.close() # type: ignore
+
+    result.unchanged_files = count_unchanged_files(local_files, remote_files, result.uploaded_files)
+    result.retries, result.throttled_seconds = stats.retries, stats.throttled_seconds
+    if logger: logger.info(f"Synced {local_table_path} to {lakehouse_path}: uploaded {len(result.uploaded_files)} files ({result.uploaded_bytes} bytes), {result.unchanged_files} unchanged, deleted {len(result.deleted_files)}, {result.retries} retries")
+    return result
+
+async def prepare_local_deltatable(
+    service_client: DataLakeServiceClient,
+    local_table_path: str,
+    lakehouse_name: str,
+    workspace_name: str,
+    download_data: bool = False,
+    concurrency: int | None = None,
+    controller: TransferController | None = None,
+) -> DeltaSyncResult:
+    """
+    Makes a local delta table continue the history of the table on the Lakehouse, so writes to it can be synced with copy_deltatable.
+
+    Works as onelake_tools.prepare_local_deltatable, with the downloads in flight as tasks of the event loop rather than threads.
+
+    Parameters:
+        service_client (DataLakeServiceClient): The asynchronous DataLakeServiceClient object used.
+        local_table_path (str): Path of the local delta table. Its base name is used as the table name.
+        lakehouse_name (str): The name of the lakehouse.
+        workspace_name (str): The name of the workspace.
+        download_data (bool, optional): Also download the data files of the current version, e.g. before a merge. Defaults to False.
+        concurrency (int, None, optional): Number of files downloaded at once. Defaults to onelake_tools.DEFAULT_UPLOAD_CONCURRENCY.
+        controller (TransferController, None, optional): Sends every request, retrying throttled and failed ones, see copy_deltatable. Defaults to a controller of concurrency requests.
+
+    Returns:
+        DeltaSyncResult: The files downloaded, the number of retried requests and the time waited on throttling.
+    """
+    target_directory = os.path.basename(local_table_path)
+    lakehouse_path = normalize_lakehouse_path(lakehouse_name, target_directory, type= "Tables")
+    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+    controller = controller or TransferController(concurrency or DEFAULT_UPLOAD_CONCURRENCY)
+    stats = TransferStats()
+    remote_files = await list_remote_files(service_client, workspace_name, lakehouse_name, target_directory, controller=controller, stats=stats)
+    remote_log = delta_log_files(remote_files)
+    local_log = delta_log_files(get_local_file_sizes(local_table_path))
+
+    result = DeltaSyncResult()
+
+    async def download(file_path: str):
+        local_file_path = f"{local_table_path}/{file_path}"
+        os.makedirs(path.dirname(local_file_path), exist_ok=True)
+
+        async def download_to_file() -> int:
+            # a retried download rewrites the file from the start
+            downloader = await file_system_client.get_file_client(f"{lakehouse_path}/{file_path}").download_file(**NO_SDK_RETRIES) # type: ignore
+            with open(local_file_path, "wb") as local_file:
+                return await downloader.readinto(local_file) # type: ignore
+
+        size = await controller.call_async(download_to_file, stats)
+        result.downloaded_files.append(file_path)
+        result.downloaded_bytes += size
+
+    if local_log != remote_log:
+        if logger: logger.info(f"Downloading the _delta_log of {lakehouse_path} ({len(remote_log)} files) to {local_table_path}")
+        if path.exists(local_table_path):
+            shutil.rmtree(local_table_path)
+        await gather_bounded(download, remote_log, concurrency)
+
+    missing_files = remove_unreferenced_local_files(local_table_path)
+    if download_data:
+        await gather_bounded(download, missing_files, concurrency)
+    result.retries, result.throttled_seconds = stats.retries, stats.throttled_seconds
+    return result
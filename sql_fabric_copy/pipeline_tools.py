@@ -0,0 +1,154 @@
+""" Module running items through stages in separate threads joined by bounded queues, so different items are in different stages at once. """
+from dataclasses import dataclass
+from logging import Logger
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List
+
+logger : Logger | None = None
+
+# marks the end of the items on a queue between stages
+_DONE = object()
+
+@dataclass
+class PipelineStage:
+    """A step every item passes through, run by a number of threads of its own."""
+    name: str
+    function: Callable[[Any], Any]
+    workers: int = 1
+
+class ByteBudget:
+    """
+    Bounds the bytes of data held between stages, e.g. extracted rows in memory or written files waiting for upload.
+
+    A stage acquires the size of an item, or an estimate of it before producing the item, blocking while the budget is used up, and a later stage releases it.
+    A request larger than the whole budget is granted once nothing else is held, so a single large item cannot stop the pipeline.
+    """
+    def __init__(self, limit_bytes: int | None = None) -> None:
+        self.limit_bytes = limit_bytes
+        self._held = 0
+        self._condition = threading.Condition()
+
+    @property
+    def held(self) -> int:
+        """Bytes currently acquired."""
+        with self._condition:
+            return self._held
+
+    def acquire(self, size: int):
+        """
+        Waits until size bytes fit in the budget and acquires them.
+
+        Parameters:
+            size (int): Number of bytes.
+        """
+        with self._condition:
+            if self.limit_bytes:
+                while self._held > 0 and self._held + size > self.limit_bytes:
+                    if logger: logger.debug(f"Waiting for {size} bytes of the budget, {self._held} of {self.limit_bytes} held.")
+                    self._condition.wait()
+            self._held += size
+
+    def adjust(self, acquired: int, size: int):
+        """
+        Replaces bytes acquired earlier by another size without waiting, e.g. an estimate reserved before reading an item by its actual size.
+
+        Parameters:
+            acquired (int): Number of bytes acquired earlier.
+            size (int): Number of bytes held from now on.
+        """
+        with self._condition:
+            self._held += size - acquired
+            self._condition.notify_all()
+
+    def release(self, size: int):
+        """
+        Releases bytes acquired earlier, waking stages waiting for the budget.
+
+        Parameters:
+            size (int): Number of bytes.
+        """
+        with self._condition:
+            self._held -= size
+            self._condition.notify_all()
+
+def run_pipeline(
+        items: Iterable[Any],
+        stages: List[PipelineStage],
+        queue_size: int = 1,
+        thread_name_prefix: str = "pipeline"
+) -> List[Any]:
+    """
+    Passes every item through the stages in order, each stage running in its own threads.
+
+    Stages hand items on over queues holding at most queue_size items, so once a slow stage has a full queue
+    the stages before it wait, rather than piling up data in memory or on disk.
+
+    Parameters:
+        items (Iterable[Any]): The inputs of the first stage.
+        stages (List[PipelineStage]): The stages, the output of each being the input of the next.
+        queue_size (int, optional): Number of items waiting between two stages. Defaults to 1.
+        thread_name_prefix (str, optional): Prefix of the names of the stage threads, followed by the stage name.
+
+    Returns:
+        List[Any]: The outputs of the last stage, in the order of items.
+
+    Throws:
+        Exception: The first error raised by a stage, once every other item has passed through the pipeline. Later stages skip an item that failed.
+    """
+    if not stages:
+        return list(items)
+    inputs = iter(enumerate(items))
+    inputs_lock = threading.Lock()
+    queues : List["queue.Queue[Any]"] = [queue.Queue(maxsize=max(queue_size, 1)) for _ in stages[1:]]
+    results : Dict[int, Any] = {}
+    errors : Dict[int, BaseException] = {}
+    running = [stage.workers for stage in stages]
+    state_lock = threading.Lock()
+
+    def next_item(stage_index: int) -> Any:
+        if stage_index == 0:
+            with inputs_lock:
+                return next(inputs, _DONE)
+        return queues[stage_index - 1].get()
+
+    def work(stage_index: int):
+        stage = stages[stage_index]
+        while True:
+            entry = next_item(stage_index)
+            if entry is _DONE:
+                break
+            index, item = entry
+            if index not in errors:
+                try:
+                    item = stage.function(item)
+                except BaseException as e:
+                    if logger: logger.exception(f"Stage {stage.name} failed for item {index}")
+                    with state_lock:
+                        errors[index] = e
+            if stage_index + 1 < len(stages):
+                queues[stage_index].put((index, item))
+            else:
+                with state_lock:
+                    results[index] = item
+        with state_lock:
+            running[stage_index] -= 1
+            last_worker = running[stage_index] == 0
+        # the last worker of a stage to finish tells every worker of the next stage there are no more items
+        if last_worker and stage_index + 1 < len(stages):
+            for _ in range(stages[stage_index + 1].workers):
+                queues[stage_index].put(_DONE)
+
+    threads = [
+        threading.Thread(target=work, args=(stage_index,), name=f"{thread_name_prefix}_{stage.name}_{worker}", daemon=True)
+        for stage_index, stage in enumerate(stages)
+        for worker in range(stage.workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[min(errors)]
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,185 @@
+""" Module mapping the columns of SQL Server result sets to Arrow schemas, so extraction does not infer types from the data. """
+from dataclasses import dataclass
+from logging import Logger
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import pyarrow as pa
+
+from .db_tools import bind_literals, get_engine, source_to_query
+
+logger : Logger | None = None
+
+@dataclass
+class SourceColumn:
+    """A column of a result set, as described by sp_describe_first_result_set."""
+    name: str
+    type_name: str
+    precision: int = 0
+    scale: int = 0
+    nullable: bool = True
+
+    @property
+    def base_type(self) -> str:
+        """The type name without its length, precision or scale, e.g. "decimal" for "decimal(18,2)"."""
+        return self.type_name.split("(", 1)[0].strip().lower()
+
+# Arrow type of each SQL Server type, from its precision and scale, restricted to types Delta tables can store.
+# tinyint (0 to 255) is int16, as Delta has no unsigned types. Timestamps are microseconds, the precision of Delta tables and Python datetimes.
+# Delta has no time type, so times are strings: "hh:mm:ss.fffffff" as SQL Server formats them with bcp and arrow-odbc,
+# and "hh:mm:ss.ffffff" with pyodbc, which reads them as microseconds.
+DEFAULT_TYPE_MAP : Dict[str, Callable[[int, int], pa.DataType]] = {
+    "bit": lambda precision, scale: pa.bool_(),
+    "tinyint": lambda precision, scale: pa.int16(),
+    "smallint": lambda precision, scale: pa.int16(),
+    "int": lambda precision, scale: pa.int32(),
+    "bigint": lambda precision, scale: pa.int64(),
+    "decimal": lambda precision, scale: pa.decimal128(precision, scale),
+    "numeric": lambda precision, scale: pa.decimal128(precision, scale),
+    "money": lambda precision, scale: pa.decimal128(19, 4),
+    "smallmoney": lambda precision, scale: pa.decimal128(10, 4),
+    "float": lambda precision, scale: pa.float64(),
+    "real": lambda precision, scale: pa.float32(),
+    "date": lambda precision, scale: pa.date32(),
+    "datetime": lambda precision, scale: pa.timestamp("us"),
+    "datetime2": lambda precision, scale: pa.timestamp("us"),
+    "smalldatetime": lambda precision, scale: pa.timestamp("us"),
+    "datetimeoffset": lambda precision, scale: pa.timestamp("us", tz="UTC"),
+    "time": lambda precision, scale: pa.string(),
+    "char": lambda precision, scale: pa.string(),
+    "varchar": lambda precision, scale: pa.string(),
+    "nchar": lambda precision, scale: pa.string(),
+    "nvarchar": lambda precision, scale: pa.string(),
+    "text": lambda precision, scale: pa.string(),
+    "ntext": lambda precision, scale: pa.string(),
+    "sysname": lambda precision, scale: pa.string(),
+    "xml": lambda precision, scale: pa.string(),
+    "uniqueidentifier": lambda precision, scale: pa.string(),
+    "binary": lambda precision, scale: pa.binary(),
+    "varbinary": lambda precision, scale: pa.binary(),
+    "image": lambda precision, scale: pa.binary(),
+    "timestamp": lambda precision, scale: pa.binary(),
+    "rowversion": lambda precision, scale: pa.binary(),
+    "hierarchyid": lambda precision, scale: pa.binary(),
+    "geometry": lambda precision, scale: pa.binary(),
+    "geography": lambda precision, scale: pa.binary(),
+}
+
+_descriptions : Dict[Tuple[str, str, str], List[SourceColumn] | None] = {}
+_descriptions_lock = threading.Lock()
+
+def sql_type_to_arrow(
+        column: SourceColumn,
+        type_map: Dict[str, str | pa.DataType] | None = None
+) -> pa.DataType | None:
+    """
+    Returns the Arrow type of a column.
+
+    Parameters:
+        column (SourceColumn): The column.
+        type_map (Dict[str, str | pa.DataType], None, optional): Arrow types overriding DEFAULT_TYPE_MAP, keyed by SQL Server type name, e.g. {"tinyint": "int32"}. String values are Arrow type aliases.
+
+    Returns:
+        pa.DataType, None: The Arrow type, or None if the SQL Server type is not mapped, e.g. sql_variant.
+    """
+    override = {name.lower(): data_type for name, data_type in (type_map or {}).items()}.get(column.base_type)
+    if isinstance(override, str):
+        return pa.type_for_alias(override)
+    if override is not None:
+        return override
+    to_arrow = DEFAULT_TYPE_MAP.get(column.base_type)
+    return to_arrow(column.precision, column.scale) if to_arrow else None
+
+def columns_to_schema(
+        columns: List[SourceColumn],
+        type_map: Dict[str, str | pa.DataType] | None = None
+) -> pa.Schema | None:
+    """
+    Returns the Arrow schema of a result set. Every field is nullable, as in the delta tables written from inferred types.
+
+    Parameters:
+        columns (List[SourceColumn]): The columns of the result set.
+        type_map (Dict[str, str | pa.DataType], None, optional): Arrow types overriding DEFAULT_TYPE_MAP, see sql_type_to_arrow.
+
+    Returns:
+        pa.Schema, None: The schema, or None if any column has a type that is not mapped.
+    """
+    fields : List[pa.Field] = []
+    for column in columns:
+        data_type = sql_type_to_arrow(column, type_map)
+        if data_type is None:
+            if logger: logger.warning(f"Column {column.name} has unmapped type {column.type_name}, inferring the types of the result set from its data.")
+            return None
+        fields.append(pa.field(column.name, data_type))
+    return pa.schema(fields)
+
+def describe_source(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        columns: Sequence[str] | None = None
+) -> List[SourceColumn] | None:
+    """
+    Returns the columns of a table or query, using sp_describe_first_result_set. Descriptions are cached per server, database and source.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required). ? placeholders of a query are described as NULL.
+        columns (Sequence[str], None, optional): Columns selected from the source. Defaults to every column.
+
+    Returns:
+        List[SourceColumn], None: The columns, or None if the database is not SQL Server.
+    """
+    query = source_to_query(source, columns=columns)
+    query = bind_literals(query, [None] * query.count("?"))
+    key = (sql_server.lower(), database_name.lower(), query)
+    with _descriptions_lock:
+        if key in _descriptions:
+            return _descriptions[key]
+    engine = get_engine(sql_server, database_name)
+    columns : List[SourceColumn] | None = None
+    if engine.dialect.name == "mssql":
+        if logger: logger.debug(f"Describing query: {query}")
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(
+                "EXEC sp_describe_first_result_set @tsql = ?",
+                (query,)
+            ).mappings().all()
+        columns = [
+            SourceColumn(row["name"], row["system_type_name"], row["precision"] or 0, row["scale"] or 0, bool(row["is_nullable"]))
+            for row in rows if not row["is_hidden"]
+        ]
+    with _descriptions_lock:
+        _descriptions[key] = columns
+    return columns
+
+def get_source_schema(
+        sql_server: str,
+        database_name: str,
+        source: str,
+        type_map: Dict[str, str | pa.DataType] | None = None,
+        columns: Sequence[str] | None = None
+) -> pa.Schema | None:
+    """
+    Returns the Arrow schema of a table or query from its SQL Server column types, to extract it with rather than inferring types from the data.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str): Query or name of table (schema required)
+        type_map (Dict[str, str | pa.DataType], None, optional): Arrow types overriding DEFAULT_TYPE_MAP, see sql_type_to_arrow.
+        columns (Sequence[str], None, optional): Columns selected from the source. Defaults to every column.
+
+    Returns:
+        pa.Schema, None: The schema, or None if the database is not SQL Server or a column type is not mapped.
+    """
+    described = describe_source(sql_server, database_name, source, columns)
+    return columns_to_schema(described, type_map) if described is not None else None
+
+def clear_schema_cache():
+    """
+    Forgets every cached description, e.g. after the columns of a source have changed.
+    """
+    with _descriptions_lock:
+        _descriptions.clear()
@@ -1,24 +1,150 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from logging import Logger, error, warn
 import os
 import os.path as path
+import re
 import shutil
 import sys
-from typing import List, Literal
-
-from deltalake import write_deltalake # type: ignore
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Literal, Tuple, TypeVar
 
 from azure.storage.filedatalake import (
     DataLakeServiceClient,
 )
-import pandas as pd
-from .db_tools import table_to_dataframe
+import pyarrow as pa
+from .credential_tools import TokenCache
+from .db_tools import (
+    DEFAULT_BATCH_ROWS,
+    DEFAULT_POOL_SIZE,
+    BcpAuthentication,
+    FetchBackend,
+    change_tracking_query,
+    get_change_tracking_versions,
+    get_columns,
+    get_engine,
+    get_max_value,
+    get_primary_key,
+    get_table_fingerprint,
+    get_partition_ranges,
+    get_table_sizes,
+    quote_identifier,
+    table_to_arrow,
+    table_to_bcp_record_batch_reader,
+    table_to_partitioned_record_batch_reader,
+    table_to_record_batch_reader
+)
+from .delta_tools import (
+    ParquetCompression,
+    ParquetLayout,
+    decode_watermark,
+    encode_watermark,
+    get_data_files,
+    get_table_version,
+    merge_into_table,
+    read_watermark,
+    watermark_commit_properties
+)
+from .fingerprint_tools import FingerprintManifest, fingerprint_key
+from .journal_tools import STAGE_COMMITTED, STAGE_STAGED, RunJournal, journal_path
+from .metrics_tools import StageMetrics, emit, has_hooks, is_dataframe, measure_data, measure_stage, time_stage
 from .onelake_tools import (
+    DEFAULT_UPLOAD_CONCURRENCY,
     copy_deltatable,
+    get_deltalake_storage_options,
+    get_lakehouse_table_uri,
     get_service_client_token_credential,
+    list_remote_files,
+    normalize_lakehouse_path,
+    prepare_local_deltatable,
     upload_file
 )
+from .pipeline_tools import ByteBudget, PipelineStage, run_pipeline
+from .schema_tools import get_source_schema
+from .transfer_tools import TransferController
+if TYPE_CHECKING:
+    from azure.storage.filedatalake.aio import DataLakeServiceClient as AsyncDataLakeServiceClient
+    import pandas as pd
 logger : Logger | None = None
 
+T = TypeVar("T")
+
+LoadMode = Literal["full", "incremental", "merge"]
+
+# column holding SYS_CHANGE_OPERATION in change tracking extracts
+CHANGE_OPERATION_COLUMN = "_sys_change_operation"
+
+def write_deltalake(*args: Any, **kwargs: Any) -> Any:
+    """
+    Calls deltalake.write_deltalake, importing deltalake on the first Delta write so copies to CSV never load it.
+    """
+    from deltalake import write_deltalake as deltalake_write_deltalake # type: ignore
+    return deltalake_write_deltalake(*args, **kwargs)
+
+CsvCompression = Literal["gzip", "zstd"]
+# extension of CSV files written by upload_csv_lakehouse, removed from target_file and temp_csv_location
+CSV_FILE_EXTENSION = re.compile(r"\.csv(\.gz|\.zst)?$", re.IGNORECASE)
+
+@dataclass
+class TableCopyResult:
+    """Outcome of copying a single source to the Lakehouse."""
+    source: str
+    target_table: str | None = None
+    succeeded: bool = False
+    skipped: bool = False
+    error: BaseException | None = None
+    seconds: float = 0.0
+    rows: int = 0
+    resumed: bool = False
+
+@dataclass
+class TableCopyOptions:
+    """Settings shared by every table copied in a run of upload_table_lakehouse. See upload_table_lakehouse for details."""
+    sql_server: str
+    database_name: str
+    workspace_name: str
+    lakehouse_name: str
+    storage_account: str | None = None
+    temp_table_location: str = "output"
+    deltalake_mode: Literal['error', 'append', 'overwrite', 'ignore'] = "overwrite"
+    batch_rows: int | None = None
+    max_memory_mb: int | None = None
+    partitions: int | None = None
+    partition_column: str | Dict[str, str] | None = None
+    extract_engine: Literal["odbc", "bcp"] = "odbc"
+    fetch_backend: FetchBackend = "cursor"
+    bcp_path: str | None = None
+    bcp_authentication: BcpAuthentication | None = None
+    type_map: Dict[str, str] | None = None
+    parquet_layout: ParquetLayout | Dict[str, ParquetLayout] | None = None
+    sort_by: str | List[str] | Dict[str, str | List[str]] | None = None
+    upload_concurrency: int | None = None
+    transfer_controller: TransferController | None = None
+    chunk_size: int | None = None
+    max_concurrency: int | None = None
+    retention_hours: float | None = None
+    sink: Literal["staged", "direct"] = "staged"
+    sink_uri: str | None = None
+    storage_options: Dict[str, str] | None = None
+    load_mode: LoadMode | Dict[str, LoadMode] = "full"
+    where: str | Dict[str, str] | None = None
+    where_params: List[Any] | Dict[str, List[Any]] | None = None
+    columns: str | List[str] | Dict[str, str | List[str]] | None = None
+    watermark_column: str | Dict[str, str] | None = None
+    primary_key: str | List[str] | Dict[str, str | List[str]] | None = None
+    change_detection: Literal["watermark", "change_tracking"] = "watermark"
+    fingerprint: Literal["checksum", "rowversion", "stats"] | None = None
+    fingerprint_manifest: FingerprintManifest | None = None
+    force: bool = False
+    journal: RunJournal | None = None
+    checkpoint_ranges: bool = False
+    pipeline_depth: int | None = None
+    pipeline_memory_mb: int | None = None
+    pipeline_disk_mb: int | None = None
+    event_loop: asyncio.AbstractEventLoop | None = None
+
 def upload_table_lakehouse(
     sql_server: str,
     database_name: str,
@@ -30,10 +156,54 @@ def upload_table_lakehouse(
     client_id : str | None = None,
     client_secret : str | None = None,
     deltalake_mode: Literal['error', 'append', 'overwrite', 'ignore'] = "overwrite",
-    target_table: str | None = None,
+    target_table: str | Dict[str, str] | None = None,
     service_client : DataLakeServiceClient | None = None,
-    temp_table_location: str | None = "output"
-):
+    token_cache: TokenCache | None = None,
+    temp_table_location: str | None = "output",
+    batch_rows: int | None = None,
+    max_memory_mb: int | None = None,
+    partitions: int | None = None,
+    partition_column: str | Dict[str, str] | None = None,
+    extract_engine: Literal["odbc", "bcp"] = "odbc",
+    fetch_backend: FetchBackend = "cursor",
+    bcp_path: str | None = None,
+    bcp_authentication: BcpAuthentication | None = None,
+    type_map: Dict[str, str] | None = None,
+    target_file_size_mb: int | Dict[str, int] | None = None,
+    row_group_rows: int | Dict[str, int] | None = None,
+    compression: ParquetCompression | Dict[str, ParquetCompression] | None = None,
+    compression_level: int | Dict[str, int] | None = None,
+    dictionary_encoding: bool | Dict[str, bool] | None = None,
+    sort_by: str | List[str] | Dict[str, str | List[str]] | None = None,
+    where: str | Dict[str, str] | None = None,
+    where_params: List[Any] | Dict[str, List[Any]] | None = None,
+    columns: str | List[str] | Dict[str, str | List[str]] | None = None,
+    parallel: int | None = None,
+    schedule: Literal["largest_first", "in_order"] = "largest_first",
+    pool_size: int | None = None,
+    pipeline_depth: int | None = None,
+    pipeline_memory_mb: int | None = None,
+    pipeline_disk_mb: int | None = None,
+    upload_concurrency: int | None = None,
+    max_upload_concurrency: int | None = None,
+    chunk_size_mb: int | None = None,
+    max_concurrency: int | None = None,
+    retention_hours: float | None = None,
+    sink: Literal["staged", "direct"] = "staged",
+    sink_uri: str | None = None,
+    storage_options: Dict[str, str] | None = None,
+    load_mode: LoadMode | Dict[str, LoadMode] = "full",
+    watermark_column: str | Dict[str, str] | None = None,
+    primary_key: str | List[str] | Dict[str, str | List[str]] | None = None,
+    change_detection: Literal["watermark", "change_tracking"] = "watermark",
+    fingerprint: Literal["checksum", "rowversion", "stats"] | None = None,
+    fingerprint_manifest: str | None = None,
+    force: bool = False,
+    run_id: str | None = None,
+    resume: bool = False,
+    checkpoint_ranges: bool = False,
+    event_loop: asyncio.AbstractEventLoop | None = None
+) -> List[TableCopyResult]:
     """
     Uploads a delta table from SQL Server to a directory in Azure Data Lake Storage.
 
@@ -48,12 +218,63 @@ def upload_table_lakehouse(
         client_id (str, None, optional): Client ID if using Token Credentials
         client_secret (str, None, optional): Client Secret if using Token Credentials
         deltalake_mode (str, ('error', 'append', 'overwrite', 'ignore'), optional): ! this will probably be removed
-        target_table (str, None, optional): Target table name to write to on Fabric Lakehouse. Required when passing query, optional when passing a table, and disabled when passing multiple tables. 
+        target_table (str, Dict[str, str], None, optional): Target table name to write to on Fabric Lakehouse. Required when passing query, optional when passing a table, and disabled when passing multiple tables unless given as a dictionary of source to target table name.
         service_client (DataLakeServiceClient, None, optional): Could be passed in if user wanted to authenticate a different way, or use a shared connection
+        token_cache (TokenCache, None, optional): Keeps OneLake tokens, and the credential source that worked, across runs when service_client is not given, e.g. credential_tools.TokenCache(). Defaults to a cache in memory.
         temp_table_location (str, None, optional): this is where the delta tables will be stored locally. Defaults to "output".
+        batch_rows (int, None, optional): Enables streaming mode, fetching at most this many rows per batch and writing them to the delta table as they arrive.
+        max_memory_mb (int, None, optional): Enables streaming mode, limiting the approximate in-memory size of each batch.
+        partitions (int, None, optional): Enables streaming mode, reading each source as up to this many ranges over separate connections at once, written as one Delta version. See db_tools.get_partition_ranges.
+        partition_column (str, Dict[str, str], None, optional): Numeric or date column the ranges are split on, either for every source or as a dictionary of source to column. Defaults to the partitioning column of partitioned tables; other sources are then read over a single connection.
+        extract_engine (str, ('odbc', 'bcp'), optional): "odbc" fetches rows over the pooled connection. "bcp" exports each source with the bcp utility in character mode and streams its output into the delta table (see db_tools.table_to_bcp_record_batch_reader), and cannot be combined with partitions. Defaults to "odbc".
+        fetch_backend (str, ('cursor', 'arrow_odbc'), optional): How the odbc engine fetches rows. "cursor" fetches rows over the pooled connection and decodes them into Arrow arrays. "arrow_odbc" fills Arrow arrays straight from the ODBC driver with arrow-odbc, without a Python object per value, over a connection of its own (see db_tools.table_to_record_batch_reader). Either way sources that are not streamed are extracted as an Arrow table rather than a pandas DataFrame. Defaults to "cursor".
+        bcp_path (str, None, optional): bcp executable used by the bcp engine. Defaults to db_tools.BCP_PATH.
+        bcp_authentication (str, ('trusted', 'sql', 'entra'), None, optional): How the bcp engine logs in to SQL Server, with the login of the sql_server URL or of the SQL_FABRIC_COPY_BCP_USER and SQL_FABRIC_COPY_BCP_PASSWORD environment variables (see db_tools.bcp_login_arguments). Defaults to "sql" when a login is given, and Windows authentication otherwise.
+        type_map (Dict[str, str], None, optional): Arrow type aliases overriding schema_tools.DEFAULT_TYPE_MAP, keyed by SQL Server type name, e.g. {"tinyint": "int32"}. On SQL Server every source is extracted into the schema mapped from its column types; other databases, and sources with an unmapped type, infer types from the data.
+        target_file_size_mb (int, Dict[str, int], None, optional): Splits each write into parquet files of about this size, so they are uploaded, and read by Fabric, in parallel. Defaults to the deltalake default.
+        row_group_rows (int, Dict[str, int], None, optional): Maximum rows per parquet row group. Defaults to the deltalake default.
+        compression (str, ('uncompressed', 'snappy', 'gzip', 'brotli', 'lz4', 'zstd', 'lz4_raw'), Dict, None, optional): Parquet compression codec. Defaults to snappy, or zstd when only compression_level is given.
+        compression_level (int, Dict[str, int], None, optional): Level of the compression codec, e.g. 1 to 22 for zstd.
+        dictionary_encoding (bool, Dict[str, bool], None, optional): Enables or disables dictionary encoding of every column. Defaults to enabled.
+            Each parquet setting is either for every source or a dictionary of source to value.
+        sort_by (str, List[str], Dict, None, optional): Columns SQL Server sorts the rows by before they are written, clustering the values of each file and row group for Direct Lake and file skipping; either for every source or as a dictionary of source to columns. A comma separated string is split. Partitioned reads sort each range.
+        where (str, Dict[str, str], None, optional): SQL filter of the rows to copy, run on SQL Server, either for every source or as a dictionary of source to filter. Values are best passed as ? placeholders with where_params rather than written into the filter. Combined with the watermark filter of incremental and merge loads.
+        where_params (List[Any], Dict[str, List[Any]], None, optional): Values of the ? placeholders of where, sent to SQL Server as query parameters, either for every source or as a dictionary of source to values.
+        columns (str, List[str], Dict, None, optional): Columns to copy, either for every source or as a dictionary of source to columns. A comma separated string is split. Merge loads need the primary key among them. Defaults to every column.
+        parallel (int, None, optional): Number of tables to copy at once, sharing service_client. Defaults to 1.
+        schedule (str, ('largest_first', 'in_order'), optional): Order a list of tables is started in when parallel or pipeline_depth is set. "largest_first" starts the largest tables first, by their size in sys.dm_db_partition_stats (see db_tools.get_table_sizes), so a large table started last does not finish long after the others; queries and tables of unknown size follow in their order. Defaults to "largest_first".
+        pool_size (int, None, optional): Number of pooled SQL connections, raised to at least parallel times partitions. Connections are reused across tables; call db_tools.dispose_engines once finished. Defaults to DEFAULT_POOL_SIZE.
+        pipeline_depth (int, None, optional): Copies a list of sources through separate extract, write and upload stages joined by queues of this many tables, so the next table is read from SQL Server and written locally while the current one uploads. Each stage runs parallel tables at once. Defaults to None, copying each table through every step before the next.
+        pipeline_memory_mb (int, None, optional): With pipeline_depth, stops extracting while extracted tables waiting to be written hold more than this many MB. A table reserves its size in SQL Server before it is read, so tables are only read at once while they fit together. Streaming extracts are bounded by their batches instead.
+        pipeline_disk_mb (int, None, optional): With pipeline_depth, stops writing while written files waiting to be uploaded hold more than this many MB.
+        upload_concurrency (int, None, optional): Number of files of a table uploaded at once. All OneLake requests of the run go through one transfer_tools.TransferController, which retries throttled and failed requests with backoff and halves the requests in flight while OneLake throttles. Defaults to onelake_tools.DEFAULT_UPLOAD_CONCURRENCY.
+        max_upload_concurrency (int, None, optional): Number of files of a table uploaded at once that the controller may raise upload_concurrency to while OneLake answers without throttling. Defaults to upload_concurrency, only regaining it after throttling.
+        chunk_size_mb (int, None, optional): Files larger than this are uploaded as blocks of this size. Defaults to onelake_tools.DEFAULT_CHUNK_SIZE.
+        max_concurrency (int, None, optional): Number of blocks of a single file uploaded at once. Defaults to onelake_tools.DEFAULT_MAX_CONCURRENCY.
+        retention_hours (float, None, optional): In staged mode, data files a new version no longer uses are kept on the Lakehouse for readers of older versions and time travel, and deleted by a later upload once removed this many hours ago. Defaults to onelake_tools.DEFAULT_RETENTION_HOURS, the Delta default of 7 days.
+        sink (str, ('staged', 'direct'), optional): "staged" writes each delta table under temp_table_location and then uploads it. "direct" writes the delta table straight to the Lakehouse, using the credential of service_client, with no local copy. Defaults to "staged".
+        sink_uri (str, None, optional): Root that tables are written under in direct mode, e.g. a local directory or an Azurite container. Defaults to the Tables folder of the Lakehouse on OneLake.
+        storage_options (Dict[str, str], None, optional): Extra deltalake storage options for direct mode, overriding those derived from service_client.
+        load_mode (str, ('full', 'incremental', 'merge'), optional): "full" replaces the table on every run. "incremental" extracts only rows whose watermark_column is past the high-water mark recorded in the Delta commit metadata of the target table, and appends them as a new version. "merge" extracts changed rows the same way, or through SQL Server change tracking, and upserts them into the table with a Delta MERGE on the primary key. The first incremental or merge load, or one after a full reload, copies every row. Either for every source or as a dictionary of source to mode. Defaults to "full".
+        watermark_column (str, Dict[str, str], None, optional): Rowversion, identity or modified date column used by incremental and merge loads, either for every source or as a dictionary of source to column.
+        primary_key (str, List[str], Dict, None, optional): Key columns for merge loads, either for every source or as a dictionary of source to columns. A comma separated string is split. Read from SQL Server metadata when not given.
+        change_detection (str, ('watermark', 'change_tracking'), optional): How merge loads find changed rows. "change_tracking" reads CHANGETABLE(CHANGES ...) since the last copied change tracking version, which also removes deleted rows. Defaults to "watermark".
+        fingerprint (str, ('checksum', 'rowversion', 'stats'), None, optional): Skips sources whose fingerprint (see db_tools.get_table_fingerprint) matches the one saved at their last successful copy. The rowversion method uses watermark_column. Defaults to None, copying every source.
+        fingerprint_manifest (str, None, optional): Path of the JSON file holding the fingerprints. Defaults to _fingerprints.json in the folder holding the local delta tables.
+        force (bool, optional): Copy every source even when its fingerprint is unchanged. The manifest is still updated. Defaults to False.
+        run_id (str, None, optional): Records the progress of each source in the journal of this run (see journal_tools.RunJournal), in the _runs folder beside the local delta tables, so the run can be resumed if interrupted. Defaults to None, keeping no journal.
+        resume (bool, optional): Continues the run run_id with the same sources and settings. Sources it committed are skipped, and sources it wrote but did not finish uploading upload the files still missing from the Lakehouse without being extracted again. Defaults to False.
+        checkpoint_ranges (bool, optional): With run_id and partitions, saves each range of a source to a local parquet file as soon as it is read, and writes the delta table from those files, so a resumed run only reads the ranges not saved yet. Each row is then written locally twice. Defaults to False.
+        event_loop (asyncio.AbstractEventLoop, None, optional): Running event loop of an asynchronous service_client, which OneLake requests are then sent on. See upload_table_lakehouse_async.
+
+    Returns:
+        List[TableCopyResult]: Result per source, in the order of source. A failed table does not stop the others.
+
+    Throws:
+        Exception: If any table failed, after all tables have been attempted and a summary printed.
     """
 
-    if isinstance(source,str) and " from " in source.lower() and not target_table: 
+    if isinstance(source,str) and " from " in source.lower() and not table_option(target_table, source): 
         if logger:
             logger.error("If source provided is a query, you MUST pass a target_table.")
         else:
@@ -69,53 +290,997 @@ def upload_table_lakehouse(
             source = [source]
     if temp_table_location is None:
         temp_table_location = "output"
-    if target_table and len(source) > 1 :
+    if isinstance(target_table, str) and len(source) > 1 :
         if logger: logger.warn("target_table provided for list of tables, which is not supported.")
         else: warn("target_table for list of tables, which is not supported.")
         if not sys.stdin.isatty():
-            sys.exit(1)
+            raise Exception("target_table cannot be given for a list of tables, pass a dictionary of source to target table instead.")
         user_input = input("Ignore parameter target_table? (y to continue): ")
         if user_input.lower() != 'y':
             if logger: logger.warn("Exiting.")
             else: warn("Exiting.")
             sys.exit()
         target_table = None
+    upload_concurrency = upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY
+    max_upload_concurrency = max(max_upload_concurrency or upload_concurrency, upload_concurrency)
     if service_client is None:
         service_client = get_service_client_token_credential(
             storage_account,
             service_prinicipal_tenant_id=tenant_id,
             service_prinicipal_client_id=client_id,
-            service_prinicipal_client_secret=client_secret
+            service_prinicipal_client_secret=client_secret,
+            connection_pool_size=(parallel or 1) * max_upload_concurrency,
+            token_cache=token_cache
         )
+    # shared by every table, so the requests of all of them back off together when OneLake throttles
+    transfer_controller = TransferController(
+        (parallel or 1) * upload_concurrency,
+        max_concurrency=(parallel or 1) * max_upload_concurrency
+    )
+
+    sources = [query_or_table.lstrip().rstrip() for query_or_table in source]
+    target_tables = {
+        query_or_table: table_option(target_table, query_or_table) if isinstance(target_table, dict) or len(sources) == 1 else None
+        for query_or_table in sources
+    }
+    target_names = [target_table_name(query_or_table, target_tables[query_or_table]) for query_or_table in sources]
+    if len(target_tables) < len(sources) or len(set(target_names)) < len(target_names):
+        duplicates = sorted({name for name in target_names if target_names.count(name) > 1})
+        raise Exception(f"Every source must be copied once, to its own table, but several copy to {', '.join(duplicates)}.")
+    # a single table with its own temp_table_location is written to that folder rather than below it
+    single_table_location = temp_table_location if len(sources) == 1 and temp_table_location != "output" else None
+    tables_directory = path.dirname(single_table_location) if single_table_location else temp_table_location
+    if resume and not run_id:
+        raise Exception("resume requires the run_id of the run to resume.")
+    journal = RunJournal(journal_path(tables_directory, run_id), run_id, resume) if run_id else None
+    # a pipeline keeps the connections of streaming extracts open while they wait in the queue to be written
+    readers = 2 * (parallel or 1) + pipeline_depth if pipeline_depth else (parallel or 1)
+    get_engine(sql_server, database_name, pool_size=max(pool_size or DEFAULT_POOL_SIZE, readers * (partitions or 1)))
+    options = TableCopyOptions(
+        sql_server,
+        database_name,
+        workspace_name,
+        lakehouse_name,
+        storage_account=storage_account,
+        temp_table_location=temp_table_location,
+        deltalake_mode=deltalake_mode,
+        batch_rows=batch_rows,
+        max_memory_mb=max_memory_mb,
+        partitions=partitions,
+        partition_column=partition_column,
+        extract_engine=extract_engine,
+        fetch_backend=fetch_backend,
+        bcp_path=bcp_path,
+        bcp_authentication=bcp_authentication,
+        type_map=type_map,
+        parquet_layout={
+            query_or_table: ParquetLayout(
+                target_file_size_mb=table_option(target_file_size_mb, query_or_table),
+                row_group_rows=table_option(row_group_rows, query_or_table),
+                compression=table_option(compression, query_or_table),
+                compression_level=table_option(compression_level, query_or_table),
+                dictionary_encoding=table_option(dictionary_encoding, query_or_table)
+            )
+            for query_or_table in sources
+        },
+        sort_by=sort_by,
+        upload_concurrency=max_upload_concurrency,
+        transfer_controller=transfer_controller,
+        chunk_size=chunk_size_mb * 1024 * 1024 if chunk_size_mb else None,
+        max_concurrency=max_concurrency,
+        retention_hours=retention_hours,
+        sink=sink,
+        sink_uri=sink_uri,
+        storage_options=storage_options,
+        load_mode=load_mode,
+        where=where,
+        where_params=where_params,
+        columns=columns,
+        watermark_column=watermark_column,
+        primary_key=primary_key,
+        change_detection=change_detection,
+        fingerprint=fingerprint,
+        fingerprint_manifest=FingerprintManifest(
+            fingerprint_manifest or path.join(tables_directory, "_fingerprints.json")
+        ) if fingerprint else None,
+        force=force,
+        journal=journal,
+        checkpoint_ranges=checkpoint_ranges,
+        pipeline_depth=pipeline_depth,
+        pipeline_memory_mb=pipeline_memory_mb,
+        pipeline_disk_mb=pipeline_disk_mb,
+        event_loop=event_loop
+    )
+
+    def copy_table(query_or_table: str) -> TableCopyResult:
+        return _copy_table(
+            service_client, # type: ignore
+            options,
+            query_or_table,
+            target_table=target_tables[query_or_table],
+            table_location=single_table_location
+        )
+
+    concurrent = len(sources) > 1 and bool(pipeline_depth or (parallel and parallel > 1))
+    order = schedule_sources(sql_server, database_name, sources) if concurrent and schedule == "largest_first" else sources
+    if pipeline_depth and len(sources) > 1:
+        copied = _copy_tables_pipelined(service_client, options, order, parallel or 1, target_tables) # type: ignore
+    elif parallel and parallel > 1 and len(sources) > 1:
+        # tables are handed to the workers in order, so each worker that becomes free takes the largest table left
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="sql_fabric_copy") as executor:
+            copied = list(executor.map(copy_table, order))
+    else:
+        copied = [copy_table(query_or_table) for query_or_table in order]
+    copied_by_source = dict(zip(order, copied))
+    results = [copied_by_source[query_or_table] for query_or_table in sources]
+
+    transfers = transfer_controller.stats
+    if logger: logger.info(f"OneLake requests: {transfers.retries} retried, {transfers.throttled} throttled for {transfers.throttled_seconds:.1f}s, ending at {transfer_controller.concurrency} in flight")
+    print_summary(results)
+    failed = [result for result in results if not result.succeeded]
+    if failed:
+        resumable = f" Run {journal.run_id} can be resumed." if journal else ""
+        raise Exception(f"{len(failed)} of {len(results)} tables failed: {', '.join(result.source for result in failed)}.{resumable}")
+    return results
+
+async def upload_table_lakehouse_async(
+    sql_server: str,
+    database_name: str,
+    source: str | List[str],
+    workspace_name: str,
+    lakehouse_name: str,
+    storage_account: str | None = None,
+    tenant_id: str | None = None,
+    client_id: str | None = None,
+    client_secret: str | None = None,
+    service_client: "AsyncDataLakeServiceClient | None" = None,
+    **kwargs: Any
+) -> List[TableCopyResult]:
+    """
+    Uploads delta tables from SQL Server to the Lakehouse as upload_table_lakehouse does, sending OneLake requests with
+    the asynchronous Data Lake client on the running event loop. Uploads of a table are bounded by upload_concurrency
+    without a thread per upload, and the event loop stays free while tables are extracted and written in a worker thread.
 
-    for query_or_table in source:
-        query_or_table = query_or_table.lstrip().rstrip()
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        source (str, List[str]): Query or name of table (schema required), or a list of them.
+        workspace_name (str): Name of Fabric-enabled PowerBI workspace
+        lakehouse_name (str): Name of Lakehouse in PowerBI workspace
+        storage_account (str, None, optional): Storage account to use. Can either be just name or full URL
+        tenant_id (str, None, optional): Tenant ID if using Token Credentials
+        client_id (str, None, optional): Client ID if using Token Credentials
+        client_secret (str, None, optional): Client Secret if using Token Credentials
+        service_client (azure.storage.filedatalake.aio.DataLakeServiceClient, None, optional): Asynchronous client to use. Created, and closed when finished, when not given.
+        kwargs: Any other parameter of upload_table_lakehouse.
+
+    Returns:
+        List[TableCopyResult]: Result per source, in the order of source. A failed table does not stop the others.
 
-        df = table_to_dataframe( 
+    Throws:
+        Exception: If any table failed, after all tables have been attempted and a summary printed.
+    """
+    from . import onelake_tools_aio
+    owns_client = service_client is None
+    if service_client is None:
+        service_client = onelake_tools_aio.get_service_client_token_credential(
+            storage_account,
+            service_prinicipal_tenant_id=tenant_id,
+            service_prinicipal_client_id=client_id,
+            service_prinicipal_client_secret=client_secret,
+            connection_pool_size=(kwargs.get("parallel") or 1) * max(
+                kwargs.get("upload_concurrency") or DEFAULT_UPLOAD_CONCURRENCY,
+                kwargs.get("max_upload_concurrency") or 0
+            ),
+            token_cache=kwargs.get("token_cache")
+        )
+    try:
+        return await asyncio.to_thread(
+            upload_table_lakehouse,
             sql_server,
             database_name,
-            query_or_table
+            source,
+            workspace_name,
+            lakehouse_name,
+            storage_account=storage_account,
+            service_client=service_client, # type: ignore
+            event_loop=asyncio.get_running_loop(),
+            **kwargs
         )
-        table_name = query_or_table
-        if target_table and len(source) == 1:
-            query_or_table = target_table
-        if query_or_table and "." in query_or_table:
-            query_or_table = query_or_table.replace(".", "_")
-        if query_or_table and query_or_table.startswith("dbo_"):
-            query_or_table = query_or_table[4:]
-        if len(source) == 1 and temp_table_location != "output":
-            _temp_table_location = temp_table_location
+    finally:
+        if owns_client:
+            await onelake_tools_aio.close_service_client(service_client)
+
+def onelake_function(
+    options: TableCopyOptions,
+    function: Callable[..., T]
+) -> Callable[..., T]:
+    """
+    Returns a function of onelake_tools, or a blocking call of the coroutine function of the same name in onelake_tools_aio
+    on options.event_loop when the service client is asynchronous. onelake_tools_aio is only imported in the second case.
+
+    Parameters:
+        options (TableCopyOptions): Settings of the run.
+        function (Callable): The function of onelake_tools.
+
+    Returns:
+        Callable: The function to call, from a thread other than the one running the event loop.
+    """
+    event_loop = options.event_loop
+    if event_loop is None:
+        return function
+    from . import onelake_tools_aio
+    async_function = getattr(onelake_tools_aio, function.__name__)
+
+    def call(*args: Any, **kwargs: Any) -> T:
+        return asyncio.run_coroutine_threadsafe(async_function(*args, **kwargs), event_loop).result() # type: ignore
+    return call
+
+@dataclass
+class _TableCopyJob:
+    """State of a source between the steps of _copy_table."""
+    query_or_table: str
+    result: TableCopyResult
+    started: float
+    table_name: str
+    target_table: str | None = None
+    table_location: str | None = None
+    table_uri: str = ""
+    target_tablename: str = ""
+    storage_options: Dict[str, str] | None = None
+    source_fingerprint: str | None = None
+    mode: Literal['error', 'append', 'overwrite', 'ignore', 'merge'] = "overwrite"
+    source: str = ""
+    where: str | None = None
+    params: List[Any] | None = None
+    commit_properties: Any = None
+    primary_key: List[str] = field(default_factory=list)
+    operation_column: str | None = None
+    columns: List[str] | None = None
+    data: Any = None
+    extract_metrics: StageMetrics | None = None
+    written_bytes: int = 0
+    # key of the source in the journal and the fingerprint manifest, see fingerprint_key
+    source_key: str = ""
+    staged: bool = False
+    checkpoint_directory: str | None = None
+    done: bool = False
+
+def _copy_tables_pipelined(
+    service_client: DataLakeServiceClient,
+    options: TableCopyOptions,
+    sources: List[str],
+    workers: int = 1,
+    target_tables: Dict[str, str | None] | None = None
+) -> List[TableCopyResult]:
+    """
+    Copies sources through extract, write and upload stages running at the same time, joined by queues of options.pipeline_depth tables.
+
+    While the upload of a table is waiting on the network, the next is written locally and the one after it read from SQL Server.
+    Extracted tables held in memory are bounded by options.pipeline_memory_mb and written files waiting for upload by options.pipeline_disk_mb.
+    A table read into memory reserves its size in SQL Server (see db_tools.get_table_sizes) before it is read, so tables are only read at once
+    while they fit in the budget together; the reservation is replaced by the size read once it is known. Queries and tables of unknown size
+    reserve nothing until they are read.
+
+    Parameters:
+        service_client (DataLakeServiceClient): Client used to upload the tables, or whose credential is used in direct mode.
+        options (TableCopyOptions): Settings of the run.
+        sources (List[str]): Queries or names of tables (schema required)
+        workers (int, optional): Number of tables each stage works on at once. Defaults to 1.
+        target_tables (Dict[str, str], None, optional): Target table name of each source, see upload_table_lakehouse.
+
+    Returns:
+        List[TableCopyResult]: Result per source, in the order of sources.
+    """
+    memory = ByteBudget(options.pipeline_memory_mb * 1024 * 1024 if options.pipeline_memory_mb else None)
+    disk = ByteBudget(options.pipeline_disk_mb * 1024 * 1024 if options.pipeline_disk_mb else None)
+    # streaming extracts are only read by the write, so only tables extracted at once hold their rows in memory
+    in_memory = _extracts_in_memory(options)
+    sizes = get_table_sizes(options.sql_server, options.database_name, sources) if options.pipeline_memory_mb and in_memory else {}
+
+    def extract(query_or_table: str) -> Tuple[_TableCopyJob, int]:
+        job = _start_job(query_or_table, table_option(target_tables, query_or_table))
+        _run_step(service_client, options, job, _prepare_table)
+        reserved = sizes.get(query_or_table, 0) if in_memory and not job.done and not job.staged else 0
+        memory.acquire(reserved)
+        _run_step(service_client, options, job, _extract_table)
+        held = job.extract_metrics.bytes_read if (isinstance(job.data, pa.Table) or is_dataframe(job.data)) and job.extract_metrics else 0
+        memory.adjust(reserved, held)
+        return job, held
+
+    def write(extracted: Tuple[_TableCopyJob, int]) -> Tuple[_TableCopyJob, int]:
+        job, held = extracted
+        try:
+            _run_step(service_client, options, job, _write_table)
+        finally:
+            memory.release(held)
+        staged = job.written_bytes if options.sink == "staged" and not job.done else 0
+        disk.acquire(staged)
+        return job, staged
+
+    def upload(written: Tuple[_TableCopyJob, int]) -> TableCopyResult:
+        job, staged = written
+        try:
+            _run_step(service_client, options, job, _upload_table)
+        finally:
+            disk.release(staged)
+        return _finish_job(job)
+
+    return run_pipeline(
+        sources,
+        [PipelineStage("extract", extract, workers), PipelineStage("write", write, workers), PipelineStage("upload", upload, workers)],
+        queue_size=options.pipeline_depth or 1,
+        thread_name_prefix="sql_fabric_copy"
+    )
+
+def _copy_table(
+    service_client: DataLakeServiceClient,
+    options: TableCopyOptions,
+    query_or_table: str,
+    target_table: str | None = None,
+    table_location: str | None = None
+) -> TableCopyResult:
+    """
+    Copies a single table or query to the Lakehouse, catching any failure into the returned result.
+
+    Parameters:
+        service_client (DataLakeServiceClient): Client used to upload the table, or whose credential is used in direct mode.
+        options (TableCopyOptions): Settings of the run.
+        query_or_table (str): Query or name of table (schema required)
+        target_table (str, None, optional): Target table name, only used when copying a single source.
+        table_location (str, None, optional): Local path of the delta table, overriding temp_table_location/<table>.
+
+    Returns:
+        TableCopyResult: The outcome of the copy.
+    """
+    job = _start_job(query_or_table, target_table, table_location)
+    for step in (_prepare_table, _extract_table, _write_table, _upload_table):
+        _run_step(service_client, options, job, step)
+    return _finish_job(job)
+
+def _start_job(
+    query_or_table: str,
+    target_table: str | None = None,
+    table_location: str | None = None
+) -> _TableCopyJob:
+    """
+    Returns the state of a copy of a single table or query, before any step has run.
+    """
+    table_name = query_or_table
+    if " from " in table_name.lower():
+        table_name = f"({table_name})"
+    return _TableCopyJob(
+        query_or_table,
+        TableCopyResult(query_or_table),
+        time.perf_counter(),
+        table_name,
+        target_table=target_table,
+        table_location=table_location,
+        source=query_or_table
+    )
+
+def _run_step(
+    service_client: DataLakeServiceClient,
+    options: TableCopyOptions,
+    job: _TableCopyJob,
+    step: Callable[[DataLakeServiceClient, TableCopyOptions, _TableCopyJob], None]
+) -> _TableCopyJob:
+    """
+    Runs a step of a copy, unless an earlier step failed or skipped the source, catching any failure into its result.
+    """
+    if job.done:
+        return job
+    try:
+        step(service_client, options, job)
+    except Exception as e:
+        job.result.error = e
+        job.done = True
+        if options.journal and job.source_key:
+            options.journal.update(job.source_key, error=f"{type(e).__name__}: {e}")
+        if logger: logger.exception(f"Failed to copy {options.sql_server}.{options.database_name}.{job.table_name}")
+        print(f"Failed:\t{options.sql_server}.{options.database_name}.{job.table_name}: {e}")
+    return job
+
+def _finish_job(job: _TableCopyJob) -> TableCopyResult:
+    """
+    Returns the result of a copy once its last step has run, emitting its metrics.
+    """
+    result = job.result
+    result.seconds = time.perf_counter() - job.started
+    emit(StageMetrics(
+        result.source,
+        result.target_table,
+        "table",
+        seconds=result.seconds,
+        rows=result.rows,
+        error=f"{type(result.error).__name__}: {result.error}" if result.error else None
+    ))
+    return result
+
+def _skip_table(job: _TableCopyJob, message: str):
+    print(message)
+    job.result.succeeded = job.result.skipped = True
+    job.done = True
+
+def _prepare_table(service_client: DataLakeServiceClient, options: TableCopyOptions, job: _TableCopyJob):
+    """
+    Resolves the target of a source, skips it when unchanged, prepares the local delta table and decides what to extract.
+    """
+    query_or_table, table_name = job.query_or_table, job.table_name
+    sql_server, database_name = options.sql_server, options.database_name
+    workspace_name, lakehouse_name = options.workspace_name, options.lakehouse_name
+    target_name = target_table_name(query_or_table, job.target_table)
+    if options.sink == "direct":
+        job.target_tablename = target_name
+        if options.sink_uri:
+            job.table_uri = f"{options.sink_uri.rstrip('/')}/{job.target_tablename}"
+            job.storage_options = options.storage_options or {}
+        else:
+            job.table_uri = get_lakehouse_table_uri(workspace_name, lakehouse_name, job.target_tablename, options.storage_account)
+            job.storage_options = {
+                **onelake_function(options, get_deltalake_storage_options)(service_client),
+                **(options.storage_options or {})
+            }
+    else:
+        if job.table_location:
+            job.table_uri = job.table_location
+        else:
+            job.table_uri = f"{path.join(options.temp_table_location, target_name)}".replace('\\', '/')
+        job.target_tablename = os.path.basename(job.table_uri)
+    job.result.target_table = job.target_tablename
+    table_uri, target_tablename = job.table_uri, job.target_tablename
+
+    job.columns = table_columns(options, query_or_table)
+    job.where = table_option(options.where, query_or_table)
+    job.params = list(table_option(options.where_params, query_or_table) or []) or None
+    if job.params and not job.where:
+        raise Exception(f"where_params of {query_or_table} are given without a where filter to use them.")
+    job.source_key = fingerprint_key(
+        sql_server, database_name, query_or_table, workspace_name, lakehouse_name, target_tablename,
+        columns=job.columns, where=job.where, where_params=job.params
+    )
+
+    if options.journal:
+        entry = options.journal.get(job.source_key)
+        if entry.get("stage") == STAGE_COMMITTED:
+            job.result.rows = entry.get("rows", 0)
+            job.result.resumed = True
+            _skip_table(job, f"Committed:\t{sql_server}.{database_name}.{table_name} was copied earlier in run {options.journal.run_id}")
+            return
+        if entry.get("stage") == STAGE_STAGED and options.sink == "staged" and get_table_version(table_uri) == entry.get("version"):
+            # the new version is still in the local delta table, and copy_deltatable only uploads the files missing from the Lakehouse
+            if logger: logger.info(f"Resuming the upload of version {entry['version']} of {table_uri}")
+            job.staged = job.result.resumed = True
+            job.result.rows = entry.get("rows", 0)
+            job.source_fingerprint = entry.get("fingerprint")
+            return
+
+    if options.fingerprint and options.fingerprint_manifest:
+        with measure_stage(query_or_table, target_tablename, "fingerprint"):
+            job.source_fingerprint = get_table_fingerprint(
+                sql_server,
+                database_name,
+                query_or_table,
+                options.fingerprint,
+                table_option(options.watermark_column, query_or_table)
+            )
+        if not options.force and options.fingerprint_manifest.get(job.source_key) == job.source_fingerprint:
+            _skip_table(job, f"Unchanged:\t{sql_server}.{database_name}.{table_name} fingerprint matches the last copy")
+            return
+
+    load_mode = table_option(options.load_mode, query_or_table) or "full"
+    if options.sink == "staged":
+        # continue the history of the Lakehouse table, so only new files are uploaded and the new version is published in one step
+        with measure_stage(query_or_table, target_tablename, "prepare") as prepare_metrics:
+            prepared = onelake_function(options, prepare_local_deltatable)(
+                service_client,
+                table_uri,
+                lakehouse_name,
+                workspace_name,
+                download_data=load_mode == "merge",
+                concurrency=options.upload_concurrency,
+                controller=options.transfer_controller
+            )
+            prepare_metrics.files = len(prepared.downloaded_files)
+            prepare_metrics.bytes_read = prepared.downloaded_bytes
+            prepare_metrics.retries = prepared.retries
+            prepare_metrics.throttled_seconds = prepared.throttled_seconds
+
+    job.mode = options.deltalake_mode
+    if load_mode in ("incremental", "merge"):
+        previous_watermark = read_watermark(table_uri, job.storage_options)
+        if options.change_detection == "change_tracking":
+            if load_mode != "merge":
+                raise Exception("change_detection 'change_tracking' is only supported with load_mode 'merge'.")
+            watermark, min_valid_version = get_change_tracking_versions(sql_server, database_name, query_or_table)
+            if min_valid_version is None:
+                raise Exception(f"Change tracking is not enabled on {table_name}.")
+            if previous_watermark is not None and previous_watermark < min_valid_version:
+                if logger: logger.warning(f"Change tracking version {previous_watermark} of {table_name} is no longer available, reloading the table.")
+                previous_watermark = None
         else:
-            _temp_table_location = f"{path.join(temp_table_location, query_or_table)}".replace('\\', '/')
-        if path.exists(_temp_table_location): shutil.rmtree(_temp_table_location)
+            watermark_column = table_option(options.watermark_column, query_or_table)
+            if not watermark_column:
+                raise Exception(f"{load_mode.capitalize()} load of {table_name} requires a watermark_column.")
+            watermark = get_max_value(sql_server, database_name, query_or_table, watermark_column)
+        if watermark is None or (previous_watermark is not None and watermark <= previous_watermark):
+            _skip_table(job, f"Unchanged:\t{sql_server}.{database_name}.{table_name} has no rows past watermark {previous_watermark!r}")
+            return
+        if previous_watermark is None:
+            job.mode = "overwrite"
+            if options.change_detection != "change_tracking":
+                job.where = combine_filters(job.where, f"{quote_identifier(watermark_column)} <= ?") # type: ignore
+                job.params = [*(job.params or []), watermark]
+        elif options.change_detection == "change_tracking":
+            job.mode = "merge"
+            job.primary_key = resolve_primary_key(options, query_or_table, job.columns)
+            job.operation_column = CHANGE_OPERATION_COLUMN
+            job.source = change_tracking_query(
+                query_or_table,
+                job.primary_key,
+                job.columns or get_columns(sql_server, database_name, query_or_table),
+                job.operation_column
+            )
+            # the parameters of the change tracking query come before those of the filter wrapped around it
+            job.params = [previous_watermark, watermark, *(job.params or [])]
+            # the change tracking query selects the columns, and deleted rows only have their primary key to filter on
+            job.columns = None
+            if job.where:
+                job.where = f"{quote_identifier(job.operation_column)} = 'D' OR ({job.where})"
+        else:
+            column = quote_identifier(watermark_column) # type: ignore
+            job.where = combine_filters(job.where, f"{column} > ? AND {column} <= ?")
+            job.params = [*(job.params or []), previous_watermark, watermark]
+            job.mode = "merge" if load_mode == "merge" else "append"
+            if job.mode == "merge":
+                job.primary_key = resolve_primary_key(options, query_or_table, job.columns)
+        if logger: logger.info(f"{load_mode.capitalize()} load of {table_name} from {previous_watermark!r} to {watermark!r}")
+        job.commit_properties = watermark_commit_properties(watermark)
+
+def _extract_table(service_client: DataLakeServiceClient, options: TableCopyOptions, job: _TableCopyJob):
+    """
+    Extracts a source, as an Arrow table or a streaming reader read by _write_table.
+    """
+    if job.staged:
+        return
+    job.extract_metrics = StageMetrics(job.query_or_table, job.target_tablename, "extract")
+    checkpointed = bool(options.journal and options.checkpoint_ranges and options.partitions and options.partitions > 1 and options.extract_engine == "odbc")
+    try:
+        with time_stage(job.extract_metrics):
+            if checkpointed:
+                data = _extract_ranges(options, job)
+            else:
+                data = extract_source(options, job.query_or_table, job.source, job.where, job.params, job.columns)
+        job.data = measure_data(data, job.extract_metrics)
+    except Exception:
+        emit(job.extract_metrics)
+        raise
+
+def _extract_ranges(options: TableCopyOptions, job: _TableCopyJob) -> pa.RecordBatchReader:
+    """
+    Extracts a source as ranges read at once (see db_tools.get_partition_ranges), saving each to a parquet file recorded in the journal
+    as soon as it is read, and streams the saved files back to _write_table. A resumed run extracting the same rows reads only the ranges
+    without a file, so an interrupted extract of a large table continues from its last finished range.
+    """
+    import pyarrow.parquet as pq
+    journal : RunJournal = options.journal # type: ignore
+    query_or_table = job.query_or_table
+    schema = get_source_schema(options.sql_server, options.database_name, job.source, options.type_map, job.columns)
+    order_by = table_sort_by(options, query_or_table)
+    plan = {
+        "source": job.source,
+        "where": job.where,
+        "params": [encode_watermark(value) for value in job.params or []],
+        "columns": job.columns,
+        "sort_by": order_by
+    }
+    directory = job.checkpoint_directory = journal.checkpoint_directory(job.target_tablename)
+
+    def range_path(index: int) -> str:
+        return path.join(directory, f"range_{index}.parquet")
+
+    entry = journal.get(job.source_key)
+    if entry.get("plan") == plan and entry.get("ranges"):
+        ranges = [(range_where, [decode_watermark(value) for value in range_params]) for range_where, range_params in entry["ranges"]]
+        finished = {index for index in entry.get("finished_ranges", []) if path.exists(range_path(index))}
+        if logger: logger.info(f"Resuming the extract of {job.table_name}: {len(finished)} of {len(ranges)} ranges already read")
+    else:
+        # ranges saved by an earlier attempt with other rows, e.g. up to another watermark, cannot be combined with new ones
+        ranges = get_partition_ranges(
+            options.sql_server,
+            options.database_name,
+            job.source,
+            options.partitions, # type: ignore
+            table_option(options.partition_column, query_or_table),
+            job.where,
+            job.params
+        )
+        finished = set()
+        shutil.rmtree(directory, ignore_errors=True)
+        journal.update(
+            job.source_key,
+            plan=plan,
+            ranges=[[range_where, [encode_watermark(value) for value in range_params]] for range_where, range_params in ranges],
+            finished_ranges=[]
+        )
+    os.makedirs(directory, exist_ok=True)
+
+    def extract_range(index: int):
+        range_where, range_params = ranges[index]
+        if job.where and range_where:
+            range_where = f"({job.where}) AND ({range_where})"
+        reader = table_to_record_batch_reader(
+            options.sql_server,
+            options.database_name,
+            job.source,
+            options.batch_rows,
+            options.max_memory_mb,
+            where=range_where or job.where,
+            params=[*(job.params or []), *range_params],
+            schema=schema,
+            order_by=order_by,
+            columns=job.columns,
+            fetch_backend=options.fetch_backend
+        )
+        temp_path = f"{range_path(index)}.tmp"
+        try:
+            with pq.ParquetWriter(temp_path, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        finally:
+            reader.close()
+        # a range is only recorded once its file is complete
+        os.replace(temp_path, range_path(index))
+        journal.append(job.source_key, "finished_ranges", index)
 
-        write_deltalake(_temp_table_location, df, mode=deltalake_mode)
-        target_tablename = os.path.basename(_temp_table_location)
-        if " from " in table_name.lower():
-            table_name = f"({table_name})"
-        print(f"Starting:\t{sql_server}.{database_name}.{table_name} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
-        copy_deltatable(service_client, _temp_table_location, lakehouse_name, workspace_name)
-        print(f"Finished:\t{sql_server}.{database_name}.{table_name} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
+    pending = [index for index in range(len(ranges)) if index not in finished]
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="sql_fabric_copy_range") as executor:
+            list(executor.map(extract_range, pending))
+    files = [pq.ParquetFile(range_path(index)) for index in range(len(ranges))]
+    if schema is None:
+        # a range with no rows or only NULLs infers null types, so take the widest type of each column
+        schema = pa.unify_schemas([parquet_file.schema_arrow for parquet_file in files], promote_options="permissive")
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        for parquet_file in files:
+            for batch in parquet_file.iter_batches(batch_size=options.batch_rows or DEFAULT_BATCH_ROWS):
+                yield batch if batch.schema.equals(schema) else batch.cast(schema)
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+def _write_table(service_client: DataLakeServiceClient, options: TableCopyOptions, job: _TableCopyJob):
+    """
+    Writes the extracted rows of a source to its delta table, locally or straight to the Lakehouse.
+    """
+    if job.staged:
+        return
+    sql_server, database_name = options.sql_server, options.database_name
+    workspace_name, lakehouse_name = options.workspace_name, options.lakehouse_name
+    table_uri, target_tablename, storage_options = job.table_uri, job.target_tablename, job.storage_options
+    extract_metrics : StageMetrics = job.extract_metrics # type: ignore
+    layout = table_option(options.parquet_layout, job.query_or_table) or ParquetLayout()
+    writer_properties = layout.writer_properties()
+    data, job.data = job.data, None
+    try:
+        count_written = has_hooks() or bool(options.pipeline_disk_mb)
+        existing_files = get_data_files(table_uri, storage_options) if count_written else {}
+        # a streaming extract is read by the write, and its time counted as extract
+        with measure_stage(job.query_or_table, target_tablename, "write", nested=extract_metrics) as write_metrics:
+            if options.sink == "direct":
+                print(f"Starting:\t{sql_server}.{database_name}.{job.table_name} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
+            if job.mode == "merge":
+                merge_into_table(table_uri, data, job.primary_key, storage_options, job.commit_properties, job.operation_column, writer_properties)
+            else:
+                write_deltalake(
+                    table_uri,
+                    data,
+                    mode=job.mode,
+                    # a full reload replaces the schema along with the rows
+                    schema_mode="overwrite" if job.mode == "overwrite" else None,
+                    storage_options=storage_options,
+                    target_file_size=layout.target_file_size(),
+                    writer_properties=writer_properties,
+                    commit_properties=job.commit_properties
+                )
+            write_metrics.rows = extract_metrics.rows
+            if count_written:
+                written_files = {
+                    file_path: size for file_path, size in get_data_files(table_uri, storage_options).items()
+                    if file_path not in existing_files
+                }
+                write_metrics.files = len(written_files)
+                write_metrics.bytes_written = job.written_bytes = sum(written_files.values())
+    finally:
+        emit(extract_metrics)
+    job.result.rows = extract_metrics.rows
+    if options.journal:
+        # a direct write is the commit on the Lakehouse, while a staged one is published by _upload_table
+        staged = options.sink == "staged"
+        options.journal.update(
+            job.source_key,
+            stage=STAGE_STAGED if staged else STAGE_COMMITTED,
+            version=get_table_version(table_uri) if staged else None,
+            rows=job.result.rows,
+            fingerprint=job.source_fingerprint,
+            plan=None,
+            ranges=None,
+            finished_ranges=None,
+            error=None
+        )
+        if job.checkpoint_directory:
+            shutil.rmtree(job.checkpoint_directory, ignore_errors=True)
+
+def _upload_table(service_client: DataLakeServiceClient, options: TableCopyOptions, job: _TableCopyJob):
+    """
+    Uploads a staged delta table to the Lakehouse and records the fingerprint of its source.
+    """
+    sql_server, database_name = options.sql_server, options.database_name
+    workspace_name, lakehouse_name = options.workspace_name, options.lakehouse_name
+    target_tablename = job.target_tablename
+    if options.sink == "staged":
+        print(f"Starting:\t{sql_server}.{database_name}.{job.table_name} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
+        with measure_stage(job.query_or_table, target_tablename, "upload") as upload_metrics:
+            synced = onelake_function(options, copy_deltatable)(
+                service_client,
+                job.table_uri,
+                lakehouse_name,
+                workspace_name,
+                upload_concurrency=options.upload_concurrency,
+                chunk_size=options.chunk_size,
+                max_concurrency=options.max_concurrency,
+                replace_table=False,
+                retention_hours=options.retention_hours,
+                controller=options.transfer_controller
+            )
+            upload_metrics.files = len(synced.uploaded_files)
+            upload_metrics.bytes_written = synced.uploaded_bytes
+            upload_metrics.retries = synced.retries
+            upload_metrics.throttled_seconds = synced.throttled_seconds
+    print(f"Finished:\t{sql_server}.{database_name}.{job.table_name} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
+    if job.source_fingerprint and options.fingerprint_manifest:
+        options.fingerprint_manifest.set(job.source_key, job.source_fingerprint)
+    if options.journal:
+        options.journal.update(job.source_key, stage=STAGE_COMMITTED, error=None)
+    job.result.succeeded = True
+
+def extract_source(
+    options: TableCopyOptions,
+    query_or_table: str,
+    source: str,
+    where: str | None = None,
+    params: List[Any] | None = None,
+    columns: List[str] | None = None
+) -> pa.Table | pa.RecordBatchReader:
+    """
+    Starts extracting a source as an Arrow table, or as a streaming RecordBatchReader when batch_rows, max_memory_mb or partitions is set or the extract engine is bcp.
+
+    Parameters:
+        options (TableCopyOptions): Settings of the run.
+        query_or_table (str): Query or name of table the options are resolved for.
+        source (str): Query or name of table to extract, e.g. a change tracking query of query_or_table.
+        where (str, None, optional): Filter applied to the source, using ? placeholders for params.
+        params (List[Any], None, optional): Values of the placeholders.
+        columns (List[str], None, optional): Columns to extract. Defaults to every column.
+
+    Returns:
+        pa.Table, pa.RecordBatchReader: The extracted rows.
+
+    Throws:
+        Exception: If the bcp engine is combined with partitions.
+    """
+    schema = get_source_schema(options.sql_server, options.database_name, source, options.type_map, columns)
+    order_by = table_sort_by(options, query_or_table)
+    if options.extract_engine == "bcp":
+        if options.partitions and options.partitions > 1:
+            raise Exception("partitions cannot be combined with extract_engine bcp, which exports each source with a single bcp process.")
+        return table_to_bcp_record_batch_reader(
+            options.sql_server,
+            options.database_name,
+            source,
+            batch_rows=options.batch_rows,
+            max_memory_mb=options.max_memory_mb,
+            where=where,
+            params=params,
+            bcp_path=options.bcp_path,
+            authentication=options.bcp_authentication,
+            schema=schema,
+            order_by=order_by,
+            columns=columns
+        )
+    if options.partitions and options.partitions > 1:
+        return table_to_partitioned_record_batch_reader(
+            options.sql_server,
+            options.database_name,
+            source,
+            options.partitions,
+            partition_column=table_option(options.partition_column, query_or_table),
+            batch_rows=options.batch_rows,
+            max_memory_mb=options.max_memory_mb,
+            where=where,
+            params=params,
+            schema=schema,
+            order_by=order_by,
+            columns=columns,
+            fetch_backend=options.fetch_backend
+        )
+    if options.batch_rows or options.max_memory_mb:
+        return table_to_record_batch_reader(
+            options.sql_server,
+            options.database_name,
+            source,
+            batch_rows=options.batch_rows,
+            max_memory_mb=options.max_memory_mb,
+            where=where,
+            params=params,
+            schema=schema,
+            order_by=order_by,
+            columns=columns,
+            fetch_backend=options.fetch_backend
+        )
+    return table_to_arrow(
+        options.sql_server,
+        options.database_name,
+        source,
+        where=where,
+        params=params,
+        schema=schema,
+        order_by=order_by,
+        columns=columns,
+        fetch_backend=options.fetch_backend
+    )
+
+def _extracts_in_memory(options: TableCopyOptions) -> bool:
+    """
+    Returns whether extract_source reads a whole source into memory, rather than streaming it as a RecordBatchReader.
+    """
+    streaming = options.batch_rows or options.max_memory_mb or (options.partitions and options.partitions > 1) or options.extract_engine == "bcp"
+    return not streaming
+
+def resolve_primary_key(options: TableCopyOptions, query_or_table: str, columns: List[str] | None = None) -> List[str]:
+    """
+    Returns the primary key columns to merge a source on, reading them from SQL Server metadata when not given.
+
+    Parameters:
+        options (TableCopyOptions): Settings of the run.
+        query_or_table (str): Query or name of table (schema required)
+        columns (List[str], None, optional): Columns copied from the source, which must include the primary key. Defaults to every column.
+
+    Returns:
+        List[str]: The primary key columns.
+
+    Throws:
+        Exception: If no primary key is given or found, or it is not among columns.
+    """
+    primary_key = table_option(options.primary_key, query_or_table)
+    if isinstance(primary_key, str):
+        primary_key = [column.strip() for column in primary_key.split(",")]
+    if not primary_key and " from " not in query_or_table.lower():
+        primary_key = get_primary_key(options.sql_server, options.database_name, query_or_table)
+    if not primary_key:
+        raise Exception(f"Merge load of {query_or_table} requires a primary_key, as none was found in SQL Server metadata.")
+    if columns:
+        selected = {column.lower() for column in columns}
+        missing = [column for column in primary_key if column.lower() not in selected]
+        if missing:
+            raise Exception(f"Merge load of {query_or_table} requires the primary key columns {', '.join(missing)} among its columns.")
+    return primary_key
+
+def table_columns(options: TableCopyOptions, query_or_table: str) -> List[str] | None:
+    """
+    Returns the columns to copy from a source, or None to copy every column.
+
+    Parameters:
+        options (TableCopyOptions): Settings of the run.
+        query_or_table (str): Query or name of table (schema required)
+
+    Returns:
+        List[str], None: The columns, in order.
+    """
+    columns = table_option(options.columns, query_or_table)
+    if isinstance(columns, str):
+        columns = [column.strip() for column in columns.split(",")]
+    return list(columns) if columns else None
+
+def table_sort_by(options: TableCopyOptions, query_or_table: str) -> List[str] | None:
+    """
+    Returns the columns SQL Server sorts the rows of a source by, or None to leave them unsorted.
+
+    Parameters:
+        options (TableCopyOptions): Settings of the run.
+        query_or_table (str): Query or name of table (schema required)
+
+    Returns:
+        List[str], None: The columns, in order.
+    """
+    order_by = table_option(options.sort_by, query_or_table)
+    if isinstance(order_by, str):
+        order_by = [column.strip() for column in order_by.split(",")]
+    return list(order_by) if order_by else None
+
+def combine_filters(where: str | None, condition: str) -> str:
+    """
+    Returns a filter matching the rows of both where, if given, and condition.
+
+    Parameters:
+        where (str, None): The filter of the source.
+        condition (str): The condition to add.
+
+    Returns:
+        str: The combined filter.
+    """
+    return f"({where}) AND {condition}" if where else condition
+
+def schedule_sources(sql_server: str, database_name: str, sources: List[str]) -> List[str]:
+    """
+    Orders sources largest first by their estimated size (see db_tools.get_table_sizes), so that workers taking the next source as they
+    become free spread the large tables between them and finish with the small ones, rather than a large table started last setting the run time.
+
+    Parameters:
+        sql_server (str): Address of SQL Server.
+        database_name (str): Name of database.
+        sources (List[str]): Queries or names of tables (schema required)
+
+    Returns:
+        List[str]: The sources, largest first. Queries and tables of unknown size follow in their order.
+    """
+    sizes = get_table_sizes(sql_server, database_name, sources)
+    order = sorted(sources, key=lambda query_or_table: -sizes.get(query_or_table, -1))
+    if logger and sizes: logger.info(f"Copying {len(sources)} sources largest first, {sum(sizes.values()) / 1024 / 1024:.0f} MB in {len(sizes)} tables of known size.")
+    return order
+
+def target_table_name(query_or_table: str, target_table: str | None = None) -> str:
+    """
+    Returns the Lakehouse table name for a source: target_table if given, otherwise the table name with "." replaced by "_" and any "dbo_" prefix removed.
+
+    Parameters:
+        query_or_table (str): Query or name of table (schema required)
+        target_table (str, None, optional): Target table name.
+
+    Returns:
+        str: The Lakehouse table name.
+    """
+    if target_table:
+        query_or_table = target_table
+    if query_or_table and "." in query_or_table:
+        query_or_table = query_or_table.replace(".", "_")
+    if query_or_table and query_or_table.startswith("dbo_"):
+        query_or_table = query_or_table[4:]
+    return query_or_table
+
+def table_option(value: T | Dict[str, T] | None, query_or_table: str) -> T | None:
+    """
+    Resolves an option that is either shared by every source or given per source as a dictionary.
+
+    Parameters:
+        value (Any, Dict[str, Any], None): The option value, or a dictionary of source to value.
+        query_or_table (str): The source to resolve the option for.
+
+    Returns:
+        Any, None: The value for the source.
+    """
+    if isinstance(value, dict):
+        return value.get(query_or_table) # type: ignore
+    return value
+
+def print_summary(results: List[TableCopyResult]):
+    """
+    Prints which tables succeeded and which failed.
+
+    Parameters:
+        results (List[TableCopyResult]): Results of the copies.
+    """
+    succeeded = [result for result in results if result.succeeded]
+    skipped = [result for result in succeeded if result.skipped and not result.resumed]
+    committed = [result for result in succeeded if result.skipped and result.resumed]
+    failed = [result for result in results if not result.succeeded]
+    resumed = f", {len(committed)} committed earlier in the run" if committed else ""
+    print(f"Summary:\t{len(succeeded)} succeeded ({len(skipped)} unchanged{resumed}), {len(failed)} failed")
+    for result in succeeded:
+        status = "Committed" if result.resumed and result.skipped else "Unchanged" if result.skipped else "Succeeded"
+        print(f"{status}:\t{result.source} => {result.target_table} ({result.seconds:.1f}s)")
+    for result in failed:
+        print(f"Failed:\t{result.source}: {result.error}")
 
 def upload_csv_lakehouse(
     sql_server: str,
@@ -130,10 +1295,22 @@ def upload_csv_lakehouse(
     target_path: str | None = "",
     target_file: str | None = None,
     service_client : DataLakeServiceClient | None = None,
-    temp_csv_location: str | None = "output"
+    token_cache: TokenCache | None = None,
+    temp_csv_location: str | None = "output",
+    batch_rows: int | None = None,
+    max_memory_mb: int | None = None,
+    compression: CsvCompression | None = None,
+    part_size_mb: float | None = None,
+    delimiter: str = ",",
+    upload_concurrency: int | None = None,
+    fetch_backend: FetchBackend = "cursor"
 ):
     """
-    Uploads a delta table from SQL Server to a directory in Azure Data Lake Storage.
+    Uploads tables or queries from SQL Server as CSV files to the Files folder of a Lakehouse.
+
+    Rows are streamed from SQL Server in batches and written by the Arrow CSV writer, so memory use is set by the batch size.
+    With part_size_mb the rows are split into numbered part files (<file>-00000.csv, ...), each uploaded while the next is written and removed locally once uploaded.
+    Parts of an earlier upload of the same file that were not written again are deleted.
 
     Parameters:
         sql_server (str): Address of SQL Server.
@@ -145,18 +1322,26 @@ def upload_csv_lakehouse(
         tenant_id (str, None, optional): Tenant ID if using Token Credentials
         client_id (str, None, optional): Client ID if using Token Credentials
         client_secret (str, None, optional): Client Secret if using Token Credentials
-        deltalake_mode (str, ('error', 'append', 'overwrite', 'ignore'), optional): ! this will probably be removed
-        target_table (str, None, optional): Target table name to write to on Fabric Lakehouse. Required when passing query, optional when passing a table, and disabled when passing multiple tables. 
+        target_path (str, None, optional): Directory below the Files folder the files are uploaded to. Defaults to the Files folder itself.
+        target_file (str, None, optional): File name to upload to, without extension. Required when passing query, optional when passing a table, and ignored when passing multiple tables.
         service_client (DataLakeServiceClient, None, optional): Could be passed in if user wanted to authenticate a different way, or use a shared connection
-        temp_table_location (str, None, optional): this is where the delta tables will be stored locally. Defaults to "output".
+        token_cache (TokenCache, None, optional): Keeps OneLake tokens, and the credential source that worked, across runs when service_client is not given, e.g. credential_tools.TokenCache(). Defaults to a cache in memory.
+        temp_csv_location (str, None, optional): Folder the files are written to before they are uploaded. A single source with its own location is written to that folder. Defaults to "output".
+        batch_rows (int, None, optional): Maximum number of rows fetched per batch. Defaults to db_tools.DEFAULT_BATCH_ROWS.
+        max_memory_mb (int, None, optional): Limits the approximate in-memory size of each batch.
+        compression (str, ('gzip', 'zstd'), None, optional): Compresses each file, adding .gz or .zst to its name. Defaults to None.
+        part_size_mb (float, None, optional): Starts a new part file once the current one reaches this size on disk. Defaults to a single file per source.
+        delimiter (str, optional): Field delimiter. Defaults to ",".
+        upload_concurrency (int, None, optional): Number of part files uploaded at once. Defaults to onelake_tools.DEFAULT_UPLOAD_CONCURRENCY.
+        fetch_backend (str, ('cursor', 'arrow_odbc'), optional): How rows are fetched, see upload_table_lakehouse. Defaults to "cursor".
     """
 
-    if isinstance(source,str) and " from " in source.lower() and not target_table: 
+    if isinstance(source,str) and " from " in source.lower() and not target_file:
         if logger:
-            logger.error("If source provided is a query, you MUST pass a target_table.")
+            logger.error("If source provided is a query, you MUST pass a target_file.")
         else:
-            error("If source provided is a query, you MUST pass a target_table.")
-        raise Exception("No target_table provided with query.")
+            error("If source provided is a query, you MUST pass a target_file.")
+        raise Exception("No target_file provided with query.")
     if not isinstance(source, list):
         if "," in source and " from " not in source.lower():
             source = source.split(",")
@@ -168,62 +1353,177 @@ def upload_csv_lakehouse(
     if temp_csv_location is None:
         temp_csv_location = "output"
     if target_file and len(source) > 1 :
-        if logger: logger.warn("target_table provided for list of tables, which is not supported.")
-        else: warn("target_table for list of tables, which is not supported.")
+        if logger: logger.warn("target_file provided for list of tables, which is not supported.")
+        else: warn("target_file for list of tables, which is not supported.")
         if not sys.stdin.isatty():
-            sys.exit(1)
-        user_input = input("Ignore parameter target_table? (y to continue): ")
+            raise Exception("target_file cannot be given for a list of tables.")
+        user_input = input("Ignore parameter target_file? (y to continue): ")
         if user_input.lower() != 'y':
             if logger: logger.warn("Exiting.")
             else: warn("Exiting.")
             sys.exit()
-        target_table = None
+        target_file = None
     if service_client is None:
         service_client = get_service_client_token_credential(
             storage_account,
             service_prinicipal_tenant_id=tenant_id,
             service_prinicipal_client_id=client_id,
-            service_prinicipal_client_secret=client_secret
+            service_prinicipal_client_secret=client_secret,
+            token_cache=token_cache
         )
+    target_directory = (target_path or "").strip("/")
+    options = TableCopyOptions(
+        sql_server,
+        database_name,
+        workspace_name,
+        lakehouse_name,
+        storage_account=storage_account,
+        batch_rows=batch_rows or DEFAULT_BATCH_ROWS,
+        max_memory_mb=max_memory_mb,
+        fetch_backend=fetch_backend
+    )
+    sources = [query_or_table.lstrip().rstrip() for query_or_table in source]
+    max_pending = 2 * (upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY)
 
-    for query_or_table in source:
-        query_or_table = query_or_table.lstrip().rstrip()
+    for query_or_table in sources:
+        file_name = CSV_FILE_EXTENSION.sub("", target_file or target_table_name(query_or_table))
+        if len(sources) == 1 and temp_csv_location != "output":
+            local_directory = CSV_FILE_EXTENSION.sub("", temp_csv_location)
+        else:
+            local_directory = path.join(temp_csv_location, file_name)
+        if path.exists(local_directory): shutil.rmtree(local_directory)
+        create_local_directory_if_not_exists(local_directory)
+        remote_directory = f"/{workspace_name}/{lakehouse_name}/Files/{target_directory}".rstrip("/")
+        print(f"Starting:\t{sql_server}.{database_name}.{query_or_table} => {remote_directory}/{file_name}")
 
-        df = table_to_dataframe( 
-            sql_server,
-            database_name,
-            query_or_table
-        )
+        upload_metrics = StageMetrics(query_or_table, file_name, "upload")
+        uploaded : List[str] = []
+        uploaded_lock = threading.Lock()
 
-        if temp_csv_location and len(source) == 1:
-            query_or_table = target_file
-        if query_or_table and "." in query_or_table:
-            query_or_table = query_or_table.replace(".", "_")
-        if query_or_table and query_or_table.startswith("dbo_"):
-            query_or_table = query_or_table[4:]
-        if len(source) == 1 and temp_csv_location != "output":
-            _temp_csv_location = temp_csv_location
-        else:
-            _temp_csv_location = f"{path.join(temp_csv_location, query_or_table)}".replace('\\', '/')
-        if path.exists(_temp_csv_location): shutil.rmtree(_temp_csv_location)
-
-        write_csvfile(_temp_csv_location, df)
-        target_file = target_file if target_file else query_or_table
-        target_tablename = os.path.basename(_temp_csv_location)
-        target_path = f"{target_path}/{target_file}"
-        print(f"Starting:\t{sql_server}.{database_name}.{query_or_table} => /{workspace_name}/{lakehouse_name}/Files/{target_tablename}")
-        upload_file(
-            service_client,
-            _temp_csv_location,
-            lakehouse_name,
-            workspace_name,
-            target_path
-        )
-        print(f"Finished:\t{sql_server}.{database_name}.{query_or_table} => /{workspace_name}/{lakehouse_name}/Tables/{target_tablename}")
-def write_csvfile(csv_location : str, df : pd.DataFrame):
-    if not csv_location.endswith(".csv"):
-        csv_location = f"{csv_location}.csv"
-    df.to_csv(csv_location, index=False)
+        def upload_part(local_path: str):
+            name = path.basename(local_path)
+            size = path.getsize(local_path)
+            upload_file(service_client, local_path, lakehouse_name, workspace_name, f"{target_directory}/{name}") # type: ignore
+            os.remove(local_path)
+            with uploaded_lock:
+                uploaded.append(name)
+                upload_metrics.files += 1
+                upload_metrics.bytes_written += size
+
+        try:
+            with ThreadPoolExecutor(max_workers=upload_concurrency or DEFAULT_UPLOAD_CONCURRENCY, thread_name_prefix="csv_upload") as executor:
+                futures : List[Future[None]] = []
+
+                def on_part(local_path: str, rows: int):
+                    if logger: logger.debug(f"Uploading {local_path} ({rows} rows)")
+                    futures.append(executor.submit(upload_part, local_path))
+                    # bound the parts waiting on disk when uploads are slower than extraction
+                    while sum(not future.done() for future in futures) >= max_pending:
+                        wait(futures, return_when=FIRST_COMPLETED)
+
+                extract_metrics = StageMetrics(query_or_table, file_name, "extract")
+                try:
+                    with time_stage(extract_metrics):
+                        data = extract_source(options, query_or_table, query_or_table)
+                    data = measure_data(data, extract_metrics)
+                    with measure_stage(query_or_table, file_name, "write", nested=extract_metrics) as write_metrics:
+                        parts = write_csv_parts(data, local_directory, file_name, compression, part_size_mb, delimiter, on_part)
+                        write_metrics.rows = extract_metrics.rows
+                        write_metrics.files = len(parts)
+                finally:
+                    emit(extract_metrics)
+                # uploads overlap the write, so only the wait for the last ones is counted
+                with time_stage(upload_metrics):
+                    for future in futures:
+                        future.result()
+            with time_stage(upload_metrics):
+                stale_parts = [
+                    name for name in list_remote_files(service_client, workspace_name, lakehouse_name, target_directory, type="Files")
+                    if name not in uploaded and re.fullmatch(rf"{re.escape(file_name)}-\d{{5}}\.csv(\.gz|\.zst)?", name)
+                ]
+                if stale_parts:
+                    file_system_client = service_client.get_file_system_client(workspace_name) # type: ignore
+                    for name in stale_parts:
+                        if logger: logger.debug(f"Deleting stale part {name}")
+                        file_system_client.delete_file( # type: ignore
+                            normalize_lakehouse_path(lakehouse_name, f"{target_directory}/{name}", type="Files")
+                        )
+        finally:
+            emit(upload_metrics)
+        shutil.rmtree(local_directory, ignore_errors=True)
+        print(f"Finished:\t{sql_server}.{database_name}.{query_or_table} => {remote_directory}/{file_name} ({len(uploaded)} files)")
+
+def write_csv_parts(
+    data: "pa.RecordBatchReader | pa.Table | pd.DataFrame",
+    directory: str,
+    file_name: str,
+    compression: CsvCompression | None = None,
+    part_size_mb: float | None = None,
+    delimiter: str = ",",
+    on_part: Callable[[str, int], None] | None = None
+) -> List[str]:
+    """
+    Writes rows as CSV files with a header row, using the Arrow CSV writer.
+
+    Parameters:
+        data (pa.RecordBatchReader, pa.Table, pd.DataFrame): The rows.
+        directory (str): Folder the files are written to.
+        file_name (str): Name of the file without extension, e.g. "DimCurrency" for DimCurrency.csv.gz.
+        compression (str, ('gzip', 'zstd'), None, optional): Compresses each file, adding .gz or .zst to its name.
+        part_size_mb (float, None, optional): Starts a new part file, named <file_name>-00000.csv, <file_name>-00001.csv, ..., once the current one reaches this size on disk. Defaults to a single file.
+        delimiter (str, optional): Field delimiter. Defaults to ",".
+        on_part (Callable[[str, int], None], None, optional): Called with the path and row count of each file once it is complete, e.g. to upload it while the next is written.
+
+    Returns:
+        List[str]: Paths of the files written, in order. A source without rows writes a single file holding the header.
+    """
+    import pyarrow.csv as pa_csv
+    if is_dataframe(data):
+        data = pa.Table.from_pandas(data, preserve_index=False) # type: ignore
+    if isinstance(data, pa.Table):
+        data = pa.RecordBatchReader.from_batches(data.schema, data.to_batches())
+    extension = ".csv" + {None: "", "gzip": ".gz", "zstd": ".zst"}[compression]
+    part_bytes = int(part_size_mb * 1024 * 1024) if part_size_mb else None
+    write_options = pa_csv.WriteOptions(delimiter=delimiter)
+    parts : List[str] = []
+    part : Tuple[pa.NativeFile, pa.NativeFile, pa_csv.CSVWriter] | None = None
+    part_rows = 0
+    # compressed bytes per uncompressed byte, measured when the compressor is flushed, starting from the most a part can hold
+    compression_ratio = 1.0
+
+    def open_part() -> Tuple[pa.NativeFile, pa.NativeFile, pa_csv.CSVWriter]:
+        name = f"{file_name}-{len(parts):05d}{extension}" if part_bytes else f"{file_name}{extension}"
+        parts.append(path.join(directory, name))
+        raw = pa.OSFile(parts[-1], "wb")
+        stream = pa.CompressedOutputStream(raw, compression) if compression else raw
+        return raw, stream, pa_csv.CSVWriter(stream, data.schema, write_options=write_options)
+
+    def close_part():
+        raw, stream, writer = part # type: ignore
+        writer.close()
+        stream.close()
+        if not raw.closed:
+            raw.close()
+        if on_part:
+            on_part(parts[-1], part_rows)
+
+    for batch in data:
+        if part is None:
+            part, part_rows = open_part(), 0
+        part[2].write_batch(batch)
+        part_rows += batch.num_rows
+        if part_bytes and compression and part[1].tell() * compression_ratio >= part_bytes:
+            # compressors buffer their output, so flush it to see the size on disk, only once the part may have reached part_bytes
+            part[1].flush()
+            compression_ratio = part[0].tell() / part[1].tell()
+        if part_bytes and part[0].tell() >= part_bytes:
+            close_part()
+            part = None
+    if not parts:
+        part = open_part()
+    if part is not None:
+        close_part()
+    return parts
 
 def create_local_directory_if_not_exists(directory: str):
     """
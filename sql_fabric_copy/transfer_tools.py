@@ -0,0 +1,239 @@
+""" Module with a controller of OneLake requests, retrying throttled and failed requests and adapting how many are in flight at once. """
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from logging import Logger
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+logger : Logger | None = None
+
+T = TypeVar("T")
+
+# responses OneLake sends when a workspace or capacity is over its request rate
+THROTTLING_STATUS_CODES = (429, 503)
+# responses worth retrying that do not say anything about the request rate
+TRANSIENT_STATUS_CODES = (408, 500, 502, 504)
+
+DEFAULT_MAX_RETRIES = 8
+DEFAULT_BACKOFF_SECONDS = 0.5
+DEFAULT_MAX_BACKOFF_SECONDS = 60.0
+
+# keyword argument disabling the retry policy of the storage SDK for a single request, so retries are left to the controller
+NO_SDK_RETRIES : Dict[str, Any] = {"retry_total": 0}
+
+@dataclass
+class TransferStats:
+    """Retries of the requests of one transfer, e.g. the upload of a table."""
+    retries: int = 0
+    throttled: int = 0
+    throttled_seconds: float = 0.0
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """
+    Returns how long a response asked the client to wait before retrying, from its x-ms-retry-after-ms or Retry-After header.
+
+    Parameters:
+        error (BaseException): The error raised for the response.
+
+    Returns:
+        float, None: The wait in seconds, or None if the response has no such header.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after_ms = headers.get("x-ms-retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        # an HTTP date rather than seconds
+        return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(error: BaseException) -> bool:
+    """
+    Returns whether an error is a throttling response of the service.
+    """
+    return isinstance(error, HttpResponseError) and getattr(error, "status_code", None) in THROTTLING_STATUS_CODES
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Returns whether a request that raised an error may succeed if sent again: throttling, server errors, timeouts and dropped connections.
+    """
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    return isinstance(error, HttpResponseError) and getattr(error, "status_code", None) in (*THROTTLING_STATUS_CODES, *TRANSIENT_STATUS_CODES)
+
+class TransferController:
+    """
+    Sends requests with at most concurrency of them in flight, retrying those that fail with a retryable error (see is_retryable).
+
+    Retries wait with exponential backoff and full jitter, or as long as a throttling response asks in its Retry-After header.
+    The number of requests in flight adapts, additive increase and multiplicative decrease: it is halved when the service
+    throttles, at most once per backoff, and raised by one after a round of concurrency requests answered without throttling
+    and no slower than usual, up to max_concurrency.
+
+    One controller is meant to be shared by every transfer of a run to the same service, from threads and event loops alike,
+    so the requests of all of them are held back together when the service throttles.
+    """
+    def __init__(
+        self,
+        concurrency: int,
+        max_concurrency: int | None = None,
+        min_concurrency: int = 1,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+        max_backoff_seconds: float = DEFAULT_MAX_BACKOFF_SECONDS,
+    ) -> None:
+        """
+        Parameters:
+            concurrency (int): Number of requests in flight at first.
+            max_concurrency (int, None, optional): Most requests in flight once raised. Defaults to concurrency, so it is only regained after throttling.
+            min_concurrency (int, optional): Fewest requests in flight once lowered. Defaults to 1.
+            max_retries (int, optional): Retries of a request before its error is raised. Defaults to DEFAULT_MAX_RETRIES.
+            backoff_seconds (float, optional): Wait before the first retry, doubled for each following one. Defaults to DEFAULT_BACKOFF_SECONDS.
+            max_backoff_seconds (float, optional): Longest wait between retries. Defaults to DEFAULT_MAX_BACKOFF_SECONDS.
+        """
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(max_concurrency or concurrency, self.min_concurrency)
+        self.concurrency = min(max(concurrency, self.min_concurrency), self.max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.stats = TransferStats()
+        self._in_flight = 0
+        self._completed = 0
+        self._latency : float | None = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def call(self, request: Callable[[], T], stats: TransferStats | None = None) -> T:
+        """
+        Sends a request once a slot is free, retrying it while it fails with a retryable error.
+
+        Parameters:
+            request (Callable[[], T]): Sends the request, e.g. a lambda calling the storage client with NO_SDK_RETRIES.
+            stats (TransferStats, None, optional): Also counts the retries of the request here, besides in the stats of the controller.
+
+        Returns:
+            T: The result of the request.
+
+        Throws:
+            Exception: The error of the request, if it cannot be retried or max_retries was reached.
+        """
+        attempt = 0
+        while True:
+            with self._condition:
+                while self._in_flight >= self.concurrency:
+                    self._condition.wait()
+                self._in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = request()
+            except Exception as error:
+                delay = self._failed(error, attempt, stats)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded(time.perf_counter() - started)
+                return result
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, request: Callable[[], Awaitable[T]], stats: TransferStats | None = None) -> T:
+        """
+        Awaits a request once a slot is free, retrying it while it fails with a retryable error. See call.
+
+        Parameters:
+            request (Callable[[], Awaitable[T]]): Starts the request, e.g. a lambda calling the asynchronous storage client with NO_SDK_RETRIES.
+            stats (TransferStats, None, optional): Also counts the retries of the request here.
+
+        Returns:
+            T: The result of the request.
+        """
+        attempt = 0
+        while True:
+            # slots are shared with threads, so the event loop polls rather than blocking on the condition
+            while not self._try_acquire():
+                await asyncio.sleep(0.01)
+            started = time.perf_counter()
+            try:
+                result = await request()
+            except Exception as error:
+                delay = self._failed(error, attempt, stats)
+                if delay is None:
+                    raise
+            else:
+                self._succeeded(time.perf_counter() - started)
+                return result
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _try_acquire(self) -> bool:
+        with self._condition:
+            if self._in_flight >= self.concurrency:
+                return False
+            self._in_flight += 1
+            return True
+
+    def _succeeded(self, seconds: float):
+        with self._condition:
+            fast = self._latency is None or seconds <= 2 * self._latency
+            self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+            self._completed = self._completed + 1 if fast else 0
+            if self._completed >= self.concurrency and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._completed = 0
+                self._condition.notify_all()
+                if logger: logger.debug(f"Raised OneLake request concurrency to {self.concurrency}")
+
+    def _failed(self, error: BaseException, attempt: int, stats: TransferStats | None) -> float | None:
+        """
+        Records a failed request, returning how long to wait before retrying it, or None to raise its error.
+        """
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return None
+        throttled = is_throttled(error)
+        retry_after = retry_after_seconds(error)
+        backoff = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+        delay = retry_after + random.uniform(0, self.backoff_seconds) if retry_after is not None else random.uniform(0, backoff)
+        with self._condition:
+            self._completed = 0
+            now = time.monotonic()
+            # requests in flight when the service started throttling all fail together, so they lower the concurrency once
+            if throttled and now - self._last_decrease >= max(delay, self.backoff_seconds):
+                self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+                self._last_decrease = now
+                if logger: logger.info(f"OneLake is throttling, lowered request concurrency to {self.concurrency}")
+            for counted in (self.stats, stats):
+                if counted is None:
+                    continue
+                counted.retries += 1
+                if throttled:
+                    counted.throttled += 1
+                    counted.throttled_seconds += delay
+        if logger: logger.debug(f"Retrying OneLake request in {delay:.2f}s after {type(error).__name__}: {error}")
+        return delay
@@ -0,0 +1,76 @@
+"""
+    Stand-in for the bcp utility used by the offline tests, exporting a query from the SQLite database given as a sqlite:/// URL in -S.
+
+    Only queryout in character mode (-c) with hexadecimal terminators (-t, -r) is supported. Values are written as bcp does:
+    NULL as an empty field, an empty string as a NUL character and binary values as hexadecimal.
+    The arguments of each call are appended as a JSON line to the file named by the BCP_STUB_CALLS environment variable, if set.
+"""
+
+import json
+import os
+import os.path as path
+import sqlite3
+import stat
+import sys
+from typing import Any, Dict, List
+
+def create_executable(directory: str) -> str:
+    """
+    Writes an executable running this stub with the current interpreter to a directory, returning its path. POSIX only.
+    """
+    executable = path.join(directory, "bcp")
+    with open(executable, "w") as script:
+        script.write(f'#!/bin/sh\nexec "{sys.executable}" "{path.abspath(__file__)}" "$@"\n')
+    os.chmod(executable, os.stat(executable).st_mode | stat.S_IEXEC)
+    return executable
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.hex().upper()
+    if value == "":
+        return "\x00"
+    return str(value)
+
+def terminator(value: str) -> str:
+    return chr(int(value, 16)) if value.lower().startswith("0x") else value
+
+def main(arguments: List[str]) -> int:
+    query, direction, output_path = arguments[:3]
+    calls_path = os.environ.get("BCP_STUB_CALLS")
+    if calls_path:
+        with open(calls_path, "a", encoding="utf-8") as calls:
+            calls.write(json.dumps(arguments[3:]) + "\n")
+    options : Dict[str, str] = {}
+    flags = iter(arguments[3:])
+    for flag in flags:
+        options[flag] = "" if flag in ("-c", "-T", "-G") else next(flags)
+    if direction != "queryout" or "-c" not in options:
+        print("bcp stub only supports queryout in character mode")
+        return 1
+    server = options.get("-S", "")
+    if not server.startswith("sqlite:///"):
+        print(f"SQLState = 08001, NativeError = 2\nError = Unable to connect to {server}")
+        return 1
+    field_terminator = terminator(options.get("-t", "\t"))
+    row_terminator = terminator(options.get("-r", "\n"))
+    connection = sqlite3.connect(server[len("sqlite:///"):])
+    try:
+        # bracket quoted identifiers are valid SQLite, and bcp queries never contain ? placeholders
+        cursor = connection.execute(query)
+        rows = 0
+        with open(output_path, "w", encoding="utf-8", newline="") as output:
+            for row in cursor:
+                output.write(field_terminator.join(format_value(value) for value in row) + row_terminator)
+                rows += 1
+    except sqlite3.Error as error:
+        print(f"Error = {error}")
+        return 1
+    finally:
+        connection.close()
+    print(f"\n{rows} rows copied.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
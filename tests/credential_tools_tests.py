@@ -0,0 +1,167 @@
+"""
+    Offline test cases for sql_fabric_copy.credential_tools, using a stand-in credential in place of Entra ID.
+"""
+
+import unittest
+import os
+import os.path as path
+import shutil
+import tempfile
+import time
+from typing import Any, List
+from unittest import mock
+from azure.core.credentials import AccessToken
+from sql_fabric_copy.credential_tools import (
+    MIN_TOKEN_SECONDS,
+    CachedTokenCredential,
+    DefaultAzureCredentialOptions,
+    AsyncCachedTokenCredential,
+    TokenCache,
+    get_source_storage_options,
+    get_token_credential,
+)
+from sql_fabric_copy.onelake_tools import MIN_BEARER_TOKEN_SECONDS, deltalake_storage_options, get_service_client_token_credential
+
+class ManagedIdentityStub:
+    pass
+
+class StubCredential:
+    """Returns a new token, valid for lifetime seconds, on every call, failing when fail is set."""
+    def __init__(self, lifetime: int = 3600, fail: bool = False) -> None:
+        self.lifetime = lifetime
+        self.fail = fail
+        self.calls = 0
+        self._successful_credential = ManagedIdentityStub()
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        if self.fail:
+            raise Exception("credential unavailable")
+        self.calls += 1
+        return AccessToken(f"token{self.calls}", int(time.time()) + self.lifetime)
+
+class TestCredentialTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.credential_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.cache_path = path.join(self.directory, "token_cache.bin")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_cached_token(self):
+        stub = StubCredential()
+        credential = CachedTokenCredential("stub", lambda source: stub)
+        assert credential.get_token("scope/.default").token == "token1"
+        assert credential.get_token("scope/.default").token == "token1"
+        assert credential.get_token("other/.default").token == "token2"
+        assert stub.calls == 2
+
+    def test_token_cache_across_runs(self):
+        stub = StubCredential()
+        CachedTokenCredential("stub", lambda source: stub, TokenCache(self.cache_path, allow_unencrypted=True)).get_token("scope/.default")
+        assert os.stat(self.cache_path).st_mode & 0o077 == 0 or os.name == "nt"
+        # a later run reuses the token without authenticating
+        later = StubCredential()
+        credential = CachedTokenCredential("stub", lambda source: later, TokenCache(self.cache_path, allow_unencrypted=True))
+        assert credential.get_token("scope/.default").token == "token1"
+        assert later.calls == 0
+
+    def test_refresh_ahead_of_expiry(self):
+        stub = StubCredential(lifetime=300)
+        credential = CachedTokenCredential("stub", lambda source: stub, refresh_ahead_seconds=600)
+        assert credential.get_token("scope/.default").token == "token1"
+        # the token is still returned while a new one is fetched in the background
+        assert credential.get_token("scope/.default").token == "token1"
+        for _ in range(100):
+            if stub.calls == 2:
+                break
+            time.sleep(0.01)
+        assert credential.get_token("scope/.default").token == "token2"
+
+        expiring = StubCredential(lifetime=MIN_TOKEN_SECONDS // 2)
+        credential = CachedTokenCredential("expiring", lambda source: expiring)
+        credential.get_token("scope/.default")
+        assert credential.get_token("scope/.default").token == "token2"
+
+    def test_remembers_credential_source(self):
+        created : List[str | None] = []
+        stub = StubCredential()
+
+        def create(source: str | None) -> StubCredential:
+            created.append(source)
+            return stub
+
+        cache = TokenCache(self.cache_path, allow_unencrypted=True)
+        CachedTokenCredential("default", create, cache).get_token("scope/.default")
+        assert cache.get_source("default") == "ManagedIdentityStub"
+        CachedTokenCredential("default", create, TokenCache(self.cache_path, allow_unencrypted=True)).get_token("other/.default")
+        assert created == [None, "ManagedIdentityStub"]
+
+        # a remembered source that fails is forgotten, and every source tried again
+        failing = StubCredential(fail=True)
+        credential = CachedTokenCredential("default", lambda source: failing if source else stub, TokenCache(self.cache_path, allow_unencrypted=True))
+        assert credential.get_token("third/.default").token.startswith("token")
+
+    def test_default_azure_credential_options(self):
+        options = DefaultAzureCredentialOptions()
+        assert options.to_kwargs()["exclude_visual_studio_code_credential"]
+        assert not options.to_kwargs()["exclude_managed_identity_credential"]
+        with mock.patch.dict(os.environ, {"IDENTITY_ENDPOINT": "http://localhost"}, clear=True):
+            kwargs = DefaultAzureCredentialOptions.for_environment().to_kwargs()
+            assert [name for name, excluded in kwargs.items() if not excluded] == ["exclude_managed_identity_credential"]
+        with mock.patch.dict(os.environ, {"SQL_FABRIC_COPY_CREDENTIAL": "cli"}, clear=True):
+            kwargs = DefaultAzureCredentialOptions.for_environment().to_kwargs()
+            assert [name for name, excluded in kwargs.items() if not excluded] == ["exclude_cli_credential"]
+        with mock.patch.dict(os.environ, {}, clear=True):
+            credential = get_token_credential()
+            assert credential.cache_key == "default:managed_identity,cli"
+        with self.assertRaises(Exception):
+            DefaultAzureCredentialOptions.for_sources(["keyring"])
+
+    def test_service_client_credential(self):
+        service_client = get_service_client_token_credential(
+            "onelake",
+            service_prinicipal_tenant_id="tenant",
+            service_prinicipal_client_id="client",
+            service_prinicipal_client_secret="secret",
+        )
+        assert isinstance(service_client.credential, CachedTokenCredential)
+        assert service_client.credential.cache_key == "client_secret:tenant:client"
+
+    def test_deltalake_storage_options(self):
+        # object_store refreshes tokens itself for a service principal
+        credential = get_token_credential("tenant", "client", "secret")
+        token = AccessToken("token", int(time.time()) + 3600)
+        options = deltalake_storage_options(AsyncCachedTokenCredential(credential), token)
+        assert options == {"azure_client_id": "client", "azure_client_secret": "secret", "azure_tenant_id": "tenant", "use_fabric_endpoint": "true"}
+
+        # and for the source of DefaultAzureCredential that got the token
+        with mock.patch.dict(os.environ, {}, clear=True):
+            assert get_source_storage_options("AzureCliCredential") == {"azure_use_azure_cli": "true"}
+            assert get_source_storage_options("ManagedIdentityCredential") == {}
+            assert get_source_storage_options("AzurePowerShellCredential") is None
+        with mock.patch.dict(os.environ, {"IDENTITY_ENDPOINT": "http://localhost", "AZURE_CLIENT_ID": "client"}, clear=True):
+            assert get_source_storage_options("ManagedIdentityCredential") is None
+        with mock.patch.dict(os.environ, {"AZURE_FEDERATED_TOKEN_FILE": "/token", "AZURE_CLIENT_ID": "client", "AZURE_TENANT_ID": "tenant"}, clear=True):
+            assert get_source_storage_options("WorkloadIdentityCredential") == {
+                "azure_federated_token_file": "/token", "azure_client_id": "client", "azure_tenant_id": "tenant"
+            }
+        cache = TokenCache(None)
+        stub = StubCredential()
+        credential = CachedTokenCredential("default", lambda source: stub, cache)
+        assert credential.get_storage_options() is None
+        cache.set_source("default", "AzureCliCredential")
+        assert deltalake_storage_options(credential, token)["azure_use_azure_cli"] == "true"
+
+        # any other credential gets a static token, refused when it expires too soon for a write
+        assert deltalake_storage_options(stub, token) == {"bearer_token": "token", "use_fabric_endpoint": "true"}
+        with self.assertRaises(Exception):
+            deltalake_storage_options(stub, AccessToken("token", int(time.time()) + MIN_BEARER_TOKEN_SECONDS // 2))
+
+if __name__ == '__main__':
+    unittest.main()
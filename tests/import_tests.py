@@ -0,0 +1,57 @@
+"""
+    Offline test cases checking heavy dependencies of sql_fabric_copy are only imported by the code paths that use them.
+"""
+
+import unittest
+import json
+import os.path as path
+import subprocess
+import sys
+from typing import List
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+def loaded_modules(code: str, modules: List[str]) -> List[str]:
+    """Runs code in a fresh interpreter, returning which of modules it imported."""
+    probe = f"{code}\nimport json, sys\nprint(json.dumps([name for name in {modules!r} if name in sys.modules]))"
+    completed = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=ROOT, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+class TestImports(unittest.TestCase):
+    """
+    Test cases for the lazy imports of sql_fabric_copy.
+    """
+
+    def test_cli_help(self):
+        code = (
+            "import runpy, sys\n"
+            "sys.argv = ['sql_fabric_copy', '--help']\n"
+            "try:\n"
+            "    runpy.run_module('sql_fabric_copy', run_name='__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+        )
+        assert loaded_modules(code, ["pandas", "deltalake", "sqlalchemy", "pyarrow", "azure"]) == []
+
+    def test_package(self):
+        assert loaded_modules("import sql_fabric_copy", ["sql_fabric_copy.sql_fabric_copy_helper", "sqlalchemy"]) == []
+        assert loaded_modules("from sql_fabric_copy import upload_table_lakehouse", ["sql_fabric_copy.sql_fabric_copy_helper"]) == [
+            "sql_fabric_copy.sql_fabric_copy_helper"
+        ]
+
+    def test_csv_path(self):
+        # the CSV path writes with the Arrow CSV writer, so it needs neither deltalake nor pandas
+        code = "from sql_fabric_copy.sql_fabric_copy_helper import upload_csv_lakehouse"
+        assert loaded_modules(code, ["pandas", "deltalake", "azure.storage.filedatalake.aio", "msal_extensions"]) == []
+
+    def test_delta_write(self):
+        code = (
+            "import tempfile\n"
+            "import pyarrow as pa\n"
+            "from sql_fabric_copy.sql_fabric_copy_helper import write_deltalake\n"
+            "write_deltalake(tempfile.mkdtemp(), pa.table({'AccountKey': [1]}))\n"
+        )
+        assert loaded_modules(code, ["deltalake"]) == ["deltalake"]
+
+if __name__ == '__main__':
+    unittest.main()
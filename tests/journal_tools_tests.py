@@ -0,0 +1,53 @@
+"""
+    Offline test cases for sql_fabric_copy.journal_tools.
+"""
+
+import unittest
+import os.path as path
+import shutil
+import tempfile
+from sql_fabric_copy.journal_tools import STAGE_COMMITTED, STAGE_STAGED, RunJournal, journal_path, new_run_id
+
+class TestJournalTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.journal_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_run_journal(self):
+        run_id = new_run_id()
+        location = journal_path(self.directory, run_id)
+        journal = RunJournal(location, run_id)
+        assert journal.get("dbo.DimCurrency") == {}
+        journal.update("dbo.DimCurrency", stage=STAGE_STAGED, version=3, rows=100, error="TimeoutError: upload")
+        journal.update("dbo.DimCurrency", stage=STAGE_COMMITTED, error=None)
+        journal.append("dbo.DimAccount", "finished_ranges", 2)
+        journal.append("dbo.DimAccount", "finished_ranges", 0)
+        assert path.exists(location)
+
+        resumed = RunJournal(location, run_id, resume=True)
+        assert resumed.get("dbo.DimCurrency") == {"stage": STAGE_COMMITTED, "version": 3, "rows": 100}
+        assert resumed.get("dbo.DimAccount") == {"finished_ranges": [2, 0]}
+        assert list(resumed.tables_at(STAGE_COMMITTED)) == ["dbo.DimCurrency"]
+        assert resumed.checkpoint_directory("DimAccount") == path.join(path.dirname(location), run_id, "DimAccount")
+        # the copy returned by get does not change the journal
+        resumed.get("dbo.DimAccount")["finished_ranges"].append(1)
+        assert resumed.get("dbo.DimAccount") == {"finished_ranges": [2, 0]}
+
+    def test_run_journal_exists(self):
+        location = journal_path(self.directory, "nightly")
+        with self.assertRaises(Exception):
+            RunJournal(location, "nightly", resume=True)
+        RunJournal(location, "nightly").update("dbo.DimCurrency", stage=STAGE_STAGED)
+        with self.assertRaises(Exception):
+            RunJournal(location, "nightly")
+
+if __name__ == '__main__':
+    unittest.main()
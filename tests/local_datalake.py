@@ -0,0 +1,233 @@
+"""
+    Local filesystem stand-in for the azure.storage.filedatalake clients used by sql_fabric_copy.
+
+    Each file system (workspace) is a directory under root, so tests and benchmarks can run the
+    OneLake code paths without network access and inspect the result on disk.
+"""
+
+from datetime import datetime, timezone
+import os
+import os.path as path
+import shutil
+import threading
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+
+class LocalPathProperties:
+    """Mirrors the PathProperties items returned by FileSystemClient.get_paths."""
+    def __init__(self, name: str, is_directory: bool, content_length: int, last_modified: datetime) -> None:
+        self.name = name
+        self.is_directory = is_directory
+        self.content_length = content_length
+        self.last_modified = last_modified
+
+class LocalDownloader:
+    """Mirrors the StorageStreamDownloader returned by DataLakeFileClient.download_file."""
+    def __init__(self, local_path: str) -> None:
+        self.local_path = local_path
+
+    def readall(self) -> bytes:
+        with open(self.local_path, "rb") as data:
+            return data.read()
+
+    def readinto(self, stream: Any) -> int:
+        data = self.readall()
+        stream.write(data)
+        return len(data)
+
+class LocalDataLakeFileClient:
+    def __init__(self, service_client: "LocalDataLakeServiceClient", file_system_name: str, file_path: str) -> None:
+        self.service_client = service_client
+        self.file_system_name = file_system_name
+        self.path_name = file_path.strip("/")
+        self.local_path = service_client.local_path(file_system_name, self.path_name)
+
+    def upload_data(self, data: Any, overwrite: bool = False, **kwargs: Any) -> Dict[str, Any]:
+        self.service_client.check("upload_data", self.path_name)
+        if not overwrite and path.exists(self.local_path):
+            raise FileExistsError(self.local_path)
+        os.makedirs(path.dirname(self.local_path), exist_ok=True)
+        content = data if isinstance(data, (bytes, bytearray)) else data.read()
+        with open(self.local_path, "wb") as target:
+            target.write(content)
+        self.service_client.record("upload_data", self.path_name, len(content), kwargs)
+        return {}
+
+    def download_file(self, **kwargs: Any) -> LocalDownloader:
+        self.service_client.check("download_file", self.path_name)
+        if not path.isfile(self.local_path):
+            raise ResourceNotFoundError(f"{self.path_name} not found")
+        return LocalDownloader(self.local_path)
+
+    def exists(self, **kwargs: Any) -> bool:
+        return path.isfile(self.local_path)
+
+    def delete_file(self, **kwargs: Any):
+        self.service_client.check("delete_file", self.path_name)
+        if not path.isfile(self.local_path):
+            raise ResourceNotFoundError(f"{self.path_name} not found")
+        os.remove(self.local_path)
+        self.service_client.record("delete_file", self.path_name, 0, kwargs)
+
+    def close(self):
+        pass
+
+class LocalDataLakeDirectoryClient:
+    def __init__(self, service_client: "LocalDataLakeServiceClient", file_system_name: str, directory_path: str) -> None:
+        self.service_client = service_client
+        self.file_system_name = file_system_name
+        self.path_name = directory_path.strip("/")
+        self.local_path = service_client.local_path(file_system_name, self.path_name)
+
+    def get_file_client(self, file_name: str) -> LocalDataLakeFileClient:
+        return LocalDataLakeFileClient(self.service_client, self.file_system_name, f"{self.path_name}/{file_name}")
+
+    def exists(self, **kwargs: Any) -> bool:
+        self.service_client.check("exists", self.path_name)
+        return path.isdir(self.local_path)
+
+    def create_directory(self, **kwargs: Any) -> "LocalDataLakeDirectoryClient":
+        os.makedirs(self.local_path, exist_ok=True)
+        return self
+
+    def close(self):
+        pass
+
+class LocalFileSystemClient:
+    def __init__(self, service_client: "LocalDataLakeServiceClient", file_system_name: str) -> None:
+        self.service_client = service_client
+        self.file_system_name = file_system_name
+
+    def get_directory_client(self, directory: str) -> LocalDataLakeDirectoryClient:
+        self.service_client.record("get_directory_client", directory, 0, {})
+        return LocalDataLakeDirectoryClient(self.service_client, self.file_system_name, directory)
+
+    def get_file_client(self, file_path: str) -> LocalDataLakeFileClient:
+        return LocalDataLakeFileClient(self.service_client, self.file_system_name, file_path)
+
+    def create_directory(self, directory: str, **kwargs: Any) -> LocalDataLakeDirectoryClient:
+        return self.get_directory_client(directory).create_directory()
+
+    def delete_directory(self, directory: str, **kwargs: Any):
+        self.service_client.check("delete_directory", directory)
+        local_path = self.service_client.local_path(self.file_system_name, directory)
+        if not path.isdir(local_path):
+            raise ResourceNotFoundError(f"{directory} not found")
+        shutil.rmtree(local_path)
+        self.service_client.record("delete_directory", directory, 0, kwargs)
+
+    def delete_file(self, file: str, **kwargs: Any):
+        self.get_file_client(file).delete_file()
+
+    def get_paths(self, path: str | None = None, recursive: bool = True, **kwargs: Any) -> Iterator[LocalPathProperties]:
+        directory = (path or "").strip("/")
+        self.service_client.check("get_paths", directory)
+        local_directory = self.service_client.local_path(self.file_system_name, directory)
+        if not os.path.isdir(local_directory):
+            raise ResourceNotFoundError(f"{directory} not found")
+        self.service_client.record("get_paths", directory, 0, kwargs)
+        for dirpath, dirnames, filenames in os.walk(local_directory):
+            for name in sorted(dirnames) + sorted(filenames):
+                local_path = os.path.join(dirpath, name)
+                stat = os.stat(local_path)
+                relative_path = os.path.relpath(local_path, local_directory).replace("\\", "/")
+                yield LocalPathProperties(
+                    f"{directory}/{relative_path}" if directory else relative_path,
+                    os.path.isdir(local_path),
+                    0 if os.path.isdir(local_path) else stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+                )
+            if not recursive:
+                break
+
+    def close(self):
+        pass
+
+class LocalDataLakeServiceClient:
+    """
+    Stand-in for DataLakeServiceClient that stores every file system (workspace) as a directory under root.
+
+    Every upload, delete and listing is appended to calls as (operation, path, bytes, keyword arguments).
+    Requests can be made to fail as if OneLake throttled them, see throttle.
+    """
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.credential = None
+        self.calls : List[tuple[str, str, int, Dict[str, Any]]] = []
+        self.throttled : List[tuple[str, str]] = []
+        self._throttles : Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def throttle(self, operation: str, count: int, status_code: int = 429, retry_after: float | None = None):
+        """Fails the next count requests of operation, e.g. "upload_data", with status_code, asking to retry after retry_after seconds."""
+        with self._lock:
+            self._throttles[operation] = [count, status_code, retry_after]
+
+    def check(self, operation: str, path_name: str):
+        with self._lock:
+            throttle = self._throttles.get(operation)
+            if not throttle or throttle[0] <= 0:
+                return
+            throttle[0] -= 1
+            self.throttled.append((operation, path_name))
+        _, status_code, retry_after = throttle
+        error = HttpResponseError(message=f"{operation} {path_name} throttled with {status_code}")
+        error.status_code = status_code
+        error.response = SimpleNamespace(headers={"Retry-After": str(retry_after)} if retry_after is not None else {}) # type: ignore
+        raise error
+
+    def local_path(self, file_system_name: str, path_name: str) -> str:
+        return os.path.join(self.root, file_system_name, *[part for part in path_name.split("/") if part])
+
+    def record(self, operation: str, path_name: str, size: int, kwargs: Dict[str, Any]):
+        with self._lock:
+            self.calls.append((operation, path_name, size, kwargs))
+
+    def count_calls(self, operation: str) -> int:
+        return len([call for call in self.calls if call[0] == operation])
+
+    def get_file_system_client(self, file_system: str) -> LocalFileSystemClient:
+        return LocalFileSystemClient(self, file_system)
+
+    def get_directory_client(self, file_system: str, directory: str) -> LocalDataLakeDirectoryClient:
+        return self.get_file_system_client(file_system).get_directory_client(directory)
+
+    def get_file_client(self, file_system: str, file_path: str) -> LocalDataLakeFileClient:
+        return self.get_file_system_client(file_system).get_file_client(file_path)
+
+    def close(self):
+        pass
+
+class AsyncLocalClient:
+    """
+    Async view of a local client, mirroring the clients of azure.storage.filedatalake.aio: client getters stay
+    synchronous, get_paths returns an async iterator and every other method is a coroutine.
+    """
+    CLIENT_GETTERS = ("get_file_system_client", "get_directory_client", "get_file_client")
+    SYNC_ATTRIBUTES = ("root", "credential", "calls", "throttled", "local_path", "record", "count_calls", "throttle", "check")
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if name in self.SYNC_ATTRIBUTES:
+            return attribute
+        if name in self.CLIENT_GETTERS:
+            return lambda *args, **kwargs: AsyncLocalClient(attribute(*args, **kwargs))
+        if name == "get_paths":
+            async def paths(*args: Any, **kwargs: Any) -> AsyncIterator[LocalPathProperties]:
+                for item in attribute(*args, **kwargs):
+                    yield item
+            return paths
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            result = attribute(*args, **kwargs)
+            return AsyncLocalClient(result) if isinstance(result, LocalDownloader) else result
+        return call
+
+def AsyncLocalDataLakeServiceClient(root: str) -> Any:
+    """Stand-in for the asynchronous DataLakeServiceClient, storing files as LocalDataLakeServiceClient does."""
+    return AsyncLocalClient(LocalDataLakeServiceClient(root))
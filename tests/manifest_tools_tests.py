@@ -0,0 +1,82 @@
+"""
+    Offline test cases for sql_fabric_copy.manifest_tools.
+"""
+
+import unittest
+import json
+import os.path as path
+import shutil
+import tempfile
+from sql_fabric_copy.manifest_tools import ManifestTable, load_manifest, manifest_arguments, parse_manifest
+
+class TestManifestTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.manifest_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_parse_manifest(self):
+        manifest = parse_manifest(["dbo.DimCurrency", {"source": " dbo.DimAccount ", "load_mode": "merge"}])
+        assert manifest.tables == [ManifestTable("dbo.DimCurrency"), ManifestTable("dbo.DimAccount", load_mode="merge")]
+        assert manifest.options == {}
+        for content in (
+            {"tables": [{"source": "dbo.DimCurrency", "mode": "full"}]},
+            {"tables": ["dbo.DimCurrency", "dbo.DimCurrency"]},
+            {"tables": ["SELECT * FROM dbo.DimCurrency"]},
+            {"options": {"source": "dbo.DimCurrency"}, "tables": ["dbo.DimAccount"]},
+            {"tables": []},
+            {"table": ["dbo.DimCurrency"]},
+        ):
+            with self.assertRaises(Exception):
+                parse_manifest(content) # type: ignore
+
+    def test_manifest_arguments(self):
+        manifest = parse_manifest({
+            "options": {"parallel": 4, "load_mode": "incremental", "watermark_column": {"dbo.DimCurrency": "CurrencyKey"}},
+            "tables": [
+                "dbo.DimCurrency",
+                {"source": "dbo.DimAccount", "load_mode": "full", "watermark_column": "AccountKey", "columns": ["AccountKey"]},
+            ]
+        })
+        assert manifest_arguments(manifest) == {
+            "parallel": 4,
+            "source": ["dbo.DimCurrency", "dbo.DimAccount"],
+            "load_mode": {"dbo.DimCurrency": "incremental", "dbo.DimAccount": "full"},
+            "watermark_column": {"dbo.DimCurrency": "CurrencyKey", "dbo.DimAccount": "AccountKey"},
+            "columns": {"dbo.DimCurrency": None, "dbo.DimAccount": ["AccountKey"]},
+        }
+
+    def test_manifest_where_params(self):
+        manifest = parse_manifest({
+            "options": {"where": "ModifiedDate >= ?", "where_params": ["2024-01-01"]},
+            "tables": ["dbo.DimCurrency", {"source": "dbo.DimAccount", "where": "AccountType = 'Assets'"}]
+        })
+        # a table with its own filter does not take the values of the shared one
+        assert manifest_arguments(manifest)["where_params"] == {"dbo.DimCurrency": ["2024-01-01"], "dbo.DimAccount": []}
+        with self.assertRaises(Exception):
+            parse_manifest([{"source": "dbo.DimAccount", "where": "AccountKey > ?", "where_params": 5}])
+
+    def test_load_manifest(self):
+        content = {"options": {"sql_server": "localhost"}, "tables": ["dbo.DimCurrency"]}
+        json_path = path.join(self.directory, "manifest.json")
+        with open(json_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(content, manifest_file)
+        assert load_manifest(json_path).options == {"sql_server": "localhost"}
+        yaml_path = path.join(self.directory, "manifest.yaml")
+        with open(yaml_path, "w", encoding="utf-8") as manifest_file:
+            manifest_file.write("options:\n  sql_server: localhost\ntables:\n  - dbo.DimCurrency\n  - source: dbo.DimAccount\n    compression: zstd\n")
+        try:
+            import yaml # type: ignore
+        except ImportError:
+            self.skipTest("PyYAML is not installed")
+        assert load_manifest(yaml_path).tables[1] == ManifestTable("dbo.DimAccount", compression="zstd")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+    Offline test cases for sql_fabric_copy.metrics_tools.
+"""
+
+import unittest
+import io
+import json
+import pyarrow as pa
+from sql_fabric_copy.metrics_tools import (
+    JsonLinesWriter,
+    StageMetrics,
+    add_hook,
+    measure_data,
+    measure_stage,
+    remove_hook,
+)
+
+class TestMetricsTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.metrics_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.emitted : list[StageMetrics] = []
+        add_hook(self.emitted.append)
+
+    def tearDown(self) -> None:
+        remove_hook(self.emitted.append)
+        super().tearDown()
+
+    def test_measure_stage_error(self):
+        with self.assertRaises(ValueError):
+            with measure_stage("DimAccount", "DimAccount", "extract") as metrics:
+                metrics.rows = 10
+                raise ValueError("connection lost")
+        assert [(metrics.stage, metrics.rows, metrics.error) for metrics in self.emitted] == [
+            ("extract", 10, "ValueError: connection lost")
+        ]
+
+    def test_failing_hook(self):
+        def failing_hook(metrics: StageMetrics):
+            raise Exception("hook failed")
+        add_hook(failing_hook)
+        try:
+            with measure_stage("DimAccount", "DimAccount", "upload"):
+                pass
+        finally:
+            remove_hook(failing_hook)
+        assert len(self.emitted) == 1
+
+    def test_measure_data_reader(self):
+        batches = [pa.record_batch({"AccountKey": list(range(index * 10, index * 10 + 10))}) for index in range(3)]
+        metrics = StageMetrics("DimAccount", "DimAccount", "extract")
+        reader = measure_data(pa.RecordBatchReader.from_batches(batches[0].schema, iter(batches)), metrics)
+        assert metrics.rows == 0
+        assert reader.read_all().num_rows == 30
+        assert metrics.rows == 30 and metrics.bytes_read == sum(batch.nbytes for batch in batches)
+
+        # rows are counted for the run summary and journal even when no hook reads the metrics
+        remove_hook(self.emitted.append)
+        metrics = StageMetrics("DimAccount", "DimAccount", "extract")
+        reader = measure_data(pa.RecordBatchReader.from_batches(batches[0].schema, iter(batches)), metrics)
+        assert reader.read_all().num_rows == 30
+        assert metrics.rows == 30 and metrics.seconds == 0.0
+
+    def test_json_lines_writer(self):
+        stream = io.StringIO()
+        writer = JsonLinesWriter(stream)
+        writer(StageMetrics("DimAccount", "DimAccount", "write", rows=5, files=1))
+        writer(StageMetrics("DimAccount", "DimAccount", "upload", files=2))
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [(line["stage"], line["rows"], line["files"]) for line in lines] == [("write", 5, 1), ("upload", 0, 2)]
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+    Offline test cases for sql_fabric_copy.onelake_tools_aio, using a local filesystem in place of OneLake.
+"""
+
+import asyncio
+import unittest
+import os
+import os.path as path
+import shutil
+import tempfile
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+from sql_fabric_copy.onelake_tools import list_local_files, normalize_lakehouse_path
+from sql_fabric_copy.onelake_tools_aio import (
+    copy_deltatable,
+    count_files_in_directory,
+    delete_table,
+    gather_bounded,
+    prepare_local_deltatable,
+    upload_file,
+)
+from sql_fabric_copy.transfer_tools import TransferController
+from tests.local_datalake import AsyncLocalDataLakeServiceClient
+
+class TestOnelakeToolsAio(unittest.IsolatedAsyncioTestCase):
+    """
+    Test cases for sql_fabric_copy.onelake_tools_aio.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.service_client = AsyncLocalDataLakeServiceClient(path.join(self.directory, "onelake"))
+        self.workspace_name = "FabricDW [Dev]"
+        self.lakehouse_name = "FabricLH"
+        self.local_table_path = path.join(self.directory, "output", "Account").replace("\\", "/")
+        for part in range(3):
+            write_deltalake(
+                self.local_table_path,
+                pa.table({"AccountKey": list(range(part * 100, part * 100 + 100))}),
+                mode="append"
+            )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def remote_table_path(self, table_name: str = "Account") -> str:
+        return self.service_client.local_path(
+            self.workspace_name,
+            normalize_lakehouse_path(self.lakehouse_name, table_name, type="Tables")
+        )
+
+    async def test_gather_bounded(self):
+        running = 0
+        peak = 0
+
+        async def work(item: int) -> int:
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return item * 2
+
+        assert await gather_bounded(work, range(20), concurrency=3) == [item * 2 for item in range(20)]
+        assert peak == 3
+
+    async def test_gather_bounded_failure(self):
+        async def work(item: int):
+            if item == 2:
+                raise ValueError("failed")
+            await asyncio.sleep(1)
+
+        with self.assertRaises(ValueError):
+            await gather_bounded(work, range(10), concurrency=4)
+
+    async def test_copy_deltatable(self):
+        result = await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, upload_concurrency=4) # type: ignore
+        local_files = list_local_files(self.local_table_path)
+        assert sorted(result.uploaded_files) == sorted(local_files)
+        assert self.service_client.count_calls("upload_data") == len(local_files)
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 300
+
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [0]}), mode="overwrite")
+        result = await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, replace_table=False) # type: ignore
+        assert not result.deleted_files and result.unchanged_files > 0
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 1
+        assert DeltaTable(self.remote_table_path(), version=2).to_pyarrow_table().num_rows == 300
+        result = await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, retention_hours=0) # type: ignore
+        assert len(result.deleted_files) == 3
+
+    async def test_copy_deltatable_throttled(self):
+        controller = TransferController(4, backoff_seconds=0.001)
+        self.service_client.throttle("upload_data", 3, retry_after=0)
+        result = await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, controller=controller) # type: ignore
+        assert result.retries == 3 and len(self.service_client.throttled) == 3
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 300
+
+        shutil.rmtree(self.local_table_path)
+        self.service_client.throttle("download_file", 2)
+        result = await prepare_local_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, controller=controller) # type: ignore
+        assert result.retries == 2 and DeltaTable(self.local_table_path).version() == 2
+
+    async def test_prepare_local_deltatable(self):
+        await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        shutil.rmtree(self.local_table_path)
+        await prepare_local_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        assert all(file_path.startswith("_delta_log/") for file_path in list_local_files(self.local_table_path))
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [300]}), mode="append")
+        await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, replace_table=False) # type: ignore
+        table = DeltaTable(self.remote_table_path())
+        assert table.version() == 3 and table.to_pyarrow_table().num_rows == 301
+        await prepare_local_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, download_data=True) # type: ignore
+        assert DeltaTable(self.local_table_path).to_pyarrow_table().num_rows == 301
+
+    async def test_upload_file_and_delete_table(self):
+        local_path = path.join(self.directory, "accounts.csv")
+        with open(local_path, "w") as local_file:
+            local_file.write("AccountKey\n1\n")
+        await upload_file(self.service_client, local_path, self.lakehouse_name, self.workspace_name, "erp/accounts.csv") # type: ignore
+        assert os.path.isfile(self.service_client.local_path(self.workspace_name, f"{self.lakehouse_name}.Lakehouse/Files/erp/accounts.csv"))
+        assert await count_files_in_directory(self.service_client, self.workspace_name, self.lakehouse_name, "erp") == 1 # type: ignore
+
+        await copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        await delete_table(self.service_client, self.workspace_name, self.lakehouse_name, "Account") # type: ignore
+        assert not os.path.exists(self.remote_table_path())
+        await delete_table(self.service_client, self.workspace_name, self.lakehouse_name, "Account") # type: ignore
+
+if __name__ == '__main__':
+    unittest.main()
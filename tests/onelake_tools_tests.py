@@ -0,0 +1,166 @@
+"""
+    Offline test cases for sql_fabric_copy.onelake_tools, using a local filesystem in place of OneLake.
+"""
+
+import unittest
+import os
+import os.path as path
+import shutil
+import tempfile
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+from sql_fabric_copy.onelake_tools import (
+    copy_deltatable,
+    get_local_file_sizes,
+    list_local_files,
+    list_remote_files,
+    normalize_lakehouse_path,
+    plan_delta_sync,
+    prepare_local_deltatable,
+    replace_diverged_table,
+)
+from sql_fabric_copy.transfer_tools import TransferController
+from tests.local_datalake import LocalDataLakeServiceClient
+
+class TestOnelakeTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.onelake_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.service_client = LocalDataLakeServiceClient(path.join(self.directory, "onelake"))
+        self.workspace_name = "FabricDW [Dev]"
+        self.lakehouse_name = "FabricLH"
+        self.local_table_path = path.join(self.directory, "output", "Account").replace("\\", "/")
+        for part in range(3):
+            write_deltalake(
+                self.local_table_path,
+                pa.table({"AccountKey": list(range(part * 100, part * 100 + 100))}),
+                mode="append"
+            )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def remote_table_path(self, table_name: str = "Account") -> str:
+        return self.service_client.local_path(
+            self.workspace_name,
+            normalize_lakehouse_path(self.lakehouse_name, table_name, type="Tables")
+        )
+
+    def test_normalize_lakehouse_path(self):
+        assert normalize_lakehouse_path("FabricLH", "/Account", type="Tables") == "FabricLH.Lakehouse/Tables/Account"
+        assert normalize_lakehouse_path("FabricLH.Lakehouse", "Files/erp", "/FabricDW [Dev]/") == "FabricDW [Dev]/FabricLH.Lakehouse/Files/erp"
+
+    def test_copy_deltatable(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, upload_concurrency=4) # type: ignore
+        local_files = sum(len(filenames) for _, _, filenames in os.walk(self.local_table_path))
+        assert self.service_client.count_calls("upload_data") == local_files
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 300
+        # clients and paths are resolved once per table rather than once per file
+        assert self.service_client.count_calls("get_directory_client") <= 2
+
+    def test_copy_deltatable_chunks(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, chunk_size=1024, max_concurrency=2) # type: ignore
+        upload_kwargs = [call[3] for call in self.service_client.calls if call[0] == "upload_data"]
+        assert all(kwargs["chunk_size"] == 1024 and kwargs["max_concurrency"] == 2 for kwargs in upload_kwargs)
+
+    def test_copy_deltatable_replaces_table(self):
+        stale_file = path.join(self.remote_table_path(), "stale.parquet")
+        os.makedirs(path.dirname(stale_file))
+        open(stale_file, "wb").close()
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        assert not path.exists(stale_file)
+
+    def test_copy_deltatable_uploads_changes(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [300]}), mode="append")
+        upload_calls = self.service_client.count_calls("upload_data")
+        result = copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        # only the new parquet file and the new commit
+        assert self.service_client.count_calls("upload_data") - upload_calls == 2
+        assert result.uploaded_files[-1] == "_delta_log/00000000000000000003.json"
+        assert result.unchanged_files == 6 and not result.deleted_files
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 301
+
+    def test_copy_deltatable_overwrite_is_atomic(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [1, 2]}), mode="overwrite")
+        self.service_client.calls.clear()
+        result = copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        operations = [(call[0], call[1].split("/")[-1]) for call in self.service_client.calls if call[0] in ("upload_data", "delete_file")]
+        # the new data file, then the commit publishing it
+        assert operations == [("upload_data", result.uploaded_files[0]), ("upload_data", "00000000000000000003.json")]
+        assert self.service_client.count_calls("delete_directory") == 0
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 2
+
+    def test_copy_deltatable_keeps_previous_version(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [1, 2]}), mode="overwrite")
+        result = copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        # the files of the replaced version are kept for its readers, and for time travel
+        assert not result.deleted_files
+        assert DeltaTable(self.remote_table_path(), version=2).to_pyarrow_table().num_rows == 300
+        # and deleted by a later sync once they are past the retention
+        result = copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, retention_hours=0) # type: ignore
+        assert len(result.deleted_files) == 3 and not result.uploaded_files
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 2
+
+    def test_copy_deltatable_diverged(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        shutil.rmtree(self.local_table_path)
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [1]}))
+        with self.assertRaises(Exception):
+            copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, replace_table=False) # type: ignore
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 1
+
+    def test_plan_delta_sync(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [1, 2]}), mode="overwrite")
+        local_files = get_local_file_sizes(self.local_table_path)
+        remote_files = list_remote_files(self.service_client, self.workspace_name, self.lakehouse_name, "Account") # type: ignore
+        assert not replace_diverged_table(self.local_table_path, "Account", local_files, remote_files, replace_table=False)
+        plan = plan_delta_sync(self.local_table_path, local_files, remote_files)
+        assert len(plan.data_files) == 1 and plan.commit_files == ["_delta_log/00000000000000000003.json"]
+        assert not plan.checkpoint_files and not plan.stale_files
+        assert len(plan_delta_sync(self.local_table_path, local_files, remote_files, retention_hours=0).stale_files) == 3
+        # a local table with another history has to replace the one on the Lakehouse
+        del local_files["_delta_log/00000000000000000001.json"]
+        with self.assertRaises(Exception):
+            replace_diverged_table(self.local_table_path, "Account", local_files, remote_files, replace_table=False)
+        assert replace_diverged_table(self.local_table_path, "Account", local_files, remote_files, replace_table=True)
+
+    def test_copy_deltatable_throttled(self):
+        controller = TransferController(4, backoff_seconds=0.001)
+        self.service_client.throttle("get_paths", 1, status_code=503)
+        self.service_client.throttle("upload_data", 3, retry_after=0.01)
+        result = copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, controller=controller) # type: ignore
+        assert result.retries == 4 and result.throttled_seconds >= 0.03
+        # the storage client does not retry on its own, leaving it to the controller
+        assert all(call[3].get("retry_total") == 0 for call in self.service_client.calls if call[0] == "upload_data")
+        assert controller.stats.throttled == 4
+        assert DeltaTable(self.remote_table_path()).to_pyarrow_table().num_rows == 300
+
+        self.service_client.throttle("upload_data", 1, status_code=403)
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [300]}), mode="append")
+        with self.assertRaises(Exception):
+            copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, controller=controller) # type: ignore
+
+    def test_prepare_local_deltatable(self):
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        shutil.rmtree(self.local_table_path)
+        prepare_local_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name) # type: ignore
+        assert all(file_path.startswith("_delta_log/") for file_path in list_local_files(self.local_table_path))
+        write_deltalake(self.local_table_path, pa.table({"AccountKey": [300]}), mode="append")
+        copy_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, replace_table=False) # type: ignore
+        table = DeltaTable(self.remote_table_path())
+        assert table.version() == 3 and table.to_pyarrow_table().num_rows == 301
+        prepare_local_deltatable(self.service_client, self.local_table_path, self.lakehouse_name, self.workspace_name, download_data=True) # type: ignore
+        assert DeltaTable(self.local_table_path).to_pyarrow_table().num_rows == 301
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+    Offline test cases for sql_fabric_copy.pipeline_tools.
+"""
+
+import unittest
+import threading
+import time
+from typing import List
+from sql_fabric_copy.pipeline_tools import ByteBudget, PipelineStage, run_pipeline
+
+class TestPipelineTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.pipeline_tools.
+    """
+
+    def test_run_pipeline(self):
+        stages = [
+            PipelineStage("double", lambda item: item * 2),
+            PipelineStage("increment", lambda item: item + 1, workers=3),
+        ]
+        assert run_pipeline(range(20), stages) == [item * 2 + 1 for item in range(20)]
+        assert run_pipeline([], stages) == []
+
+    def test_stages_overlap(self):
+        # the second item is extracted while the first uploads
+        events : List[str] = []
+        uploading = threading.Event()
+
+        def extract(item: int) -> int:
+            if item == 1:
+                uploading.wait(5)
+            events.append(f"extract {item}")
+            return item
+
+        def upload(item: int) -> int:
+            events.append(f"upload {item}")
+            if item == 0:
+                uploading.set()
+                time.sleep(0.05)
+            return item
+
+        assert run_pipeline(range(2), [PipelineStage("extract", extract), PipelineStage("upload", upload)]) == [0, 1]
+        assert events == ["extract 0", "upload 0", "extract 1", "upload 1"]
+
+    def test_backpressure(self):
+        # a slow last stage stops the first stage once the queues between them are full
+        extracted : List[int] = []
+        release = threading.Event()
+
+        def upload(item: int) -> int:
+            release.wait(5)
+            return item
+
+        stages = [
+            PipelineStage("extract", lambda item: extracted.append(item) or item),
+            PipelineStage("write", lambda item: item),
+            PipelineStage("upload", upload),
+        ]
+        thread = threading.Thread(target=run_pipeline, args=(range(10), stages, 1))
+        thread.start()
+        time.sleep(0.2)
+        # one item in each stage and one in each queue
+        assert len(extracted) <= 5
+        release.set()
+        thread.join(5)
+        assert len(extracted) == 10
+
+    def test_failure(self):
+        uploaded : List[int] = []
+
+        def extract(item: int) -> int:
+            if item == 2:
+                raise ValueError("failed")
+            return item
+
+        stages = [PipelineStage("extract", extract), PipelineStage("upload", lambda item: uploaded.append(item))]
+        with self.assertRaises(ValueError):
+            run_pipeline(range(5), stages)
+        assert uploaded == [0, 1, 3, 4]
+
+    def test_byte_budget(self):
+        budget = ByteBudget(100)
+        budget.acquire(60)
+        acquired = threading.Event()
+
+        def acquire():
+            budget.acquire(60)
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.1)
+        budget.release(60)
+        assert acquired.wait(5)
+        thread.join()
+        assert budget.held == 60
+        # a request larger than the budget is granted once nothing else is held
+        budget.release(60)
+        budget.acquire(500)
+        assert budget.held == 500
+        ByteBudget().acquire(10**12)
+
+    def test_byte_budget_adjust(self):
+        # an estimate reserved before reading an item is replaced by its size, waking those waiting for the budget
+        budget = ByteBudget(100)
+        budget.acquire(80)
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: budget.acquire(50) or acquired.set())
+        thread.start()
+        assert not acquired.wait(0.1)
+        budget.adjust(80, 40)
+        assert acquired.wait(5)
+        thread.join()
+        assert budget.held == 90
+
+if __name__ == '__main__':
+    unittest.main()
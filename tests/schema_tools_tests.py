@@ -0,0 +1,87 @@
+"""
+    Offline test cases for sql_fabric_copy.schema_tools, using a SQLite database in place of SQL Server.
+"""
+
+import unittest
+import os.path as path
+import shutil
+import sqlite3
+import tempfile
+from datetime import time
+import pyarrow as pa
+from deltalake import DeltaTable, write_deltalake
+from sql_fabric_copy import schema_tools
+from sql_fabric_copy.db_tools import dispose_engines, rows_to_typed_record_batch
+from sql_fabric_copy.schema_tools import (
+    SourceColumn,
+    clear_schema_cache,
+    columns_to_schema,
+    get_source_schema,
+    sql_type_to_arrow,
+)
+
+class TestSchemaTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.schema_tools.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        database_path = path.join(self.directory, "source.db")
+        with sqlite3.connect(database_path) as connection:
+            connection.execute("CREATE TABLE Account (AccountKey INTEGER, AccountName TEXT)")
+        self.sql_server = f"sqlite:///{database_path}"
+
+    def tearDown(self) -> None:
+        clear_schema_cache()
+        dispose_engines()
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_sql_type_to_arrow(self):
+        assert sql_type_to_arrow(SourceColumn("a", "tinyint")) == pa.int16()
+        assert sql_type_to_arrow(SourceColumn("a", "int")) == pa.int32()
+        assert sql_type_to_arrow(SourceColumn("a", "decimal(18,2)", 18, 2)) == pa.decimal128(18, 2)
+        assert sql_type_to_arrow(SourceColumn("a", "money", 19, 4)) == pa.decimal128(19, 4)
+        assert sql_type_to_arrow(SourceColumn("a", "datetime2(3)", 23, 3)) == pa.timestamp("us")
+        assert sql_type_to_arrow(SourceColumn("a", "datetimeoffset(7)", 34, 7)) == pa.timestamp("us", tz="UTC")
+        assert sql_type_to_arrow(SourceColumn("a", "time(7)", 16, 7)) == pa.string()
+        assert sql_type_to_arrow(SourceColumn("a", "nvarchar(max)")) == pa.string()
+        assert sql_type_to_arrow(SourceColumn("a", "varbinary(8000)")) == pa.binary()
+        assert sql_type_to_arrow(SourceColumn("a", "sql_variant")) is None
+
+    def test_type_map(self):
+        type_map = {"TINYINT": "int32", "sql_variant": pa.string()}
+        assert sql_type_to_arrow(SourceColumn("a", "tinyint"), type_map) == pa.int32()
+        assert sql_type_to_arrow(SourceColumn("a", "sql_variant"), type_map) == pa.string()
+        assert sql_type_to_arrow(SourceColumn("a", "int"), type_map) == pa.int32()
+
+    def test_columns_to_schema(self):
+        columns = [SourceColumn("Key", "bigint", 19, 0, False), SourceColumn("Amount", "numeric(9,3)", 9, 3)]
+        schema = columns_to_schema(columns)
+        assert schema == pa.schema([pa.field("Key", pa.int64()), pa.field("Amount", pa.decimal128(9, 3))])
+        assert columns_to_schema(columns + [SourceColumn("Value", "sql_variant")]) is None
+
+    def test_mapped_schema_writes_delta(self):
+        # every mapped type is one Delta tables store, including tinyint values above 127 and times
+        schema = columns_to_schema([SourceColumn("Level", "tinyint", 3, 0), SourceColumn("Duration", "time(7)", 16, 7)])
+        assert schema is not None
+        batch = rows_to_typed_record_batch([(255, time(1, 2, 3, 123456)), (0, None)], schema)
+        table_path = path.join(self.directory, "mapped")
+        write_deltalake(table_path, pa.Table.from_batches([batch]))
+        assert DeltaTable(table_path).to_pyarrow_table().to_pylist() == [
+            {"Level": 255, "Duration": "01:02:03.123456"},
+            {"Level": 0, "Duration": None},
+        ]
+
+    def test_get_source_schema_other_database(self):
+        # only SQL Server can describe result sets, so other databases infer types from the data
+        assert get_source_schema(self.sql_server, "source", "Account") is None
+        assert get_source_schema(self.sql_server, "source", "SELECT * FROM Account WHERE AccountKey > ?") is None
+        assert len(schema_tools._descriptions) == 2 # type: ignore
+        clear_schema_cache()
+        assert not schema_tools._descriptions # type: ignore
+
+if __name__ == '__main__':
+    unittest.main()
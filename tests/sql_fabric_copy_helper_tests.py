@@ -0,0 +1,571 @@
+"""
+    Offline test cases for sql_fabric_copy.sql_fabric_copy_helper, using SQLite in place of SQL Server and a local filesystem in place of OneLake.
+"""
+
+import asyncio
+import unittest
+import gzip
+import os
+import os.path as path
+import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Any
+from unittest import mock
+from deltalake import DeltaTable
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import event
+from sql_fabric_copy.db_tools import dispose_engines, get_engine
+from sql_fabric_copy.delta_tools import get_data_files
+from sql_fabric_copy.manifest_tools import manifest_arguments, parse_manifest
+from sql_fabric_copy.metrics_tools import StageMetrics, add_hook, remove_hook
+from sql_fabric_copy.onelake_tools import normalize_lakehouse_path
+from sql_fabric_copy import sql_fabric_copy_helper
+from sql_fabric_copy.sql_fabric_copy_helper import (
+    schedule_sources,
+    upload_csv_lakehouse,
+    upload_table_lakehouse,
+    upload_table_lakehouse_async,
+    write_csv_parts,
+)
+from tests import bcp_stub
+from tests.local_datalake import AsyncLocalDataLakeServiceClient, LocalDataLakeServiceClient
+
+class TestSqlFabricCopyHelper(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.sql_fabric_copy_helper.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        # staged tables are written under the default "output" folder of the working directory
+        self.working_directory = os.getcwd()
+        os.chdir(self.directory)
+        database_path = path.join(self.directory, "source.db")
+        self.database_path = database_path
+        with sqlite3.connect(database_path) as connection:
+            connection.execute("CREATE TABLE DimCurrency (CurrencyKey INTEGER, CurrencyName TEXT)")
+            connection.executemany("INSERT INTO DimCurrency VALUES (?, ?)", [(i, f"Currency {i}") for i in range(100)])
+            connection.execute("CREATE TABLE DimAccount (AccountKey INTEGER, Balance REAL)")
+            connection.executemany("INSERT INTO DimAccount VALUES (?, ?)", [(i, i / 2) for i in range(250)])
+            connection.execute("CREATE TABLE DimCustomer (CustomerKey INTEGER PRIMARY KEY, CustomerName TEXT, RowVersion INTEGER)")
+            connection.executemany("INSERT INTO DimCustomer VALUES (?, ?, ?)", [(i, f"Customer {i}", i) for i in range(50)])
+        self.service_client = LocalDataLakeServiceClient(path.join(self.directory, "onelake"))
+        self.arguments = {
+            'sql_server': f"sqlite:///{database_path}",
+            'database_name': "source",
+            'workspace_name': "FabricDW [Dev]",
+            'lakehouse_name': "FabricLH",
+            'service_client': self.service_client,
+        }
+
+    def tearDown(self) -> None:
+        dispose_engines()
+        os.chdir(self.working_directory)
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def lakehouse_table(self, table_name: str, version: int | None = None) -> DeltaTable:
+        return DeltaTable(self.service_client.local_path(
+            self.arguments['workspace_name'],
+            normalize_lakehouse_path(self.arguments['lakehouse_name'], table_name, type="Tables")
+        ), version=version)
+
+    def test_table_to_onelake(self):
+        upload_table_lakehouse(source="DimCurrency", **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimCurrency").to_pyarrow_table().num_rows == 100
+
+    def test_table_to_onelake_async(self):
+        async_client = AsyncLocalDataLakeServiceClient(self.service_client.root)
+        arguments = {**self.arguments, 'service_client': async_client}
+        results = asyncio.run(upload_table_lakehouse_async(source=["DimCurrency", "DimAccount"], parallel=2, **arguments)) # type: ignore
+        assert [result.rows for result in results] == [100, 250]
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 250
+        assert async_client.count_calls("upload_data") > 0 and self.service_client.count_calls("upload_data") == 0
+
+    def test_full_reload_syncs_changes(self):
+        upload_table_lakehouse(source="DimCurrency", **self.arguments) # type: ignore
+        upload_calls = self.service_client.count_calls("upload_data")
+        upload_table_lakehouse(source="DimCurrency", **self.arguments) # type: ignore
+        table = self.lakehouse_table("DimCurrency")
+        assert table.version() == 1 and table.to_pyarrow_table().num_rows == 100
+        # the reload is published as a new version rather than deleting and re-creating the table
+        assert self.service_client.count_calls("upload_data") - upload_calls == 2
+        assert self.service_client.count_calls("delete_directory") == 0
+        # the replaced data file is kept for readers of the previous version until it is past the retention
+        assert self.service_client.count_calls("delete_file") == 0
+        assert self.lakehouse_table("DimCurrency", version=0).to_pyarrow_table().num_rows == 100
+        upload_table_lakehouse(source="DimCurrency", retention_hours=0, **self.arguments) # type: ignore
+        assert self.service_client.count_calls("delete_file") == 2
+
+    def test_table_to_onelake_streaming(self):
+        upload_table_lakehouse(source="DimAccount", batch_rows=100, **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 250
+
+    def test_table_to_onelake_partitioned(self):
+        upload_table_lakehouse(source="DimAccount", partitions=4, partition_column={"DimAccount": "AccountKey"}, **self.arguments) # type: ignore
+        table = self.lakehouse_table("DimAccount")
+        assert table.version() == 0
+        assert sorted(table.to_pyarrow_table().column("AccountKey").to_pylist()) == list(range(250))
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "the bcp stub is a POSIX shell script")
+    def test_table_to_onelake_bcp(self):
+        arguments = {
+            'source': "DimAccount",
+            'load_mode': "incremental",
+            'watermark_column': "AccountKey",
+            'extract_engine': "bcp",
+            'bcp_path': bcp_stub.create_executable(self.directory),
+            **self.arguments
+        }
+        upload_table_lakehouse(**arguments) # type: ignore
+        self.insert_accounts(range(250, 300))
+        upload_table_lakehouse(**arguments) # type: ignore
+        table = self.lakehouse_table("DimAccount").to_pyarrow_table().sort_by("AccountKey")
+        assert table.column("AccountKey").to_pylist() == list(range(300))
+        assert table.column("Balance").to_pylist()[:3] == [0.0, 0.5, 1.0]
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimAccount", extract_engine="bcp", partitions=2, **self.arguments) # type: ignore
+
+    def test_parquet_layout(self):
+        upload_table_lakehouse(
+            source="DimCurrency",
+            row_group_rows=30,
+            compression="zstd",
+            compression_level=5,
+            dictionary_encoding=False,
+            sort_by={"DimCurrency": "CurrencyName"},
+            **self.arguments
+        ) # type: ignore
+        table = self.lakehouse_table("DimCurrency")
+        files = list(get_data_files(table.table_uri))
+        assert len(files) == 1
+        metadata = pq.ParquetFile(path.join(self.directory, "output", "DimCurrency", files[0])).metadata
+        assert [metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)] == [30, 30, 30, 10]
+        column = metadata.row_group(0).column(1)
+        assert column.compression == "ZSTD" and "PLAIN_DICTIONARY" not in column.encodings and "RLE_DICTIONARY" not in column.encodings
+        names = table.to_pyarrow_table().column("CurrencyName").to_pylist()
+        assert names == sorted(names)
+
+    def lakehouse_files(self, directory: str) -> list[str]:
+        local_directory = self.service_client.local_path(
+            self.arguments['workspace_name'],
+            normalize_lakehouse_path(self.arguments['lakehouse_name'], directory, type="Files")
+        )
+        return sorted(os.listdir(local_directory)) if path.exists(local_directory) else []
+
+    def test_csv_to_onelake(self):
+        upload_csv_lakehouse(source=["DimCurrency", "DimAccount"], target_path="exports", **self.arguments) # type: ignore
+        assert self.lakehouse_files("exports") == ["DimAccount.csv", "DimCurrency.csv"]
+        with open(path.join(self.service_client.local_path(
+            self.arguments['workspace_name'],
+            normalize_lakehouse_path(self.arguments['lakehouse_name'], "exports/DimCurrency.csv", type="Files")
+        ))) as csv_file:
+            lines = csv_file.read().splitlines()
+        assert lines[0] == '"CurrencyKey","CurrencyName"' and lines[1] == '0,"Currency 0"' and len(lines) == 101
+        # staged files are removed once uploaded
+        assert not path.exists(path.join(self.directory, "output", "DimCurrency"))
+
+    def test_csv_parts_compressed(self):
+        arguments = {'source': "DimAccount", 'target_file': "accounts.csv", 'batch_rows': 20, 'compression': "gzip", **self.arguments}
+        upload_csv_lakehouse(part_size_mb=0.0001, **arguments) # type: ignore
+        parts = self.lakehouse_files("")
+        assert len(parts) > 2 and parts[0] == "accounts-00000.csv.gz"
+        rows = 0
+        for part in parts:
+            with gzip.open(self.service_client.local_path(
+                self.arguments['workspace_name'],
+                normalize_lakehouse_path(self.arguments['lakehouse_name'], part, type="Files")
+            ), "rt") as csv_file:
+                lines = csv_file.read().splitlines()
+            assert lines[0] == '"AccountKey","Balance"'
+            rows += len(lines) - 1
+        assert rows == 250
+        # a later upload with fewer parts removes the parts it did not write again
+        upload_csv_lakehouse(**arguments) # type: ignore
+        assert self.lakehouse_files("") == ["accounts.csv.gz"]
+
+    def test_csv_parts_flush_at_rollover(self):
+        compressed_output_stream = pa.CompressedOutputStream
+        flushes : list[int] = []
+
+        class CountingStream:
+            """Compressed stream counting its flushes."""
+            def __init__(self, raw: Any, compression: str) -> None:
+                self.stream = compressed_output_stream(raw, compression)
+            def write(self, data: Any) -> int:
+                return self.stream.write(data)
+            def flush(self):
+                flushes.append(self.stream.tell())
+                self.stream.flush()
+            def tell(self) -> int:
+                return self.stream.tell()
+            def close(self):
+                self.stream.close()
+            @property
+            def closed(self) -> bool:
+                return self.stream.closed
+
+        batches = [
+            pa.record_batch({"AccountKey": list(range(index * 10, index * 10 + 10)), "Name": [f"Account {index}"] * 10})
+            for index in range(2000)
+        ]
+        with mock.patch("pyarrow.CompressedOutputStream", CountingStream):
+            parts = write_csv_parts(pa.RecordBatchReader.from_batches(batches[0].schema, iter(batches)), self.directory, "accounts", "gzip", 0.01)
+        # the compressor is flushed to measure a part only once it may be full, not after every batch
+        assert len(parts) > 2
+        assert len(flushes) < 4 * len(parts)
+        assert all(os.path.getsize(part) >= 0.01 * 1024 * 1024 for part in parts[:-1])
+        rows = 0
+        for part in parts:
+            with gzip.open(part, "rt") as csv_file:
+                rows += len(csv_file.read().splitlines()) - 1
+        assert rows == 20000
+
+    def test_stage_metrics(self):
+        emitted : list[StageMetrics] = []
+        add_hook(emitted.append)
+        try:
+            upload_table_lakehouse(source="DimAccount", batch_rows=100, **self.arguments) # type: ignore
+        finally:
+            remove_hook(emitted.append)
+        stages = {metrics.stage: metrics for metrics in emitted}
+        assert list(stages) == ["prepare", "write", "extract", "upload", "table"]
+        assert stages["extract"].rows == stages["write"].rows == stages["table"].rows == 250
+        assert stages["extract"].bytes_read > 0
+        assert stages["write"].files == 1 and stages["write"].bytes_written > 0
+        assert stages["upload"].files == 2 and stages["upload"].retries == 0
+        assert all(metrics.error is None and metrics.seconds >= 0 for metrics in emitted)
+
+    def test_query_to_onelake(self):
+        upload_table_lakehouse(
+            source="SELECT * FROM DimAccount WHERE AccountKey < 10",
+            target_table="SmallAccount",
+            **self.arguments # type: ignore
+        )
+        assert self.lakehouse_table("SmallAccount").to_pyarrow_table().num_rows == 10
+
+    def test_parallel_with_failure(self):
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimCurrency,MissingTable,DimAccount", parallel=2, **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimCurrency").to_pyarrow_table().num_rows == 100
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 250
+
+    def test_parallel_results(self):
+        results = upload_table_lakehouse(source="DimCurrency,DimAccount", parallel=2, **self.arguments) # type: ignore
+        assert [(result.source, result.target_table, result.succeeded) for result in results] == [
+            ("DimCurrency", "DimCurrency", True),
+            ("DimAccount", "DimAccount", True),
+        ]
+
+    def test_manifest(self):
+        manifest = parse_manifest({
+            "options": {"parallel": 2, "compression": "snappy"},
+            "tables": [
+                {"source": "DimCurrency", "target_table": "Currency", "columns": "CurrencyKey", "where": "CurrencyKey < 10", "compression": "zstd"},
+                {"source": "DimAccount", "load_mode": "incremental", "watermark_column": "AccountKey", "where": "AccountKey >= 200"},
+                "DimCustomer",
+            ]
+        })
+        arguments = manifest_arguments(manifest)
+        results = upload_table_lakehouse(**arguments, **self.arguments) # type: ignore
+        assert [(result.source, result.target_table, result.rows) for result in results] == [
+            ("DimCurrency", "Currency", 10), ("DimAccount", "DimAccount", 50), ("DimCustomer", "DimCustomer", 50)
+        ]
+        currency = self.lakehouse_table("Currency")
+        assert currency.to_pyarrow_table().column_names == ["CurrencyKey"]
+        metadata = pq.ParquetFile(path.join(self.directory, "output", "Currency", list(get_data_files(currency.table_uri))[0])).metadata
+        assert metadata.row_group(0).column(0).compression == "ZSTD"
+        # the filter applies along with the watermark of later incremental loads
+        self.insert_accounts(range(250, 260))
+        upload_table_lakehouse(**arguments, **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 60
+
+    def test_where_params(self):
+        results = upload_table_lakehouse(
+            source="DimCurrency,DimAccount",
+            columns={"DimCurrency": "CurrencyKey"},
+            where={"DimCurrency": "CurrencyKey >= ? AND CurrencyName <> ?", "DimAccount": "AccountKey >= ?"},
+            where_params={"DimCurrency": [90, "Currency 95"], "DimAccount": [200]},
+            load_mode={"DimAccount": "incremental"},
+            watermark_column="AccountKey",
+            **self.arguments # type: ignore
+        )
+        assert [result.rows for result in results] == [9, 50]
+        assert self.lakehouse_table("DimCurrency").to_pyarrow_table().column_names == ["CurrencyKey"]
+        # the values of the filter come before those of the watermark
+        self.insert_accounts(range(250, 260))
+        upload_table_lakehouse(source="DimAccount", where="AccountKey >= ?", where_params=[200], load_mode="incremental", watermark_column="AccountKey", **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 60
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimCurrency", where_params=[90], **self.arguments) # type: ignore
+
+    def test_largest_first(self):
+        sizes = {"DimCurrency": 10, "DimCustomer": 500}
+        with mock.patch("sql_fabric_copy.sql_fabric_copy_helper.get_table_sizes", return_value=sizes):
+            assert schedule_sources("server", "database", ["DimCurrency", "SELECT 1 FROM DimAccount", "DimCustomer", "DimAccount"]) == [
+                "DimCustomer", "DimCurrency", "SELECT 1 FROM DimAccount", "DimAccount"
+            ]
+            results = upload_table_lakehouse(source="DimCurrency,DimAccount,DimCustomer", parallel=2, **self.arguments) # type: ignore
+        # results stay in the order of the sources
+        assert [result.source for result in results] == ["DimCurrency", "DimAccount", "DimCustomer"]
+
+    def test_duplicate_targets(self):
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimCurrency,dbo.DimCurrency", **self.arguments) # type: ignore
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source=["DimCurrency", "DimAccount"], target_table={"DimAccount": "DimCurrency"}, **self.arguments) # type: ignore
+
+    def test_resume(self):
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimCurrency,MissingTable,DimAccount", run_id="nightly", parallel=2, **self.arguments) # type: ignore
+        with sqlite3.connect(self.database_path) as connection:
+            connection.execute("CREATE TABLE MissingTable (MissingKey INTEGER)")
+            connection.executemany("INSERT INTO MissingTable VALUES (?)", [(i,) for i in range(5)])
+        with self.assertRaises(Exception):
+            # the run has a journal already
+            upload_table_lakehouse(source="DimCurrency,MissingTable,DimAccount", run_id="nightly", **self.arguments) # type: ignore
+        results = upload_table_lakehouse(source="DimCurrency,MissingTable,DimAccount", run_id="nightly", resume=True, **self.arguments) # type: ignore
+        assert [(result.source, result.resumed, result.rows) for result in results] == [
+            ("DimCurrency", True, 100), ("MissingTable", False, 5), ("DimAccount", True, 250)
+        ]
+        assert self.lakehouse_table("DimCurrency").version() == 0
+        assert self.lakehouse_table("MissingTable").to_pyarrow_table().num_rows == 5
+
+    def test_resume_upload(self):
+        with mock.patch("sql_fabric_copy.sql_fabric_copy_helper.copy_deltatable", side_effect=ConnectionError("connection reset")):
+            with self.assertRaises(Exception):
+                upload_table_lakehouse(source="DimCurrency", run_id="nightly", **self.arguments) # type: ignore
+        # the written version is uploaded without extracting the table again
+        with mock.patch("sql_fabric_copy.sql_fabric_copy_helper.extract_source") as extract_source:
+            results = upload_table_lakehouse(source="DimCurrency", run_id="nightly", resume=True, **self.arguments) # type: ignore
+        assert not extract_source.called
+        assert (results[0].resumed, results[0].rows) == (True, 100)
+        assert self.lakehouse_table("DimCurrency").to_pyarrow_table().num_rows == 100
+
+    def test_resume_ranges(self):
+        arguments = {
+            'source': "DimAccount",
+            'partitions': 4,
+            'partition_column': "AccountKey",
+            'run_id': "nightly",
+            'checkpoint_ranges': True,
+            **self.arguments
+        }
+        read_ranges : list[Any] = []
+        timeouts = [TimeoutError("query timeout")]
+        read_range = sql_fabric_copy_helper.table_to_record_batch_reader
+
+        def failing_range(*args: Any, **kwargs: Any) -> Any:
+            read_ranges.append(kwargs["params"])
+            if kwargs["params"] == [186] and timeouts:
+                raise timeouts.pop()
+            return read_range(*args, **kwargs)
+
+        with mock.patch("sql_fabric_copy.sql_fabric_copy_helper.table_to_record_batch_reader", side_effect=failing_range):
+            with self.assertRaises(Exception):
+                upload_table_lakehouse(**arguments) # type: ignore
+            assert sorted(read_ranges) == [[62], [62, 124], [124, 186], [186]]
+            read_ranges.clear()
+            results = upload_table_lakehouse(**{**arguments, 'resume': True}) # type: ignore
+        # only the failed range is read again
+        assert read_ranges == [[186]]
+        assert results[0].succeeded
+        table = self.lakehouse_table("DimAccount")
+        assert table.version() == 0
+        assert sorted(table.to_pyarrow_table().column("AccountKey").to_pylist()) == list(range(250))
+        assert not path.exists(path.join("output", "_runs", "nightly", "DimAccount"))
+
+    def test_pipelined(self):
+        metrics : list[StageMetrics] = []
+        add_hook(metrics.append)
+        try:
+            results = upload_table_lakehouse(
+                source="DimCurrency,DimAccount,DimCustomer",
+                pipeline_depth=1,
+                pipeline_memory_mb=1,
+                pipeline_disk_mb=1,
+                **self.arguments
+            ) # type: ignore
+        finally:
+            remove_hook(metrics.append)
+        assert [(result.source, result.succeeded, result.rows) for result in results] == [
+            ("DimCurrency", True, 100), ("DimAccount", True, 250), ("DimCustomer", True, 50)
+        ]
+        assert self.lakehouse_table("DimCustomer").to_pyarrow_table().num_rows == 50
+        assert [metric.source for metric in metrics if metric.stage == "table"] == ["DimCurrency", "DimAccount", "DimCustomer"]
+
+    def test_pipelined_memory_budget(self):
+        # tables reserve their size before they are read, so two tables that do not fit the budget together are not read at once
+        reading = {"now": 0, "most": 0}
+        extract_source = sql_fabric_copy_helper.extract_source
+
+        def counted_extract(*args: Any, **kwargs: Any) -> Any:
+            reading["now"] += 1
+            reading["most"] = max(reading["most"], reading["now"])
+            try:
+                time.sleep(0.1)
+                return extract_source(*args, **kwargs)
+            finally:
+                reading["now"] -= 1
+
+        sizes = {"DimCurrency": 600 * 1024, "DimAccount": 600 * 1024, "DimCustomer": 600 * 1024}
+        with mock.patch("sql_fabric_copy.sql_fabric_copy_helper.extract_source", side_effect=counted_extract), \
+                mock.patch("sql_fabric_copy.sql_fabric_copy_helper.get_table_sizes", return_value=sizes):
+            results = upload_table_lakehouse(source="DimCurrency,DimAccount,DimCustomer", pipeline_depth=2, parallel=3, pipeline_memory_mb=1, **self.arguments) # type: ignore
+            assert all(result.succeeded for result in results) and reading["most"] == 1
+            reading["most"] = 0
+            upload_table_lakehouse(source="DimCurrency,DimAccount,DimCustomer", pipeline_depth=2, parallel=3, pipeline_memory_mb=2, **self.arguments) # type: ignore
+            assert reading["most"] >= 2
+
+    def test_pipelined_with_failure(self):
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(source="DimCurrency,MissingTable,DimAccount", pipeline_depth=2, parallel=2, batch_rows=100, **self.arguments) # type: ignore
+        assert self.lakehouse_table("DimCurrency").to_pyarrow_table().num_rows == 100
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 250
+
+    def test_direct_sink(self):
+        sink_uri = path.join(self.directory, "direct").replace("\\", "/")
+        for _ in range(2):
+            upload_table_lakehouse(source="DimAccount", batch_rows=100, sink="direct", sink_uri=sink_uri, **self.arguments) # type: ignore
+        table = DeltaTable(f"{sink_uri}/DimAccount")
+        assert table.to_pyarrow_table().num_rows == 250
+        assert table.version() == 1
+        assert not path.exists("output")
+        assert not self.service_client.calls
+
+    def insert_accounts(self, keys: range):
+        with sqlite3.connect(self.database_path) as connection:
+            connection.executemany("INSERT INTO DimAccount VALUES (?, ?)", [(i, i / 2) for i in keys])
+
+    def test_incremental(self):
+        arguments = {'source': "DimAccount", 'load_mode': "incremental", 'watermark_column': "AccountKey", **self.arguments}
+        upload_table_lakehouse(**arguments) # type: ignore
+        self.insert_accounts(range(250, 300))
+        upload_table_lakehouse(**arguments) # type: ignore
+        upload_table_lakehouse(**arguments) # type: ignore
+        table = self.lakehouse_table("DimAccount")
+        assert table.version() == 1
+        assert sorted(table.to_pyarrow_table().column("AccountKey").to_pylist()) == list(range(300))
+        # the append only uploads the files it added
+        assert self.service_client.count_calls("delete_directory") == 0
+        assert self.service_client.count_calls("upload_data") == 2 + 2
+
+    def test_incremental_direct(self):
+        sink_uri = path.join(self.directory, "direct").replace("\\", "/")
+        arguments = {
+            'source': "DimAccount",
+            'load_mode': "incremental",
+            'watermark_column': {"DimAccount": "AccountKey"},
+            'sink': "direct",
+            'sink_uri': sink_uri,
+            **self.arguments
+        }
+        upload_table_lakehouse(**arguments) # type: ignore
+        self.insert_accounts(range(250, 260))
+        upload_table_lakehouse(**arguments) # type: ignore
+        table = DeltaTable(f"{sink_uri}/DimAccount")
+        assert table.version() == 1
+        assert table.to_pyarrow_table().num_rows == 260
+
+    def test_incremental_after_full_reload(self):
+        arguments = {'source': "DimAccount", 'watermark_column': "AccountKey", **self.arguments}
+        upload_table_lakehouse(load_mode="incremental", **arguments) # type: ignore
+        upload_table_lakehouse(load_mode="full", **arguments) # type: ignore
+        self.insert_accounts(range(250, 260))
+        # the full reload discards the recorded watermark, so every row is copied again rather than appended
+        upload_table_lakehouse(load_mode="incremental", **arguments) # type: ignore
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 260
+
+    def test_merge(self):
+        arguments = {
+            'source': "DimCustomer",
+            'load_mode': "merge",
+            'watermark_column': "RowVersion",
+            'primary_key': "CustomerKey",
+            **self.arguments
+        }
+        upload_table_lakehouse(**arguments) # type: ignore
+        with sqlite3.connect(self.database_path) as connection:
+            connection.execute("UPDATE DimCustomer SET CustomerName = 'Renamed', RowVersion = 100 WHERE CustomerKey = 7")
+            connection.execute("INSERT INTO DimCustomer VALUES (50, 'Customer 50', 101)")
+        upload_calls = self.service_client.count_calls("upload_data")
+        upload_table_lakehouse(**arguments) # type: ignore
+        table = self.lakehouse_table("DimCustomer")
+        rows = {row["CustomerKey"]: row["CustomerName"] for row in table.to_pyarrow_table().to_pylist()}
+        assert len(rows) == 51
+        assert rows[7] == "Renamed" and rows[50] == "Customer 50"
+        assert table.history(1)[0]["operation"] == "MERGE"
+        # only the rewritten parquet file and the new _delta_log entry are uploaded
+        assert self.service_client.count_calls("upload_data") - upload_calls == 2
+
+    def test_merge_direct(self):
+        sink_uri = path.join(self.directory, "direct").replace("\\", "/")
+        arguments = {
+            'source': "DimCustomer",
+            'load_mode': "merge",
+            'watermark_column': "RowVersion",
+            'primary_key': {"DimCustomer": ["CustomerKey"]},
+            'sink': "direct",
+            'sink_uri': sink_uri,
+            **self.arguments
+        }
+        upload_table_lakehouse(**arguments) # type: ignore
+        with sqlite3.connect(self.database_path) as connection:
+            connection.execute("UPDATE DimCustomer SET CustomerName = 'Renamed', RowVersion = 100 WHERE CustomerKey < 5")
+        upload_table_lakehouse(**arguments) # type: ignore
+        names = DeltaTable(f"{sink_uri}/DimCustomer").to_pyarrow_table().column("CustomerName").to_pylist()
+        assert len(names) == 50 and names.count("Renamed") == 5
+
+    def test_merge_requires_primary_key(self):
+        arguments = {'source': "SELECT * FROM DimCustomer", 'target_table': "Customer", 'watermark_column': "RowVersion", **self.arguments}
+        upload_table_lakehouse(load_mode="merge", **arguments) # type: ignore
+        with sqlite3.connect(self.database_path) as connection:
+            connection.execute("UPDATE DimCustomer SET RowVersion = 100 WHERE CustomerKey = 1")
+        with self.assertRaises(Exception):
+            upload_table_lakehouse(load_mode="merge", **arguments) # type: ignore
+
+    def test_fingerprint_skips_unchanged(self):
+        # SQLite stand-in for SQL Server's COUNT_BIG
+        class CountBig:
+            def __init__(self) -> None:
+                self.count = 0
+            def step(self, *values: Any):
+                self.count += 1
+            def finalize(self) -> int:
+                return self.count
+        engine = get_engine(self.arguments['sql_server'], self.arguments['database_name'])
+        event.listen(engine, "connect", lambda connection, _: connection.create_aggregate("COUNT_BIG", -1, CountBig))
+
+        arguments = {
+            'source': "DimCustomer,DimAccount",
+            'fingerprint': "rowversion",
+            'watermark_column': {"DimCustomer": "RowVersion", "DimAccount": "AccountKey"},
+            **self.arguments
+        }
+        upload_table_lakehouse(**arguments) # type: ignore
+        with sqlite3.connect(self.database_path) as connection:
+            connection.execute("UPDATE DimCustomer SET RowVersion = 100 WHERE CustomerKey = 1")
+        results = upload_table_lakehouse(**arguments) # type: ignore
+        assert [result.skipped for result in results] == [False, True]
+        results = upload_table_lakehouse(force=True, **arguments) # type: ignore
+        assert [result.skipped for result in results] == [False, False]
+        assert path.exists(path.join("output", "_fingerprints.json"))
+
+        # another filter or projection of an unchanged source is copied, and skipped once it is copied
+        results = upload_table_lakehouse(where={"DimAccount": "AccountKey >= ?"}, where_params={"DimAccount": [200]}, **arguments) # type: ignore
+        assert [result.skipped for result in results] == [True, False]
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().num_rows == 50
+        results = upload_table_lakehouse(where={"DimAccount": "AccountKey >= ?"}, where_params={"DimAccount": [200]}, **arguments) # type: ignore
+        assert [result.skipped for result in results] == [True, True]
+        results = upload_table_lakehouse(where={"DimAccount": "AccountKey >= ?"}, where_params={"DimAccount": [100]}, **arguments) # type: ignore
+        assert [result.skipped for result in results] == [True, False]
+        results = upload_table_lakehouse(columns={"DimAccount": "AccountKey"}, **arguments) # type: ignore
+        assert [result.skipped for result in results] == [True, False]
+        assert self.lakehouse_table("DimAccount").to_pyarrow_table().column_names == ["AccountKey"]
+
+if __name__ == '__main__':
+    unittest.main()
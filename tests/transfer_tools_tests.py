@@ -0,0 +1,94 @@
+"""
+    Offline test cases for sql_fabric_copy.transfer_tools.
+"""
+
+import asyncio
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError, ServiceRequestError
+from sql_fabric_copy.transfer_tools import TransferController, TransferStats, is_retryable, retry_after_seconds
+
+def http_error(status_code: int, headers: dict | None = None) -> HttpResponseError:
+    """Returns the error the storage client raises for a response of status_code."""
+    error = HttpResponseError(message=f"status {status_code}")
+    error.status_code = status_code
+    error.response = SimpleNamespace(headers=headers or {}) # type: ignore
+    return error
+
+def failing(errors: list, result: str = "done"):
+    """Returns a request raising each of errors in turn, then returning result."""
+    def request():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return request
+
+class TestTransferTools(unittest.TestCase):
+    """
+    Test cases for sql_fabric_copy.transfer_tools.
+    """
+
+    def test_retry_after_seconds(self):
+        assert retry_after_seconds(http_error(429, {"Retry-After": "2"})) == 2
+        assert retry_after_seconds(http_error(503, {"x-ms-retry-after-ms": "250", "Retry-After": "2"})) == 0.25
+        retry_date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+        assert 25 < retry_after_seconds(http_error(429, {"Retry-After": retry_date})) <= 30 # type: ignore
+        assert retry_after_seconds(http_error(429)) is None
+        assert retry_after_seconds(ValueError()) is None
+
+    def test_is_retryable(self):
+        assert is_retryable(http_error(429)) and is_retryable(http_error(500)) and is_retryable(ServiceRequestError("reset"))
+        assert not is_retryable(http_error(403)) and not is_retryable(ResourceNotFoundError("gone")) and not is_retryable(ValueError())
+
+    def test_call_retries(self):
+        controller = TransferController(8, backoff_seconds=0)
+        stats = TransferStats()
+        errors = [http_error(429, {"Retry-After": "0"}), http_error(429, {"Retry-After": "0"}), http_error(500)]
+        assert controller.call(failing(errors), stats) == "done"
+        assert stats.retries == 3 and stats.throttled == 2 and controller.stats == stats
+        # each throttling response after the backoff of the last one halves the concurrency
+        assert controller.concurrency == 2
+
+        with self.assertRaises(HttpResponseError):
+            controller.call(failing([http_error(403)]))
+        with self.assertRaises(HttpResponseError):
+            TransferController(1, max_retries=2, backoff_seconds=0.001).call(failing([http_error(503)] * 3))
+
+    def test_concurrency_decrease(self):
+        controller = TransferController(8, backoff_seconds=10)
+        for _ in range(3):
+            controller._failed(http_error(429, {"Retry-After": "0"}), 0, None)
+        # requests in flight when throttling starts fail together, and halve the concurrency once
+        assert controller.concurrency == 4
+        controller._failed(http_error(500), 0, None)
+        assert controller.concurrency == 4 and controller.stats.throttled == 3
+
+    def test_concurrency_increase(self):
+        controller = TransferController(2, max_concurrency=3)
+        for _ in range(2):
+            controller.call(lambda: None)
+        assert controller.concurrency == 3
+        for _ in range(10):
+            controller.call(lambda: None)
+        assert controller.concurrency == 3
+
+    def test_call_async(self):
+        controller = TransferController(2, backoff_seconds=0.001)
+
+        async def request(errors: list) -> str:
+            if errors:
+                raise errors.pop(0)
+            return "done"
+
+        async def requests():
+            return await asyncio.gather(*[
+                controller.call_async(lambda errors=[http_error(429, {"Retry-After": "0"})]: request(errors)) for _ in range(4)
+            ])
+
+        assert asyncio.run(requests()) == ["done"] * 4
+        assert controller.stats.retries == 4 and controller.stats.throttled == 4
+
+if __name__ == '__main__':
+    unittest.main()